@@ -1,13 +1,22 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for
+from flask import Flask, Response, render_template, jsonify, request, redirect, url_for
+from functools import wraps
+import hmac
 import os
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import config
-from utils.db import init_db, get_all_synced_tasks
-from utils.sync import TaskSynchronizer
+from utils.db import (
+    init_db, list_synced_tasks, encode_listing_cursor, decode_listing_cursor, LISTING_COLUMNS,
+    get_asana_webhook, open_webhook_handshake, close_webhook_handshake, accept_webhook_handshake
+)
+from utils.health import HealthMonitor
+from utils.metrics import registry as metrics_registry
+from utils.calendar_watch import CalendarWatchManager
+from utils.scheduler import SyncScheduler
+from utils.webhooks import EventCoalescer, verify_signature
 from utils.asana_client import AsanaClient
-from utils.calendar_client import GoogleCalendarClient
+from utils.calendar_client import get_calendar_client
 
 app = Flask(__name__, 
             template_folder='templates',  # Path to your templates
@@ -17,61 +26,306 @@ app.config.from_object(config)
 # Initialize database
 init_db(app)
 
+# With the debug reloader, only the serving child process runs background threads
+run_background = config.BACKGROUND_THREADS_ENABLED and (
+    not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true')
+
+# Background sync jobs
+scheduler = SyncScheduler(app)
+# In multi-tenant mode, periodic syncs are run by the shard workers (utils.shards)
+if config.SYNC_SCHEDULER_ENABLED and not config.MULTI_TENANT and run_background:
+    scheduler.start()
+
+def queue_webhook_sync(events):
+    """Queue a sync of just the tasks in a batch of coalesced webhook events"""
+    scheduler.enqueue(trigger='webhook', events=events)
+
+# Bursts of webhook events for the same task are merged into one targeted sync
+webhook_events = EventCoalescer(queue_webhook_sync)
+
+# Google Calendar push notifications, when GOOGLE_WATCH_ADDRESS is set
+calendar_watch = CalendarWatchManager(app)
+if run_background:
+    calendar_watch.start()
+
+def check_asana():
+    """Health probe: make a simple Asana API call"""
+    asana_probe_client._make_request("GET", "users/me")
+
+def check_google_calendar():
+    """Health probe: the shared Calendar service can be built"""
+    return bool(get_calendar_client().service)
+
+# Upstream health is probed in the background and served from memory
+asana_probe_client = AsanaClient()
+health_monitor = HealthMonitor({
+    'asana': check_asana,
+    'google_calendar': check_google_calendar
+})
+if run_background:
+    health_monitor.start()
+
+@app.context_processor
+def inject_now():
+    """Make the current time available to templates"""
+    return {'now': datetime.utcnow()}
+
 @app.route('/')
 def index():
-    """Render the dashboard page"""
+    """Render the dashboard page; synced tasks are loaded page by page from the API"""
     try:
-        synced_tasks = get_all_synced_tasks()
-        return render_template('dashboard.html', synced_tasks=synced_tasks)
+        return render_template('dashboard.html')
     except Exception as e:
         return f"Error loading dashboard: {str(e)}", 500
 
+@app.route('/api/synced-tasks', methods=['GET'])
+def synced_tasks():
+    """
+    API endpoint to list synced tasks one page at a time
+    
+    Query parameters: cursor (from the previous page's next_cursor), limit,
+    due_from and due_to (ISO dates), name (name prefix) and fields
+    (comma-separated columns to return).
+    """
+    try:
+        limit = min(int(request.args.get('limit', config.SYNCED_TASKS_PAGE_SIZE)),
+                    config.SYNCED_TASKS_MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        due_from = request.args.get('due_from')
+        due_to = request.args.get('due_to')
+        fields = request.args.get('fields')
+        
+        columns = None
+        if fields:
+            columns = [field.strip() for field in fields.split(',') if field.strip()]
+            unknown = set(columns) - set(LISTING_COLUMNS)
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        
+        tasks, next_key = list_synced_tasks(
+            after=decode_listing_cursor(cursor) if cursor else None,
+            limit=max(limit, 1),
+            due_from=datetime.fromisoformat(due_from) if due_from else None,
+            due_to=datetime.fromisoformat(due_to) if due_to else None,
+            name_prefix=request.args.get('name'),
+            columns=columns
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    for task in tasks:
+        for column, value in task.items():
+            if isinstance(value, datetime):
+                task[column] = value.isoformat()
+    
+    return jsonify({
+        'success': True,
+        'tasks': tasks,
+        'next_cursor': encode_listing_cursor(next_key) if next_key else None
+    })
+
 @app.route('/api/sync', methods=['POST'])
 def sync_tasks():
-    """API endpoint to trigger task synchronization"""
-    synchronizer = TaskSynchronizer()
-    stats = synchronizer.sync_tasks()
+    """API endpoint to queue a task synchronization job; ?profile=1 profiles the run"""
+    # Clicks while a sync is queued or running attach to that sync
+    profile = request.args.get('profile') in ('1', 'true') or None
+    job = scheduler.enqueue(trigger='manual', coalesce=True, profile=profile)
     
     return jsonify({
         'success': True,
-        'stats': stats,
+        'job_id': job.id,
+        'status': job.status,
         'timestamp': datetime.utcnow().isoformat()
+    }), 202
+
+@app.route('/api/sync/<job_id>', methods=['GET'])
+def sync_job_status(job_id):
+    """API endpoint to check the progress and result of a sync job"""
+    job = scheduler.get_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Unknown sync job'}), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job.to_dict()
     })
 
+def asana_webhook_secret():
+    """The secret Asana signs webhook deliveries with, if known"""
+    if config.ASANA_WEBHOOK_SECRET:
+        return config.ASANA_WEBHOOK_SECRET
+    webhook = get_asana_webhook(config.ASANA_WORKSPACE_ID)
+    return webhook.secret if webhook else None
+
+def asana_webhook_pending():
+    """Whether a webhook registration started from the admin API is waiting for its handshake"""
+    webhook = get_asana_webhook(config.ASANA_WORKSPACE_ID)
+    return bool(webhook and webhook.handshake_expires_at and webhook.handshake_expires_at > datetime.utcnow())
+
+@app.route('/api/webhooks/asana', methods=['POST'])
+def asana_webhook():
+    """Receive Asana webhook deliveries and queue targeted syncs of the changed tasks"""
+    # Handshake while the webhook is being created: echo the secret back and keep it
+    hook_secret = request.headers.get('X-Hook-Secret')
+    if hook_secret:
+        # Only a registration started from the admin API sets (or replaces) the
+        # secret, so an unsolicited handshake cannot take over the endpoint
+        if not accept_webhook_handshake(config.ASANA_WORKSPACE_ID, hook_secret):
+            return jsonify({'success': False, 'error': 'No webhook registration pending'}), 403
+        response = jsonify({'success': True})
+        response.headers['X-Hook-Secret'] = hook_secret
+        return response
+    
+    if not verify_signature(asana_webhook_secret(), request.get_data(),
+                            request.headers.get('X-Hook-Signature')):
+        return jsonify({'success': False, 'error': 'Invalid signature'}), 401
+    
+    # Heartbeats carry no events
+    events = (request.get_json(silent=True) or {}).get('events', [])
+    queued = webhook_events.add(events)
+    
+    return jsonify({'success': True, 'queued': queued})
+
+@app.route('/api/webhooks/google', methods=['POST'])
+def google_webhook():
+    """Receive Google Calendar push notifications and queue a fetch of the changed events"""
+    state = calendar_watch.handle_notification(request.headers)
+    if state is None:
+        return jsonify({'success': False, 'error': 'Unknown channel'}), 404
+    
+    # The first notification only confirms the channel
+    if state == 'sync':
+        return jsonify({'success': True})
+    
+    # Notifications carry no details; the queued job lists just the changed
+    # events with the calendar sync token, and bursts share one queued job
+    job = scheduler.enqueue(trigger='calendar_push', kind='calendar', coalesce=True)
+    
+    return jsonify({'success': True, 'job_id': job.id})
+
 @app.route('/api/auth/google', methods=['GET'])
 def google_auth():
     """Route to handle Google OAuth callback"""
-    # Just initialize the client which will handle the auth flow if needed
-    client = GoogleCalendarClient()
+    # Just get the shared client, which will handle the auth flow if needed
+    client = get_calendar_client()
     return redirect(url_for('index'))
 
 @app.route('/api/status', methods=['GET'])
 def status():
     """API endpoint to check authentication and connection status"""
-    status_info = {
-        'asana': False,
-        'google_calendar': False
-    }
+    # Cached probe results unless ?fresh=1 asks for a live check
+    fresh = request.args.get('fresh') in ('1', 'true')
+    results = health_monitor.status(fresh=fresh)
+    
+    return jsonify({
+        'asana': results['asana']['ok'],
+        'google_calendar': results['google_calendar']['ok'],
+        'checks': results
+    })
+
+def admin_required(view):
+    """Require the admin bearer token on a route; without config.ADMIN_TOKEN, admin routes are disabled"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not config.ADMIN_TOKEN:
+            return jsonify({'success': False, 'error': 'Admin API disabled: ADMIN_TOKEN is not set'}), 403
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode(), f"Bearer {config.ADMIN_TOKEN}".encode()):
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@admin_required
+def list_profiles():
+    """API endpoint to list the saved sync profiles, newest first"""
+    return jsonify({
+        'success': True,
+        'profiles': scheduler.profiler.list_profiles()
+    })
+
+@app.route('/api/admin/profiles/<run_id>', methods=['GET'])
+@admin_required
+def profile_summary(run_id):
+    """
+    API endpoint to summarize a saved sync profile by its top functions
     
-    # Check Asana connection
+    Query parameters: limit (number of functions, default 20) and sort
+    (cumulative, tottime or calls).
+    """
     try:
-        client = AsanaClient()
-        # Try to make a simple API call
-        client._make_request("GET", "users/me")
-        status_info['asana'] = True
-    except Exception:
-        pass
-    
-    # Check Google Calendar connection
+        summary = scheduler.profiler.summary(
+            run_id,
+            limit=max(int(request.args.get('limit', 20)), 1),
+            sort=request.args.get('sort', 'cumulative')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if summary is None:
+        return jsonify({'success': False, 'error': 'Unknown profile'}), 404
+    
+    return jsonify({'success': True, 'profile': summary})
+
+@app.route('/api/admin/webhooks/asana', methods=['POST'])
+@admin_required
+def register_asana_webhook():
+    """
+    API endpoint to register an Asana webhook delivering to /api/webhooks/asana
+    
+    JSON body: resource (gid of the Asana resource to watch) and
+    optionally target (public URL of /api/webhooks/asana, this host's by
+    default). The handshake Asana sends while the webhook is created is
+    accepted for config.ASANA_WEBHOOK_HANDSHAKE_SECONDS and replaces any
+    stored secret, which is also how a lost secret is reset.
+    """
+    if config.ASANA_WEBHOOK_SECRET:
+        return jsonify({'success': False, 'error': 'ASANA_WEBHOOK_SECRET is configured'}), 409
+    
+    body = request.get_json(silent=True) or {}
+    if not body.get('resource'):
+        return jsonify({'success': False, 'error': 'resource is required'}), 400
+    target = body.get('target') or url_for('asana_webhook', _external=True)
+    
+    deadline = datetime.utcnow() + timedelta(seconds=config.ASANA_WEBHOOK_HANDSHAKE_SECONDS)
+    open_webhook_handshake(config.ASANA_WORKSPACE_ID, deadline)
     try:
-        client = GoogleCalendarClient()
-        # If we can initialize the service, connection is working
-        if client.service:
-            status_info['google_calendar'] = True
-    except Exception:
-        pass
-    
-    return jsonify(status_info)
+        webhook = asana_probe_client.create_webhook(body['resource'], target)
+    except Exception as e:
+        print(f"Error registering Asana webhook: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 502
+    finally:
+        close_webhook_handshake(config.ASANA_WORKSPACE_ID)
+    
+    return jsonify({'success': True, 'webhook': webhook}), 201
+
+@app.route('/api/admin/sync-plan', methods=['GET'])
+@admin_required
+def sync_plan():
+    """
+    API endpoint to dry-run a sync: plan it without calling Google or writing synced tasks
+    
+    Returns the full plan (see SyncPlan.to_dict) unless ?summary=1 asks
+    for just the counts. ?incremental=1 or 0 overrides SYNC_INCREMENTAL.
+    """
+    incremental = request.args.get('incremental')
+    if incremental is not None:
+        incremental = incremental in ('1', 'true')
+    
+    try:
+        plan = scheduler.synchronizer_factory().plan(incremental=incremental)
+    except Exception as e:
+        print(f"Error planning sync: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    if request.args.get('summary') in ('1', 'true'):
+        return jsonify({'success': True, 'plan': plan.summary()})
+    return jsonify({'success': True, 'plan': plan.to_dict()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Sync, upstream API and database metrics in the Prometheus text format"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,219 @@
+"""
+Local stand-ins for the Asana and Google Calendar APIs used by the sync
+
+Both servers run on a background thread on 127.0.0.1, add a configurable
+latency to every request and count the calls they receive.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date, timedelta
+from email.parser import FeedParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class FakeServer:
+    """Base class: serves a handler method on a free local port"""
+    
+    def __init__(self, latency=0.0):
+        """Initialize with the latency added to each request, in seconds"""
+        self.latency = latency
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+    
+    def start(self):
+        """Start serving and return the base URL"""
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_GET(self):
+                fake._dispatch(self)
+            
+            def do_POST(self):
+                fake._dispatch(self)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+    
+    def stop(self):
+        """Stop serving"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+    
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+    
+    def count(self, key, amount=1):
+        """Increment a call counter"""
+        with self._lock:
+            self.counts[key] += amount
+    
+    def _dispatch(self, request):
+        """Apply the latency, then let the subclass answer"""
+        if self.latency:
+            time.sleep(self.latency)
+        
+        length = int(request.headers.get('Content-Length') or 0)
+        body = request.rfile.read(length) if length else b''
+        status, headers, content = self.handle(request.command, request.path, request.headers, body)
+        
+        request.send_response(status)
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.send_header('Content-Length', str(len(content)))
+        request.end_headers()
+        request.wfile.write(content)
+    
+    def handle(self, method, path, headers, body):
+        """Return (status, headers, body bytes) for a request"""
+        raise NotImplementedError
+    
+    def json_response(self, payload, status=200, headers=None):
+        """Build a JSON response tuple"""
+        return status, dict(headers or {}, **{'Content-Type': 'application/json'}), json.dumps(payload).encode()
+
+class FakeAsana(FakeServer):
+    """
+    Asana tag and tag task endpoints for one workspace with one tag
+    
+    Task lists are paginated with next_page offsets like the real API, and
+    every rate_limit_every-th request is answered with 429 and Retry-After.
+    """
+    
+    def __init__(self, task_count, tag_name='schedule', latency=0.0, rate_limit_every=0, retry_after=0.05):
+        """Initialize with the number of tasks carrying the tag"""
+        super().__init__(latency)
+        self.task_count = task_count
+        self.tag_name = tag_name
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self._requests = 0
+    
+    @property
+    def base_url(self):
+        """Value for AsanaClient.BASE_URL"""
+        return f"{self.url}/api/1.0"
+    
+    def task(self, index):
+        """Synthetic task: every third one is due at a time, the others on a day"""
+        due_on = (date(2024, 1, 1) + timedelta(days=index % 365)).isoformat()
+        return {
+            'gid': str(1000000 + index),
+            'name': f"Task {index}",
+            'due_on': due_on,
+            'due_at': f"{due_on}T09:00:00.000Z" if index % 3 == 0 else None,
+            'completed': False
+        }
+    
+    def handle(self, method, path, headers, body):
+        with self._lock:
+            self._requests += 1
+            limited = self.rate_limit_every and self._requests % self.rate_limit_every == 0
+        if limited:
+            self.count('rate_limited')
+            return self.json_response({'errors': [{'message': 'Rate limited'}]}, 429,
+                                      {'Retry-After': str(self.retry_after)})
+        
+        url = urlparse(path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        parts = url.path.strip('/').split('/')
+        
+        # /api/1.0/workspaces/<id>/tags
+        if parts[2:3] == ['workspaces'] and parts[-1] == 'tags':
+            self.count('tags')
+            return self.json_response({'data': [{'gid': 'tag1', 'name': self.tag_name}], 'next_page': None})
+        
+        # /api/1.0/tags/<id>/tasks
+        if parts[2:3] == ['tags'] and parts[-1] == 'tasks':
+            self.count('tag_tasks')
+            offset = int(params.get('offset', 0))
+            limit = min(int(params.get('limit', 100)), 100)
+            end = min(offset + limit, self.task_count)
+            next_page = {'offset': str(end)} if end < self.task_count else None
+            return self.json_response({
+                'data': [self.task(index) for index in range(offset, end)],
+                'next_page': next_page
+            })
+        
+        self.count('not_found')
+        return self.json_response({'errors': [{'message': 'Not found'}]}, 404)
+
+class FakeCalendar(FakeServer):
+    """Google Calendar event insert, patch and delete, individually or in batch requests"""
+    
+    def __init__(self, latency=0.0):
+        """Initialize with the latency added to each HTTP request (a batch counts once)"""
+        super().__init__(latency)
+        self._next_id = 0
+    
+    @property
+    def root_url(self):
+        """Value for the discovery document's rootUrl"""
+        return f"{self.url}/"
+    
+    def handle(self, method, path, headers, body):
+        if urlparse(path).path == '/batch/calendar/v3':
+            self.count('batch_requests')
+            return self._handle_batch(headers['Content-Type'], body)
+        
+        status, content = self._handle_call(method, path, body)
+        return status, {'Content-Type': 'application/json'}, content
+    
+    def _handle_call(self, method, path, body):
+        """Answer one (possibly batched) Calendar API call"""
+        url = urlparse(path).path
+        if method == 'POST' and url.endswith('/events'):
+            self.count('inserts')
+            event = json.loads(body or b'{}')
+            with self._lock:
+                self._next_id += 1
+                event['id'] = f"event{self._next_id}"
+            return 200, json.dumps(event).encode()
+        if method == 'PATCH':
+            self.count('patches')
+            return 200, json.dumps(dict(json.loads(body or b'{}'), id=url.rsplit('/', 1)[-1])).encode()
+        if method == 'DELETE':
+            self.count('deletes')
+            return 204, b''
+        
+        self.count('not_found')
+        return 404, json.dumps({'error': {'code': 404}}).encode()
+    
+    def _handle_batch(self, content_type, body):
+        """Split a multipart/mixed batch, answer each part and join the answers"""
+        parser = FeedParser()
+        parser.feed(f"Content-Type: {content_type}\r\n\r\n")
+        parser.feed(body.decode('utf-8'))
+        boundary = uuid.uuid4().hex
+        parts = []
+        
+        for part in parser.close().get_payload():
+            request_line, _, rest = part.get_payload().partition('\n')
+            method, path, _ = request_line.strip().split(' ', 2)
+            _, _, call_body = rest.replace('\r\n', '\n').partition('\n\n')
+            status, content = self._handle_call(method, path, call_body.encode())
+            self.count('batch_items')
+            
+            content_id = part['Content-ID'].strip('<>')
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n\r\n"
+                f"{content.decode()}\r\n"
+            )
+        
+        content = ''.join(parts) + f"--{boundary}--\r\n"
+        return 200, {'Content-Type': f'multipart/mixed; boundary={boundary}'}, content.encode()
@@ -0,0 +1,229 @@
+"""
+Benchmark TaskSynchronizer.sync_tasks against local Asana and Calendar stand-ins
+
+Run from the repository root:
+    
+    python -m benchmarks.sync_benchmark --tasks 100,10000,100000
+
+Each size is synced twice into a fresh SQLite database: an initial sync
+that creates every event, then a resync where nothing changed. Every run
+happens in its own process so peak RSS is per run. Results are printed
+next to those of the previous run with the same settings and appended to
+the history file.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import googleapiclient
+from flask import Flask
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.discovery import build_from_document
+
+from benchmarks.fake_servers import FakeAsana, FakeCalendar
+from utils.asana_client import AsanaClient
+from utils.calendar_client import GoogleCalendarClient
+from utils.db import init_db
+from utils.rate_limit import RateLimiter
+from utils.sync import TaskSynchronizer
+from utils.tag_cache import TagCache
+
+DEFAULT_HISTORY = os.path.join(os.path.dirname(__file__), 'results', 'sync_history.jsonl')
+
+class BenchCalendarClient(GoogleCalendarClient):
+    """GoogleCalendarClient talking to a FakeCalendar without OAuth"""
+    
+    def __init__(self, root_url):
+        self.root_url = root_url
+        super().__init__(calendar_id='primary')
+    
+    def _get_calendar_service(self):
+        path = os.path.join(os.path.dirname(googleapiclient.__file__),
+                            'discovery_cache', 'documents', 'calendar.v3.json')
+        with open(path) as document:
+            discovery = json.load(document)
+        discovery['rootUrl'] = self.root_url
+        self.credentials = AnonymousCredentials()
+        return build_from_document(discovery, credentials=self.credentials)
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run_sync(database_url, asana_url, calendar_url, options, results):
+    """Run one sync in this (child) process and report its measurements"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    init_db(app)
+    
+    with app.app_context():
+        asana_client = AsanaClient(
+            'bench-token', 'bench-workspace',
+            tag_cache=TagCache(persist=False),
+            rate_limiter=RateLimiter(requests_per_minute=options['asana_rpm'])
+        )
+        asana_client.BASE_URL = asana_url
+        synchronizer = TaskSynchronizer(asana_client, BenchCalendarClient(calendar_url),
+                                        max_workers=options['workers'])
+        
+        # Per-task latency runs from the task arriving from Asana to its row being recorded
+        fetched = {}
+        iter_tasks_with_tag = asana_client.iter_tasks_with_tag
+        
+        def timed_iter_tasks_with_tag(*args, **kwargs):
+            for task in iter_tasks_with_tag(*args, **kwargs):
+                fetched[task.gid] = time.perf_counter()
+                yield task
+        
+        asana_client.iter_tasks_with_tag = timed_iter_tasks_with_tag
+        
+        latencies = []
+        lock = threading.Lock()
+        record_events = synchronizer._record_events
+        
+        def timed_record_events(batch_results, stats):
+            record_events(batch_results, stats)
+            now = time.perf_counter()
+            with lock:
+                latencies.extend(now - fetched[item['task_id']] for item, _ in batch_results)
+        
+        synchronizer._record_events = timed_record_events
+        
+        started = time.perf_counter()
+        stats = synchronizer.sync_tasks(incremental=False, reconcile=False)
+        elapsed = time.perf_counter() - started
+    
+    results.put({
+        'seconds': round(elapsed, 3),
+        'tasks_per_second': round(stats['tasks_found'] / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'stats': stats
+    })
+
+def run_scenario(task_count, options):
+    """Run the initial sync and the resync of one size; returns a result per run"""
+    asana = FakeAsana(task_count, latency=options['asana_latency'],
+                      rate_limit_every=options['rate_limit_every'])
+    calendar = FakeCalendar(latency=options['calendar_latency'])
+    asana.start()
+    calendar.start()
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        database_url = f"sqlite:///{os.path.join(temp_dir, 'bench.db')}"
+        
+        for run in ('initial', 'resync'):
+            asana.counts.clear()
+            calendar.counts.clear()
+            
+            results = context.Queue()
+            process = context.Process(target=run_sync, args=(
+                database_url, asana.base_url, calendar.root_url, options, results))
+            process.start()
+            result = results.get()
+            process.join()
+            
+            result.update({
+                'tasks': task_count,
+                'run': run,
+                'asana_calls': dict(asana.counts),
+                'calendar_calls': dict(calendar.counts)
+            })
+            runs.append(result)
+    
+    asana.stop()
+    calendar.stop()
+    return runs
+
+def git_revision():
+    """Short hash of the checked-out commit, if available"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def load_previous(history_path, options):
+    """Results of the most recent history entry recorded with the same options"""
+    if not os.path.exists(history_path):
+        return {}
+    
+    previous = {}
+    with open(history_path) as history:
+        for line in history:
+            entry = json.loads(line)
+            if entry.get('options') == options:
+                previous = {(run['tasks'], run['run']): run for run in entry['results']}
+    return previous
+
+def print_report(results, previous):
+    """Print one line per run, with the change in throughput since the previous entry"""
+    print(f"\n{'tasks':>8} {'run':<8}{'tasks/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'RSS MB':>8}"
+          f"{'asana':>7}{'batches':>9}{'429s':>6}  vs previous")
+    for run in results:
+        before = previous.get((run['tasks'], run['run']))
+        change = ''
+        if before and before.get('tasks_per_second') and run['tasks_per_second']:
+            change = f"{(run['tasks_per_second'] / before['tasks_per_second'] - 1) * 100:+.1f}%"
+        
+        asana_calls = sum(count for key, count in run['asana_calls'].items() if key != 'rate_limited')
+        # Runs that recorded no events have no per-task latency
+        p50 = f"{run['p50_ms']:.2f}" if run['p50_ms'] is not None else '-'
+        p99 = f"{run['p99_ms']:.2f}" if run['p99_ms'] is not None else '-'
+        print(f"{run['tasks']:>8} {run['run']:<8}{run['tasks_per_second'] or 0:>10.1f}"
+              f"{p50:>9}{p99:>9}{run['peak_rss_mb']:>8.1f}"
+              f"{asana_calls:>7}{run['calendar_calls'].get('batch_requests', 0):>9}"
+              f"{run['asana_calls'].get('rate_limited', 0):>6}  {change}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', default='100,10000,100000',
+                        help="Comma-separated task counts")
+    parser.add_argument('--asana-latency', type=float, default=0.02, help="Seconds per Asana request")
+    parser.add_argument('--calendar-latency', type=float, default=0.05, help="Seconds per Calendar request")
+    parser.add_argument('--rate-limit-every', type=int, default=50,
+                        help="Answer every Nth Asana request with 429 (0 disables)")
+    parser.add_argument('--asana-rpm', type=int, default=1500, help="Client-side Asana request budget")
+    parser.add_argument('--workers', type=int, default=1, help="TaskSynchronizer max_workers")
+    parser.add_argument('--history', default=DEFAULT_HISTORY)
+    args = parser.parse_args()
+    
+    options = {
+        'asana_latency': args.asana_latency,
+        'calendar_latency': args.calendar_latency,
+        'rate_limit_every': args.rate_limit_every,
+        'asana_rpm': args.asana_rpm,
+        'workers': args.workers
+    }
+    
+    results = []
+    for task_count in (int(count) for count in args.tasks.split(',')):
+        results.extend(run_scenario(task_count, options))
+    
+    print_report(results, load_previous(args.history, options))
+    
+    os.makedirs(os.path.dirname(args.history), exist_ok=True)
+    with open(args.history, 'a') as history:
+        history.write(json.dumps({
+            'recorded_at': datetime.utcnow().isoformat(),
+            'revision': git_revision(),
+            'options': options,
+            'results': results
+        }) + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark the SyncedTask query patterns with and without their indexes
+
+Run from the repository root:
+
+    python -m benchmarks.synced_task_queries --rows 1000000
+
+By default a temporary SQLite file is used; pass --database-url to run
+against another database (the synced_task table there is dropped).
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from utils.db import db, init_db, list_synced_tasks, SyncedTask
+
+INDEXES = {
+    'ix_synced_task_due_date_id': ['asana_due_date', 'id'],
+    'ix_synced_task_updated_at': ['updated_at'],
+}
+
+def create_app(database_url):
+    """Create a Flask app bound to the benchmark database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    return app
+
+def populate(rows, chunk_size=10000):
+    """Insert synthetic synced tasks spread over two years of due and update dates"""
+    start = datetime(2023, 1, 1)
+    randomizer = random.Random(42)
+    
+    for offset in range(0, rows, chunk_size):
+        db.session.execute(db.insert(SyncedTask), [
+            {
+                'asana_task_id': f"task{index}",
+                'asana_task_name': f"Task {randomizer.choice('ABCDEFGHIJ')}{index}",
+                'asana_due_date': start + timedelta(minutes=randomizer.randrange(2 * 365 * 24 * 60)),
+                'google_event_id': f"event{index}",
+                'created_at': start,
+                'updated_at': start + timedelta(minutes=randomizer.randrange(2 * 365 * 24 * 60)),
+            }
+            for index in range(offset, min(offset + chunk_size, rows))
+        ])
+        db.session.commit()
+
+def time_query(query, repeats):
+    """Return the median wall-clock time of a query in milliseconds"""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        query()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def build_queries():
+    """The access paths the app uses, keyed by a short description"""
+    middle = (datetime(2024, 1, 1), 0)
+    now = datetime(2024, 6, 1)
+    
+    return {
+        'listing, first page': lambda: list_synced_tasks(limit=50),
+        'listing, deep keyset page': lambda: list_synced_tasks(after=middle, limit=50),
+        'listing, due date range': lambda: list_synced_tasks(
+            due_from=datetime(2023, 6, 1), due_to=datetime(2023, 6, 8), limit=50),
+        'past-due count': lambda: db.session.execute(
+            db.select(db.func.count()).where(SyncedTask.asana_due_date < now)).scalar(),
+        'updated in the last day': lambda: db.session.execute(
+            db.select(SyncedTask.asana_task_id).where(
+                SyncedTask.updated_at >= now - timedelta(days=1),
+                SyncedTask.updated_at < now)).all(),
+    }
+
+def drop_indexes():
+    """Drop the secondary indexes so queries fall back to full scans"""
+    with db.engine.begin() as connection:
+        for name in INDEXES:
+            connection.execute(db.text(f'DROP INDEX IF EXISTS {name}'))
+
+def create_indexes():
+    """Recreate the secondary indexes and refresh planner statistics"""
+    with db.engine.begin() as connection:
+        for name, columns in INDEXES.items():
+            connection.execute(db.text(
+                f'CREATE INDEX IF NOT EXISTS {name} ON synced_task ({", ".join(columns)})'))
+        connection.execute(db.text('ANALYZE'))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+    
+    temp_dir = None
+    database_url = args.database_url
+    if not database_url:
+        temp_dir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(temp_dir.name, 'bench.db')}"
+    
+    app = create_app(database_url)
+    init_db(app)
+    
+    with app.app_context():
+        SyncedTask.__table__.drop(db.engine)
+        SyncedTask.__table__.create(db.engine)
+        
+        started = time.perf_counter()
+        populate(args.rows)
+        print(f"Inserted {args.rows} rows in {time.perf_counter() - started:.1f}s")
+        
+        queries = build_queries()
+        results = {}
+        
+        drop_indexes()
+        for name, query in queries.items():
+            results[name] = [time_query(query, args.repeats)]
+        
+        create_indexes()
+        for name, query in queries.items():
+            results[name].append(time_query(query, args.repeats))
+        
+        print(f"\n{'query':<28}{'no index (ms)':>15}{'indexed (ms)':>15}")
+        for name, (without_index, with_index) in results.items():
+            print(f"{name:<28}{without_index:>15.2f}{with_index:>15.2f}")
+    
+    if temp_dir:
+        temp_dir.cleanup()
+
+if __name__ == '__main__':
+    main()
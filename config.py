@@ -14,12 +14,67 @@ SQLALCHEMY_TRACK_MODIFICATIONS = False
 # Asana API configuration
 ASANA_ACCESS_TOKEN = os.getenv('ASANA_ACCESS_TOKEN')
 ASANA_WORKSPACE_ID = os.getenv('ASANA_WORKSPACE_ID')
+ASANA_PAGE_SIZE = int(os.getenv('ASANA_PAGE_SIZE', '100'))  # Asana allows at most 100
+TAG_CACHE_TTL_SECONDS = int(os.getenv('TAG_CACHE_TTL_SECONDS', '3600'))
+TAG_CACHE_MISS_RELOAD_SECONDS = int(os.getenv('TAG_CACHE_MISS_RELOAD_SECONDS', '60'))  # A name missing from an older index reloads it
+ASANA_POOL_SIZE = int(os.getenv('ASANA_POOL_SIZE', '10'))
+ASANA_CONNECT_TIMEOUT = float(os.getenv('ASANA_CONNECT_TIMEOUT', '5'))
+ASANA_READ_TIMEOUT = float(os.getenv('ASANA_READ_TIMEOUT', '30'))
+ASANA_MAX_RETRIES = int(os.getenv('ASANA_MAX_RETRIES', '3'))
+ASANA_BACKOFF_BASE = float(os.getenv('ASANA_BACKOFF_BASE', '0.5'))
+ASANA_BACKOFF_MAX = float(os.getenv('ASANA_BACKOFF_MAX', '30'))
+ASANA_REQUESTS_PER_MINUTE = int(os.getenv('ASANA_REQUESTS_PER_MINUTE', '1500'))
+ASANA_RATE_LIMIT_BURST = int(os.getenv('ASANA_RATE_LIMIT_BURST', '150'))
+ASANA_MAX_CONCURRENT_READS = int(os.getenv('ASANA_MAX_CONCURRENT_READS', '50'))
+ASANA_MAX_CONCURRENT_WRITES = int(os.getenv('ASANA_MAX_CONCURRENT_WRITES', '15'))
+ASANA_MAX_RATE_LIMIT_RETRIES = int(os.getenv('ASANA_MAX_RATE_LIMIT_RETRIES', '5'))
+ASANA_WEBHOOK_SECRET = os.getenv('ASANA_WEBHOOK_SECRET')  # Otherwise taken from the webhook handshake
+ASANA_WEBHOOK_HANDSHAKE_SECONDS = int(os.getenv('ASANA_WEBHOOK_HANDSHAKE_SECONDS', '120'))  # How long a registration accepts the handshake
+WEBHOOK_DEBOUNCE_SECONDS = float(os.getenv('WEBHOOK_DEBOUNCE_SECONDS', '2'))
+WEBHOOK_MAX_DELAY_SECONDS = float(os.getenv('WEBHOOK_MAX_DELAY_SECONDS', '10'))
 
 # Google Calendar API configuration
 GOOGLE_CREDENTIALS_FILE = os.getenv('GOOGLE_CREDENTIALS_FILE', 'credentials.json')
 GOOGLE_TOKEN_FILE = os.getenv('GOOGLE_TOKEN_FILE', 'token.json')
 GOOGLE_CALENDAR_ID = os.getenv('GOOGLE_CALENDAR_ID', 'primary')
+GOOGLE_TOKEN_REFRESH_MARGIN = int(os.getenv('GOOGLE_TOKEN_REFRESH_MARGIN', '300'))  # Refresh this many seconds before expiry
+GOOGLE_TOKEN_REFRESH_INTERVAL = int(os.getenv('GOOGLE_TOKEN_REFRESH_INTERVAL', '60'))
+GOOGLE_BATCH_SIZE = int(os.getenv('GOOGLE_BATCH_SIZE', '50'))  # Calendar API allows at most 50 calls per batch
+GOOGLE_WATCH_ADDRESS = os.getenv('GOOGLE_WATCH_ADDRESS')  # Public HTTPS URL of /api/webhooks/google; unset disables push notifications
+GOOGLE_WATCH_TTL_SECONDS = int(os.getenv('GOOGLE_WATCH_TTL_SECONDS', '604800'))
+GOOGLE_WATCH_RENEW_MARGIN = int(os.getenv('GOOGLE_WATCH_RENEW_MARGIN', '3600'))
+GOOGLE_WATCH_CHECK_INTERVAL = int(os.getenv('GOOGLE_WATCH_CHECK_INTERVAL', '300'))
+
+# Dashboard configuration
+SYNCED_TASKS_PAGE_SIZE = int(os.getenv('SYNCED_TASKS_PAGE_SIZE', '50'))
+SYNCED_TASKS_MAX_PAGE_SIZE = int(os.getenv('SYNCED_TASKS_MAX_PAGE_SIZE', '500'))
+
+# Health check configuration
+HEALTH_CHECK_INTERVAL_SECONDS = int(os.getenv('HEALTH_CHECK_INTERVAL_SECONDS', '30'))  # 0 probes only on demand
+HEALTH_CHECK_MAX_AGE_SECONDS = int(os.getenv('HEALTH_CHECK_MAX_AGE_SECONDS', '30'))  # On demand, older results are re-probed
 
 # Sync configuration
-SYNC_INTERVAL_MINUTES = int(os.getenv('SYNC_INTERVAL_MINUTES', '15'))
+SYNC_INTERVAL_MINUTES = int(os.getenv('SYNC_INTERVAL_MINUTES', '15'))  # 0 disables scheduled syncs
+SYNC_LEASE_TTL_SECONDS = int(os.getenv('SYNC_LEASE_TTL_SECONDS', '60'))
+SYNC_LEASE_POLL_SECONDS = float(os.getenv('SYNC_LEASE_POLL_SECONDS', '1'))
+SYNC_LEASE_MAX_WAIT_SECONDS = int(os.getenv('SYNC_LEASE_MAX_WAIT_SECONDS', '3600'))
+MULTI_TENANT = os.getenv('MULTI_TENANT', 'False').lower() == 'true'  # Sync the workspaces stored in the database
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', '4'))
+SHARD_POLL_SECONDS = float(os.getenv('SHARD_POLL_SECONDS', '5'))
+SYNC_SCHEDULER_ENABLED = os.getenv('SYNC_SCHEDULER_ENABLED', 'True').lower() == 'true'
+BACKGROUND_THREADS_ENABLED = os.getenv('BACKGROUND_THREADS_ENABLED', 'True').lower() == 'true'  # Scheduler timer, calendar watch and health probes started by app.py
+SYNC_JOB_HISTORY = int(os.getenv('SYNC_JOB_HISTORY', '100'))
 SCHEDULE_TAG_NAME = os.getenv('SCHEDULE_TAG_NAME', 'schedule')
+SYNC_MAX_WORKERS = int(os.getenv('SYNC_MAX_WORKERS', '1'))  # 1 runs calendar batches sequentially
+SYNC_INCREMENTAL = os.getenv('SYNC_INCREMENTAL', 'False').lower() == 'true'
+SYNC_DELETE_EVENTS = os.getenv('SYNC_DELETE_EVENTS', 'False').lower() == 'true'
+SYNC_RECONCILE_CALENDAR = os.getenv('SYNC_RECONCILE_CALENDAR', 'False').lower() == 'true'
+SYNC_CONCURRENCY = int(os.getenv('SYNC_CONCURRENCY', '20'))  # In-flight events for AsyncTaskSynchronizer
+SYNC_PROFILE = os.getenv('SYNC_PROFILE', 'False').lower() == 'true'  # Profile every sync job; POST /api/sync?profile=1 profiles one
+SYNC_PROFILE_DIR = os.getenv('SYNC_PROFILE_DIR', 'profiles')
+SYNC_PROFILE_KEEP = int(os.getenv('SYNC_PROFILE_KEEP', '20'))
+SYNC_PLAN_CHECKPOINT_MIN_ACTIONS = int(os.getenv('SYNC_PLAN_CHECKPOINT_MIN_ACTIONS', '200'))  # Smaller plans are applied without checkpoints
+SYNC_PLAN_MAX_AGE_MINUTES = int(os.getenv('SYNC_PLAN_MAX_AGE_MINUTES', '60'))  # Older interrupted plans are planned again instead of resumed
+
+# Admin endpoints require "Authorization: Bearer <token>"; unset disables them
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
@@ -8,6 +8,12 @@ document.addEventListener('DOMContentLoaded', function() {
     const errorsEl = document.getElementById('errors');
     const lastSyncTimeEl = document.getElementById('last-sync-time');
     const syncedTasksList = document.getElementById('synced-tasks-list');
+    const syncedTasksEmpty = document.getElementById('synced-tasks-empty');
+    const syncedTasksFilter = document.getElementById('synced-tasks-filter');
+    const loadMoreButton = document.getElementById('load-more-button');
+    
+    // Cursor of the next page of synced tasks, or null when all are loaded
+    let nextCursor = null;
     
     // Helper function to format dates
     function formatDateTime(isoString) {
@@ -25,15 +31,97 @@ document.addEventListener('DOMContentLoaded', function() {
         lastSyncTimeEl.textContent = `Last synced: ${formatDateTime(timestamp)}`;
         syncResults.style.display = 'block';
         
-        // If any events were created, refresh the page after 2 seconds
-        // to update the synced tasks list
-        if (stats.events_created > 0) {
-            setTimeout(() => {
-                window.location.reload();
-            }, 2000);
+        // If any events were created or updated, reload the synced tasks list
+        if (stats.events_created > 0 || stats.events_updated > 0) {
+            loadSyncedTasks(true);
         }
     }
     
+    // Append a synced task row to the list
+    function addTaskRow(task) {
+        const row = document.createElement('tr');
+        [task.asana_task_name, formatDateTime(task.asana_due_date + 'Z'), formatDateTime(task.updated_at + 'Z')]
+            .forEach(value => {
+                const cell = document.createElement('td');
+                cell.textContent = value;
+                row.appendChild(cell);
+            });
+        syncedTasksList.appendChild(row);
+    }
+    
+    // Load the next page of synced tasks, or the first page again when reset
+    function loadSyncedTasks(reset) {
+        const params = new URLSearchParams({fields: 'asana_task_name,asana_due_date,updated_at'});
+        const name = document.getElementById('filter-name').value;
+        const dueFrom = document.getElementById('filter-due-from').value;
+        const dueTo = document.getElementById('filter-due-to').value;
+        if (name) params.set('name', name);
+        if (dueFrom) params.set('due_from', dueFrom);
+        if (dueTo) params.set('due_to', dueTo);
+        if (!reset && nextCursor) params.set('cursor', nextCursor);
+        
+        loadMoreButton.disabled = true;
+        fetch(`/api/synced-tasks?${params}`)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('Synced tasks request failed');
+                }
+                return response.json();
+            })
+            .then(data => {
+                if (reset) {
+                    syncedTasksList.innerHTML = '';
+                }
+                data.tasks.forEach(addTaskRow);
+                nextCursor = data.next_cursor;
+                
+                syncedTasksEmpty.style.display = syncedTasksList.children.length ? 'none' : 'block';
+                loadMoreButton.style.display = nextCursor ? 'inline-block' : 'none';
+                loadMoreButton.disabled = false;
+            })
+            .catch(error => {
+                console.error('Error loading synced tasks:', error);
+                loadMoreButton.disabled = false;
+            });
+    }
+    
+    loadMoreButton.addEventListener('click', () => loadSyncedTasks(false));
+    syncedTasksFilter.addEventListener('submit', event => {
+        event.preventDefault();
+        loadSyncedTasks(true);
+    });
+    
+    // Load the first page once the dashboard is shown
+    loadSyncedTasks(true);
+    
+    // Poll a sync job until it has finished, showing progress meanwhile
+    function waitForJob(jobId) {
+        return new Promise((resolve, reject) => {
+            function poll() {
+                fetch(`/api/sync/${jobId}`)
+                    .then(response => {
+                        if (!response.ok) {
+                            throw new Error('Sync status request failed');
+                        }
+                        return response.json();
+                    })
+                    .then(data => {
+                        const job = data.job;
+                        if (job.status === 'succeeded' || job.status === 'failed') {
+                            resolve(job);
+                            return;
+                        }
+                        if (job.progress && job.progress.tasks_found !== undefined) {
+                            syncStatus.innerHTML = `<i class="bi bi-arrow-repeat sync-animate"></i> Synchronization in progress... ${job.progress.tasks_found} tasks checked`;
+                        }
+                        setTimeout(poll, 1000);
+                    })
+                    .catch(reject);
+            }
+            poll();
+        });
+    }
+    
     // Set up sync button click handler
     syncButton.addEventListener('click', function() {
         // Update button state to show syncing
@@ -43,7 +131,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // Update status
         syncStatus.innerHTML = '<i class="bi bi-arrow-repeat sync-animate"></i> Synchronization in progress...';
         
-        // Call the sync API endpoint
+        // Queue a sync job, then poll it until it finishes
         fetch('/api/sync', {
             method: 'POST',
             headers: {
@@ -56,20 +144,25 @@ document.addEventListener('DOMContentLoaded', function() {
             }
             return response.json();
         })
-        .then(data => {
+        .then(data => waitForJob(data.job_id))
+        .then(job => {
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Sync job failed');
+            }
+            
             // Update button state
             syncButton.disabled = false;
             syncButton.innerHTML = '<i class="bi bi-arrow-repeat"></i> Sync Tasks to Calendar';
             
             // Update status
-            if (data.stats.errors > 0) {
+            if (job.stats.errors > 0) {
                 syncStatus.innerHTML = '<i class="bi bi-exclamation-triangle text-warning"></i> Sync completed with some errors';
             } else {
                 syncStatus.innerHTML = '<i class="bi bi-check-circle text-success"></i> Sync completed successfully';
             }
             
             // Update results display
-            updateResults(data.stats, data.timestamp);
+            updateResults(job.stats, job.finished_at + 'Z');
         })
         .catch(error => {
             console.error('Error during sync:', error);
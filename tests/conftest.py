@@ -0,0 +1,17 @@
+import pytest
+from flask import Flask
+
+from utils.db import db, init_db
+
+@pytest.fixture
+def app():
+    """Create a Flask app backed by an in-memory SQLite database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    init_db(app)
+    
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,177 @@
+import hashlib
+import hmac
+import json
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+
+import config
+from utils.db import AsanaWebhook, SyncedTask, add_synced_task, db
+
+ADMIN_HEADERS = {'Authorization': 'Bearer admin'}
+
+@pytest.fixture(scope='module')
+def app_module():
+    """Import the app against an in-memory database with its background threads off"""
+    with patch.multiple(config, SQLALCHEMY_DATABASE_URI='sqlite:///:memory:', BACKGROUND_THREADS_ENABLED=False):
+        import app as app_module
+    return app_module
+
+@pytest.fixture
+def client(app_module):
+    """Test client with the synced tasks and webhook state of earlier tests cleared"""
+    with app_module.app.app_context():
+        SyncedTask.query.delete()
+        AsanaWebhook.query.delete()
+        db.session.commit()
+    # Queued jobs stay queued instead of running a sync on the worker thread
+    with patch.object(app_module.scheduler, '_ensure_worker'), \
+         patch.multiple(config, ADMIN_TOKEN='admin', ASANA_WORKSPACE_ID='workspace'):
+        yield app_module.app.test_client()
+
+def store_webhook_secret(app_module, secret):
+    """Record a webhook secret as an earlier handshake would have"""
+    with app_module.app.app_context():
+        db.session.add(AsanaWebhook(workspace_id=config.ASANA_WORKSPACE_ID, secret=secret))
+        db.session.commit()
+
+def sign(secret, body):
+    """X-Hook-Signature of a delivery body"""
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+def test_unsolicited_handshake_is_rejected(client):
+    """Test that a handshake without a pending registration cannot set the secret"""
+    response = client.post('/api/webhooks/asana', headers={'X-Hook-Secret': 'forged'})
+    
+    assert response.status_code == 403
+    assert 'X-Hook-Secret' not in response.headers
+
+def test_registration_accepts_handshake_and_replaces_secret(app_module, client):
+    """Test that the handshake during an admin registration is echoed and its secret stored"""
+    def create_webhook(resource_id, target):
+        # Asana sends the handshake before answering the registration
+        handshake = client.post('/api/webhooks/asana', headers={'X-Hook-Secret': 'new-secret'})
+        assert handshake.status_code == 200
+        assert handshake.headers['X-Hook-Secret'] == 'new-secret'
+        return {'gid': 'webhook1', 'resource': {'gid': resource_id}, 'target': target}
+    
+    store_webhook_secret(app_module, 'old-secret')
+    
+    with patch.object(app_module.asana_probe_client, 'create_webhook', side_effect=create_webhook), \
+         patch.object(config, 'ASANA_WEBHOOK_SECRET', None):
+        response = client.post('/api/admin/webhooks/asana', json={'resource': 'tag1'}, headers=ADMIN_HEADERS)
+    
+    assert response.status_code == 201
+    assert response.get_json()['webhook']['target'] == 'http://localhost/api/webhooks/asana'
+    with app_module.app.app_context():
+        assert app_module.asana_webhook_secret() == 'new-secret'
+        assert not app_module.asana_webhook_pending()
+    
+    # The registration is over, so later handshakes are rejected again
+    assert client.post('/api/webhooks/asana', headers={'X-Hook-Secret': 'later'}).status_code == 403
+
+def test_webhook_registration_requires_admin_token(client):
+    """Test that only the admin can open the handshake window, and nobody can without a token configured"""
+    response = client.post('/api/admin/webhooks/asana', json={'resource': 'tag1'})
+    assert response.status_code == 401
+    
+    with patch.object(config, 'ADMIN_TOKEN', None):
+        response = client.post('/api/admin/webhooks/asana', json={'resource': 'tag1'}, headers=ADMIN_HEADERS)
+    assert response.status_code == 403
+
+def test_delivery_signature_is_checked(app_module, client):
+    """Test that only deliveries signed with the stored secret are accepted"""
+    store_webhook_secret(app_module, 'secret')
+    body = json.dumps({'events': [
+        {'action': 'changed', 'resource': {'gid': 'task1', 'resource_type': 'task'}}
+    ]}).encode()
+    
+    with patch.object(config, 'ASANA_WEBHOOK_SECRET', None), \
+         patch.object(app_module.webhook_events, 'add', return_value=1) as add:
+        forged = client.post('/api/webhooks/asana', data=body, content_type='application/json',
+                             headers={'X-Hook-Signature': sign('other', body)})
+        unsigned = client.post('/api/webhooks/asana', data=body, content_type='application/json')
+        signed = client.post('/api/webhooks/asana', data=body, content_type='application/json',
+                             headers={'X-Hook-Signature': sign('secret', body)})
+    
+    assert forged.status_code == 401
+    assert unsigned.status_code == 401
+    assert signed.status_code == 200
+    assert signed.get_json()['queued'] == 1
+    add.assert_called_once()
+
+def test_sync_queues_job(client):
+    """Test that a sync request is accepted with a job to poll, which later clicks attach to"""
+    response = client.post('/api/sync')
+    
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    assert client.post('/api/sync').get_json()['job_id'] == job_id
+    
+    job = client.get(f'/api/sync/{job_id}')
+    assert job.status_code == 200
+    assert job.get_json()['job']['status'] == 'queued'
+
+def test_unknown_sync_job(client):
+    """Test that polling a job that does not exist is a 404"""
+    response = client.get('/api/sync/unknown')
+    
+    assert response.status_code == 404
+    assert response.get_json()['success'] is False
+
+def test_synced_tasks_pages(app_module, client):
+    """Test that synced tasks are listed page by page with the requested fields"""
+    with app_module.app.app_context():
+        for i in range(3):
+            add_synced_task(f"task{i}", f"Task {i}", datetime(2023, 10, 10 + i), f"event{i}")
+    
+    first = client.get('/api/synced-tasks?limit=2&fields=asana_task_id').get_json()
+    assert [task['asana_task_id'] for task in first['tasks']] == ["task0", "task1"]
+    assert set(first['tasks'][0]) == {'asana_task_id'}
+    
+    second = client.get(f"/api/synced-tasks?limit=2&cursor={first['next_cursor']}").get_json()
+    assert [task['asana_task_id'] for task in second['tasks']] == ["task2"]
+    assert second['next_cursor'] is None
+
+@pytest.mark.parametrize('query', ['cursor=garbage', 'fields=asana_task_id,password', 'limit=ten',
+                                   'due_from=yesterday'])
+def test_synced_tasks_rejects_bad_parameters(client, query):
+    """Test that malformed listing parameters are a 400, not a 500"""
+    response = client.get(f'/api/synced-tasks?{query}')
+    
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+def test_metrics(client):
+    """Test that metrics are served in the Prometheus text format"""
+    response = client.get('/metrics')
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+@pytest.mark.parametrize('path', ['/api/admin/profiles', '/api/admin/profiles/run1', '/api/admin/sync-plan'])
+def test_admin_routes_require_token(client, path):
+    """Test that admin routes refuse requests without the admin bearer token"""
+    missing = client.get(path)
+    wrong = client.get(path, headers={'Authorization': 'Bearer other'})
+    
+    assert missing.status_code == 401
+    assert wrong.status_code == 401
+
+@pytest.mark.parametrize('path', ['/api/admin/profiles', '/api/admin/sync-plan'])
+def test_admin_routes_disabled_without_token(client, path):
+    """Test that admin routes fail closed when no admin token is configured"""
+    with patch.object(config, 'ADMIN_TOKEN', None):
+        anonymous = client.get(path)
+        guessed = client.get(path, headers={'Authorization': 'Bearer '})
+    
+    assert anonymous.status_code == 403
+    assert guessed.status_code == 403
+
+def test_admin_route_accepts_token(app_module, client):
+    """Test that the admin bearer token opens the admin routes"""
+    with patch.object(app_module.scheduler.profiler, 'list_profiles', return_value=[]):
+        response = client.get('/api/admin/profiles', headers=ADMIN_HEADERS)
+    
+    assert response.status_code == 200
+    assert response.get_json() == {'success': True, 'profiles': []}
@@ -1,23 +1,32 @@
 import pytest
+import requests
 from datetime import datetime, timezone
 from unittest.mock import MagicMock, patch
 
-from utils.asana_client import AsanaClient
-
-@pytest.fixture
-def mock_requests():
-    """Fixture to mock requests module"""
-    with patch('utils.asana_client.requests') as mock_requests:
-        yield mock_requests
+from utils.asana_client import AsanaClient, AsanaTask, SyncTokenExpired
+from utils.tag_cache import TagCache
 
 @pytest.fixture
 def asana_client():
     """Create an Asana client with mock credentials"""
     return AsanaClient(
         access_token="test_token",
-        workspace_id="test_workspace"
+        workspace_id="test_workspace",
+        tag_cache=TagCache(persist=False)
     )
 
+@pytest.fixture
+def mock_requests(asana_client):
+    """Fixture to mock the client's HTTP session"""
+    with patch.object(asana_client, 'session') as mock_session:
+        yield mock_session
+
+@pytest.fixture
+def mock_sleep():
+    """Fixture to skip backoff delays"""
+    with patch('utils.asana_client.time.sleep') as mock_sleep:
+        yield mock_sleep
+
 def test_init(asana_client):
     """Test client initialization"""
     assert asana_client.access_token == "test_token"
@@ -41,12 +50,62 @@ def test_make_request(asana_client, mock_requests):
         url="https://app.asana.com/api/1.0/test_endpoint",
         headers=asana_client.headers,
         params={"param": "value"},
-        json=None
+        json=None,
+        timeout=asana_client.timeout
     )
     
     # Check the result
     assert result == {"data": "test_data"}
 
+def test_make_request_retries_server_errors(asana_client, mock_requests, mock_sleep):
+    """Test that idempotent requests are retried on 5xx responses"""
+    error_response = MagicMock(status_code=503)
+    ok_response = MagicMock(status_code=200)
+    ok_response.json.return_value = {"data": "test_data"}
+    mock_requests.request.side_effect = [error_response, ok_response]
+    
+    result = asana_client._make_request("GET", "test_endpoint")
+    
+    assert result == {"data": "test_data"}
+    assert mock_requests.request.call_count == 2
+    assert mock_sleep.call_count == 1
+
+def test_make_request_retries_timeouts(asana_client, mock_requests, mock_sleep):
+    """Test that timeouts are retried until the retry budget is spent"""
+    mock_requests.request.side_effect = requests.exceptions.Timeout()
+    
+    with pytest.raises(requests.exceptions.Timeout):
+        asana_client._make_request("GET", "test_endpoint")
+    
+    assert mock_requests.request.call_count == asana_client.max_retries + 1
+
+def test_make_request_does_not_retry_post(asana_client, mock_requests, mock_sleep):
+    """Test that non-idempotent requests are sent only once"""
+    error_response = MagicMock(status_code=503)
+    error_response.raise_for_status.side_effect = requests.exceptions.HTTPError()
+    mock_requests.request.return_value = error_response
+    
+    with pytest.raises(requests.exceptions.HTTPError):
+        asana_client._make_request("POST", "tags", data={"data": {}})
+    
+    assert mock_requests.request.call_count == 1
+    mock_sleep.assert_not_called()
+
+def test_make_request_honors_retry_after(asana_client, mock_requests, mock_sleep):
+    """Test that a 429 pauses the rate limiter and resends the request"""
+    throttled_response = MagicMock(status_code=429, headers={"Retry-After": "7"})
+    ok_response = MagicMock(status_code=201)
+    ok_response.json.return_value = {"data": {"gid": "tag1"}}
+    mock_requests.request.side_effect = [throttled_response, ok_response]
+    asana_client.rate_limiter = MagicMock()
+    
+    # Even a POST is resent, since Asana rejected it before processing
+    result = asana_client._make_request("POST", "tags", data={"data": {}})
+    
+    assert result == {"data": {"gid": "tag1"}}
+    assert mock_requests.request.call_count == 2
+    asana_client.rate_limiter.pause.assert_called_once_with(7.0)
+
 def test_get_tasks_with_tag(asana_client, mock_requests):
     """Test getting tasks with a specific tag"""
     # Mock tag response
@@ -73,10 +132,8 @@ def test_get_tasks_with_tag(asana_client, mock_requests):
     # Call the method
     tasks = asana_client.get_tasks_with_tag("schedule")
     
-    # Check the result
-    assert len(tasks) == 2
-    assert tasks[0]["gid"] == "task1"
-    assert tasks[1]["gid"] == "task2"
+    # Check the result: the task dicts as Asana returned them
+    assert tasks == tasks_response.json.return_value["data"]
     
     # Check the requests were made correctly
     assert mock_requests.request.call_count == 2
@@ -86,17 +143,181 @@ def test_get_tasks_with_tag(asana_client, mock_requests):
         url="https://app.asana.com/api/1.0/workspaces/test_workspace/tags",
         headers=asana_client.headers,
         params={"limit": 100},
-        json=None
+        json=None,
+        timeout=asana_client.timeout
     )
     # Second call should be to get the tasks with that tag
     mock_requests.request.assert_any_call(
         method="GET",
         url="https://app.asana.com/api/1.0/tags/tag2/tasks",
         headers=asana_client.headers,
-        params={"opt_fields": "name,due_on,due_at,completed", "completed": False},
-        json=None
+        params={"opt_fields": "name,due_on,due_at,completed", "completed": False, "limit": 100},
+        json=None,
+        timeout=asana_client.timeout
     )
 
+def test_iter_tasks_with_tag_follows_pages(asana_client, mock_requests):
+    """Test that tasks are streamed across next_page offsets"""
+    tag_response = MagicMock()
+    tag_response.json.return_value = {"data": [{"gid": "tag2", "name": "schedule"}]}
+    
+    # Two pages of tasks linked by an offset cursor
+    page1 = MagicMock()
+    page1.json.return_value = {
+        "data": [{"gid": "task1", "name": "Test Task 1"}],
+        "next_page": {"offset": "cursor1"}
+    }
+    page2 = MagicMock()
+    page2.json.return_value = {
+        "data": [{"gid": "task2", "name": "Test Task 2"}],
+        "next_page": None
+    }
+    mock_requests.request.side_effect = [tag_response, page1, page2]
+    
+    tasks = asana_client.iter_tasks_with_tag("schedule", page_size=1)
+    
+    # Nothing is fetched until the generator is consumed
+    mock_requests.request.assert_not_called()
+    
+    # The first task is available after fetching only the first page
+    assert next(tasks).gid == "task1"
+    assert mock_requests.request.call_count == 2
+    
+    assert [task.gid for task in tasks] == ["task2"]
+    assert mock_requests.request.call_count == 3
+    
+    # The second page request should carry the cursor
+    _, kwargs = mock_requests.request.call_args
+    assert kwargs["params"]["offset"] == "cursor1"
+    assert kwargs["params"]["limit"] == 1
+
+def test_get_tag_id_pages_and_caches(asana_client, mock_requests):
+    """Test that the tag index is built across pages and reused"""
+    page1 = MagicMock()
+    page1.json.return_value = {
+        "data": [{"gid": "tag1", "name": "other_tag"}],
+        "next_page": {"offset": "cursor1"}
+    }
+    page2 = MagicMock()
+    page2.json.return_value = {
+        "data": [{"gid": "tag2", "name": "Schedule"}],
+        "next_page": None
+    }
+    mock_requests.request.side_effect = [page1, page2]
+    
+    # Tags past the first page are found
+    assert asana_client.get_tag_id("schedule") == "tag2"
+    assert mock_requests.request.call_count == 2
+    
+    # Later lookups are served from the cache
+    assert asana_client.get_tag_id("other_tag") == "tag1"
+    assert asana_client.get_tag_id("missing") is None
+    assert mock_requests.request.call_count == 2
+
+def test_add_tag_to_task_creates_and_caches_tag(asana_client, mock_requests):
+    """Test that a newly created tag is added to the cached index"""
+    tags_response = MagicMock()
+    tags_response.json.return_value = {"data": []}
+    create_response = MagicMock()
+    create_response.json.return_value = {"data": {"gid": "new_tag"}}
+    add_response = MagicMock()
+    add_response.json.return_value = {"data": {}}
+    mock_requests.request.side_effect = [tags_response, create_response, add_response]
+    
+    assert asana_client.add_tag_to_task("task1", "schedule") is True
+    assert asana_client.get_tag_id("schedule") == "new_tag"
+    assert mock_requests.request.call_count == 3
+
+def test_get_events_pages_until_done(asana_client, mock_requests):
+    """Test that events are collected across has_more pages"""
+    page1 = MagicMock(status_code=200)
+    page1.json.return_value = {"data": [{"action": "added"}], "sync": "token2", "has_more": True}
+    page2 = MagicMock(status_code=200)
+    page2.json.return_value = {"data": [{"action": "changed"}], "sync": "token3", "has_more": False}
+    mock_requests.request.side_effect = [page1, page2]
+    
+    events, sync_token = asana_client.get_events("tag2", "token1")
+    
+    assert [event["action"] for event in events] == ["added", "changed"]
+    assert sync_token == "token3"
+    _, kwargs = mock_requests.request.call_args
+    assert kwargs["params"] == {"resource": "tag2", "sync": "token2"}
+
+def test_get_events_expired_token(asana_client, mock_requests):
+    """Test that a 412 raises SyncTokenExpired carrying a fresh token"""
+    expired_response = MagicMock(status_code=412)
+    expired_response.json.return_value = {"sync": "fresh_token", "errors": []}
+    expired_response.raise_for_status.side_effect = requests.exceptions.HTTPError(
+        response=expired_response)
+    mock_requests.request.return_value = expired_response
+    
+    with pytest.raises(SyncTokenExpired) as excinfo:
+        asana_client.get_events("tag2", "old_token")
+    
+    assert excinfo.value.sync_token == "fresh_token"
+
+def test_iter_changed_tasks(asana_client):
+    """Test that changed tasks are fetched once and filtered by tag and completion"""
+    events = [
+        {"action": "changed", "resource": {"gid": "task1", "resource_type": "task"}},
+        {"action": "added", "resource": {"gid": "task1", "resource_type": "task"}},
+        {"action": "added", "resource": {"gid": "task2", "resource_type": "task"}},
+        {"action": "changed", "resource": {"gid": "task3", "resource_type": "task"}},
+        {"action": "removed", "resource": {"gid": "task4", "resource_type": "task"}},
+        {"action": "deleted", "resource": {"gid": "task5", "resource_type": "task"}},
+        {"action": "changed", "resource": {"gid": "story1", "resource_type": "story"}},
+    ]
+    tasks = {
+        "task1": {"gid": "task1", "completed": False, "tags": [{"name": "Schedule"}]},
+        "task2": {"gid": "task2", "completed": True, "tags": [{"name": "schedule"}]},
+        "task3": {"gid": "task3", "completed": False, "tags": []},
+        "task4": {"gid": "task4", "completed": False, "tags": [{"name": "other_tag"}]},
+    }
+    asana_client.get_task = MagicMock(side_effect=lambda task_id: tasks[task_id])
+    removed = []
+    
+    changed = list(asana_client.iter_changed_tasks("schedule", events, removed=removed))
+    
+    assert [task.gid for task in changed] == ["task1"]
+    assert removed == ["task2", "task3", "task4", "task5"]
+    # Deleted tasks are not fetched
+    assert asana_client.get_task.call_count == 4
+
+def test_iter_changed_tasks_reports_failed_fetches(asana_client):
+    """Test that tasks that could not be fetched are reported rather than dropped silently"""
+    events = [
+        {"action": "changed", "resource": {"gid": "task1", "resource_type": "task"}},
+        {"action": "changed", "resource": {"gid": "task2", "resource_type": "task"}},
+    ]
+    
+    def get_task(task_id):
+        if task_id == "task1":
+            raise requests.exceptions.Timeout()
+        return {"gid": task_id, "completed": False, "tags": [{"name": "schedule"}]}
+    asana_client.get_task = MagicMock(side_effect=get_task)
+    removed, failed = [], []
+    
+    changed = list(asana_client.iter_changed_tasks("schedule", events, removed, failed))
+    
+    assert [task.gid for task in changed] == ["task2"]
+    assert (removed, failed) == ([], ["task1"])
+
+def test_iter_tasks_with_tag_reports_errors(asana_client, mock_requests):
+    """Test that a scan that stops partway reports the error"""
+    tag_response = MagicMock(status_code=200)
+    tag_response.json.return_value = {"data": [{"gid": "tag2", "name": "schedule"}]}
+    page1 = MagicMock(status_code=200)
+    page1.json.return_value = {"data": [{"gid": "task1"}], "next_page": {"offset": "cursor1"}}
+    forbidden = MagicMock(status_code=403)
+    forbidden.raise_for_status.side_effect = requests.exceptions.HTTPError(response=forbidden)
+    mock_requests.request.side_effect = [tag_response, page1, forbidden]
+    errors = []
+    
+    tasks = list(asana_client.iter_tasks_with_tag("schedule", errors=errors))
+    
+    assert [task.gid for task in tasks] == ["task1"]
+    assert len(errors) == 1
+
 def test_parse_due_date(asana_client):
     """Test parsing due dates from Asana tasks"""
     # Test with due_at (includes time)
@@ -135,3 +356,35 @@ def test_has_time_component(asana_client):
     # Task with no due date should return False
     task3 = {}
     assert asana_client.has_time_component(task3) is False
+
+def test_asana_task_record():
+    """Test that a record keeps only the opted fields and parses its due date once"""
+    task = AsanaTask.from_api({
+        "gid": "task1", "name": "Test Task", "due_on": "2023-10-10", "due_at": None,
+        "completed": False, "notes": "dropped"
+    })
+    
+    assert task == ("task1", "Test Task", "2023-10-10", None, False,
+                    datetime(2023, 10, 10, tzinfo=timezone.utc))
+    assert not hasattr(task, "__dict__")
+    with pytest.raises(AttributeError):
+        task.name = "Renamed"
+    
+    # The client helpers accept records as well as raw dicts
+    assert AsanaClient.parse_due_date(None, task) is task.due_date
+    assert AsanaClient.has_time_component(None, task) is False
+
+def test_get_tag_id_reloads_stale_index_on_miss(asana_client, mock_requests):
+    """Test that a name missing from an older cached index reloads it once"""
+    asana_client.tag_cache.set("test_workspace", {"other_tag": "tag1"})
+    tags_response = MagicMock()
+    tags_response.json.return_value = {"data": [{"gid": "tag2", "name": "schedule"}]}
+    mock_requests.request.return_value = tags_response
+    
+    # Any cached index counts as old
+    with patch('utils.asana_client.config.TAG_CACHE_MISS_RELOAD_SECONDS', 0):
+        assert asana_client.get_tag_id("schedule") == "tag2"
+    
+    # The reloaded index is fresh, so another miss does not reload it again
+    assert asana_client.get_tag_id("missing") is None
+    assert mock_requests.request.call_count == 1
@@ -0,0 +1,262 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from utils.asana_client import AsanaTask
+from utils.async_sync import AsyncAsanaClient, AsyncTaskSynchronizer, EventGone
+from utils.rate_limit import RateLimiter
+from utils.sync import TaskSynchronizer, task_fingerprint
+from utils.tag_cache import TagCache
+
+def make_async_iter(items):
+    """Return a function producing an async iterator over items"""
+    async def iterate(*args, **kwargs):
+        for item in items:
+            yield item
+    return iterate
+
+@pytest.fixture
+def mock_asana_client():
+    """Create a mock async Asana client"""
+    client = MagicMock()
+    client.workspace_id = "workspace"
+    client.throttled_seconds = 0.0
+    client.close = AsyncMock()
+    return client
+
+@pytest.fixture
+def mock_calendar_client():
+    """Create a mock async Google Calendar client"""
+    client = MagicMock()
+    client.close = AsyncMock()
+    client.create_event = AsyncMock(side_effect=lambda **kwargs: {"id": f"event-{kwargs['asana_task_id']}"})
+    client.patch_event = AsyncMock(side_effect=lambda event_id, **kwargs: {"id": event_id})
+    client.delete_event = AsyncMock(return_value=True)
+    return client
+
+def synced_state(task, event_id):
+    """Synced state of a task as get_synced_task_states returns it"""
+    return SimpleNamespace(
+        google_event_id=event_id,
+        asana_task_name=task.name,
+        content_hash=task_fingerprint(task)
+    )
+
+@pytest.fixture
+def sync_mock_db():
+    """Mock database functions; task0 is synced unchanged and task1 synced under an old name"""
+    states = {
+        "task0": synced_state(AsanaTask.from_api({"gid": "task0", "name": "Task 0", "due_on": "2023-10-10"}), "event-task0"),
+        "task1": synced_state(AsanaTask.from_api({"gid": "task1", "name": "Old name", "due_on": "2023-10-10"}), "event-task1"),
+    }
+    with patch('utils.async_sync.get_synced_task_states') as mock_states, \
+         patch('utils.sync.upsert_synced_tasks') as mock_upsert, \
+         patch('utils.sync.iter_synced_task_ids') as mock_iter_ids, \
+         patch('utils.async_sync.delete_synced_tasks_by_event_ids') as mock_delete:
+        mock_states.side_effect = lambda task_ids: {task_id: states[task_id] for task_id in task_ids
+                                                    if task_id in states}
+        mock_iter_ids.return_value = []
+        yield {
+            'states': states,
+            'upsert': mock_upsert,
+            'iter_ids': mock_iter_ids,
+            'delete': mock_delete
+        }
+
+def run_sync(synchronizer):
+    """Run a sync and close the synchronizer"""
+    async def run():
+        try:
+            return await synchronizer.sync_tasks()
+        finally:
+            await synchronizer.close()
+    return asyncio.run(run())
+
+def test_sync_tasks_stats(mock_asana_client, mock_calendar_client, sync_mock_db):
+    """Test that the async sync produces the same stats as TaskSynchronizer"""
+    mock_asana_client.iter_tasks_with_tag = make_async_iter([
+        {"gid": f"task{i}", "name": f"Task {i}", "due_on": "2023-10-10"}
+        for i in range(10)
+    ])
+    synchronizer = AsyncTaskSynchronizer(
+        asana_client=mock_asana_client,
+        calendar_client=mock_calendar_client,
+        concurrency=3
+    )
+    
+    stats = run_sync(synchronizer)
+    
+    assert set(stats) - {'throttled_seconds'} == set(TaskSynchronizer._new_stats(None)) | {'sync_mode'}
+    assert stats['sync_mode'] == 'full'
+    assert stats['tasks_found'] == 10
+    assert stats['already_synced'] == 1
+    assert stats['events_created'] == 8
+    assert stats['events_updated'] == 1
+    assert stats['errors'] == 0
+    rows = [row for call in sync_mock_db['upsert'].call_args_list for row in call.args[0]]
+    assert len(rows) == 9
+    assert all(row['resource_id'] == "workspace:schedule" for row in rows)
+
+def test_sync_tasks_patches_changed_task(mock_asana_client, mock_calendar_client, sync_mock_db):
+    """Test that a synced task whose name changed gets only its summary patched"""
+    mock_asana_client.iter_tasks_with_tag = make_async_iter([
+        {"gid": "task1", "name": "New name", "due_on": "2023-10-10"}
+    ])
+    synchronizer = AsyncTaskSynchronizer(
+        asana_client=mock_asana_client,
+        calendar_client=mock_calendar_client
+    )
+    
+    stats = run_sync(synchronizer)
+    
+    mock_calendar_client.create_event.assert_not_called()
+    mock_calendar_client.patch_event.assert_called_once_with(
+        "event-task1", summary="New name", start_time=None, has_time=False
+    )
+    assert stats['events_updated'] == 1
+    row = sync_mock_db['upsert'].call_args.args[0][0]
+    assert row['google_event_id'] == "event-task1"
+    assert row['asana_task_name'] == "New name"
+
+def test_sync_tasks_recreates_event_deleted_in_calendar(mock_asana_client, mock_calendar_client, sync_mock_db):
+    """Test that a patch of an event users deleted creates it again"""
+    mock_asana_client.iter_tasks_with_tag = make_async_iter([
+        {"gid": "task1", "name": "New name", "due_on": "2023-10-10"}
+    ])
+    mock_calendar_client.patch_event = AsyncMock(side_effect=EventGone("event-task1"))
+    synchronizer = AsyncTaskSynchronizer(
+        asana_client=mock_asana_client,
+        calendar_client=mock_calendar_client
+    )
+    
+    stats = run_sync(synchronizer)
+    
+    assert (stats['events_created'], stats['events_updated'], stats['errors']) == (1, 0, 0)
+    row = sync_mock_db['upsert'].call_args.args[0][0]
+    assert row['google_event_id'] == "event-task1"
+    mock_calendar_client.create_event.assert_called_once()
+
+def test_sync_tasks_deletes_tasks_missing_from_scan(mock_asana_client, mock_calendar_client, sync_mock_db):
+    """Test that synced tasks missing from a complete scan lose their events"""
+    mock_asana_client.iter_tasks_with_tag = make_async_iter([
+        {"gid": "task0", "name": "Task 0", "due_on": "2023-10-10"}
+    ])
+    sync_mock_db['iter_ids'].return_value = ["task0", "task1"]
+    synchronizer = AsyncTaskSynchronizer(
+        asana_client=mock_asana_client,
+        calendar_client=mock_calendar_client
+    )
+    
+    with patch('utils.sync.config.SYNC_DELETE_EVENTS', True):
+        stats = run_sync(synchronizer)
+    
+    mock_calendar_client.delete_event.assert_called_once_with("event-task1")
+    sync_mock_db['delete'].assert_called_once_with(["event-task1"])
+    assert stats['events_deleted'] == 1
+    assert stats['errors'] == 0
+
+def test_sync_tasks_respects_concurrency(mock_asana_client, mock_calendar_client, sync_mock_db):
+    """Test that no more than `concurrency` events are created at once"""
+    mock_asana_client.iter_tasks_with_tag = make_async_iter([
+        {"gid": f"task{i}", "name": f"Task {i}", "due_on": "2023-10-10"} for i in range(2, 22)
+    ])
+    active = 0
+    peak = 0
+    
+    async def create_event(**kwargs):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return None  # Failed inserts count as errors
+    mock_calendar_client.create_event = create_event
+    
+    synchronizer = AsyncTaskSynchronizer(
+        asana_client=mock_asana_client,
+        calendar_client=mock_calendar_client,
+        concurrency=4
+    )
+    stats = asyncio.run(synchronizer.sync_tasks())
+    
+    assert peak == 4
+    assert stats['errors'] == 20
+    sync_mock_db['upsert'].assert_not_called()
+
+def test_async_asana_client_pagination():
+    """Test that the async client follows next_page offsets"""
+    client = AsyncAsanaClient(
+        access_token="test_token",
+        workspace_id="test_workspace",
+        tag_cache=TagCache(persist=False)
+    )
+    client._make_request = AsyncMock(side_effect=[
+        {"data": [{"gid": "tag2", "name": "schedule"}]},
+        {"data": [{"gid": "task1"}], "next_page": {"offset": "cursor1"}},
+        {"data": [{"gid": "task2"}], "next_page": None},
+    ])
+    
+    async def collect():
+        return [task.gid async for task in client.iter_tasks_with_tag("schedule")]
+    
+    assert asyncio.run(collect()) == ["task1", "task2"]
+    _, kwargs = client._make_request.call_args
+    assert kwargs["params"]["offset"] == "cursor1"
+
+def test_async_get_tag_id_reloads_on_miss():
+    """Test that a tag created after the index was cached is found by reloading it"""
+    client = AsyncAsanaClient(
+        access_token="test_token",
+        workspace_id="test_workspace",
+        tag_cache=TagCache(persist=False)
+    )
+    client._make_request = AsyncMock(side_effect=[
+        {"data": [{"gid": "tag1", "name": "other"}]},
+        {"data": [{"gid": "tag1", "name": "other"}, {"gid": "tag2", "name": "schedule"}]},
+    ])
+    
+    assert asyncio.run(client.get_tag_id("other")) == "tag1"
+    with patch('utils.asana_client.config.TAG_CACHE_MISS_RELOAD_SECONDS', 0):
+        assert asyncio.run(client.get_tag_id("schedule")) == "tag2"
+    assert client._make_request.call_count == 2
+
+class FakeResponse:
+    """Minimal aiohttp response for _make_request"""
+    
+    def __init__(self, status, body=None, headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self.body = body
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        return False
+    
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise RuntimeError(f"HTTP {self.status}")
+    
+    async def json(self):
+        return self.body
+
+def test_async_asana_client_uses_rate_limiter():
+    """Test that requests go through the token's limiter, which a 429 pauses"""
+    session = MagicMock()
+    session.request.side_effect = [
+        FakeResponse(429, headers={"Retry-After": "0"}),
+        FakeResponse(503),
+        FakeResponse(200, {"data": []}),
+    ]
+    limiter = MagicMock(wraps=RateLimiter(requests_per_minute=6000, burst=100))
+    client = AsyncAsanaClient(access_token="test_token", workspace_id="test_workspace",
+                              session=session, rate_limiter=limiter)
+    
+    with patch('utils.async_sync.random.uniform', return_value=0):
+        # PUT is idempotent, so the 503 is retried as well
+        assert asyncio.run(client._make_request("PUT", "tasks/1")) == {"data": []}
+    
+    assert limiter.acquire_async.call_count == 3
+    limiter.pause.assert_called_once_with(0.0)
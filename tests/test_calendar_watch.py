@@ -0,0 +1,91 @@
+import pytest
+import time
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from utils.calendar_watch import CalendarWatchManager
+from utils.db import get_watch_channels
+from utils.lease import LeaseLock
+
+@pytest.fixture
+def calendar_client():
+    """Create a mock calendar client whose channels expire in an hour"""
+    client = MagicMock()
+    client.calendar_id = "primary"
+    
+    def watch_events(address, channel_id, token, ttl_seconds=None):
+        expiration = (time.time() + 3600) * 1000
+        return {'id': channel_id, 'resourceId': f"res-{channel_id}", 'expiration': str(int(expiration))}
+    
+    client.watch_events.side_effect = watch_events
+    return client
+
+@pytest.fixture
+def manager(app, calendar_client):
+    """Create a watch manager posting to a local address"""
+    return CalendarWatchManager(app, address="https://example.test/api/webhooks/google",
+                                calendar_client_factory=lambda: calendar_client, renew_margin=60)
+
+def notification_headers(channel, state='exists', token=None):
+    """Stand-in for Google: the headers of a push notification for a channel"""
+    return {
+        'X-Goog-Channel-ID': channel.channel_id,
+        'X-Goog-Channel-Token': channel.token if token is None else token,
+        'X-Goog-Resource-ID': channel.resource_id,
+        'X-Goog-Resource-State': state,
+        'X-Goog-Message-Number': '1'
+    }
+
+def test_ensure_channel_creates_once(manager, calendar_client):
+    """Test that a channel is opened once and reused while it is not near expiry"""
+    channel = manager.ensure_channel()
+    
+    assert manager.ensure_channel().channel_id == channel.channel_id
+    calendar_client.watch_events.assert_called_once()
+    args, _ = calendar_client.watch_events.call_args
+    assert args[0] == "https://example.test/api/webhooks/google"
+    assert channel.expires_at > datetime.utcnow()
+
+def test_ensure_channel_renews_and_stops_old(manager, calendar_client):
+    """Test that a channel near expiry is replaced and the old one stopped"""
+    old = manager.ensure_channel()
+    old.expires_at = datetime.utcnow() + timedelta(seconds=30)
+    
+    new = manager.ensure_channel()
+    
+    assert new.channel_id != old.channel_id
+    calendar_client.stop_channel.assert_called_once_with(old.channel_id, old.resource_id)
+    assert [channel.channel_id for channel in get_watch_channels("primary")] == [new.channel_id]
+
+def test_ensure_channel_leaves_renewal_to_lease_holder(app, manager, calendar_client):
+    """Test that a process without the watch lease does not open a competing channel"""
+    other = LeaseLock(app, manager.lease.name, owner="other-process")
+    assert other.acquire()
+    
+    try:
+        assert manager.ensure_channel() is None
+        calendar_client.watch_events.assert_not_called()
+    finally:
+        other.release(record=False)
+    
+    assert manager.ensure_channel() is not None
+    assert manager.lease.holder().owner is None
+
+def test_handle_notification(manager):
+    """Test that only notifications carrying a known channel's token and resource are accepted"""
+    channel = manager.ensure_channel()
+    
+    assert manager.handle_notification(notification_headers(channel, 'sync')) == 'sync'
+    assert manager.handle_notification(notification_headers(channel)) == 'exists'
+    assert manager.handle_notification(notification_headers(channel, token='forged')) is None
+    unknown = dict(notification_headers(channel), **{'X-Goog-Channel-ID': "unknown"})
+    assert manager.handle_notification(unknown) is None
+
+def test_stop_channels(manager, calendar_client):
+    """Test that stopping forgets channels even if Google already dropped them"""
+    manager.ensure_channel()
+    calendar_client.stop_channel.side_effect = Exception("404 channel not found")
+    
+    manager.stop_channels()
+    
+    assert get_watch_channels("primary") == []
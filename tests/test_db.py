@@ -0,0 +1,141 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from utils.db import (
+    db, SyncedTask, SchemaMigration, MIGRATIONS, migrate, add_synced_task, iter_synced_task_ids, upsert_synced_tasks,
+    get_sync_token, save_sync_token, delete_sync_token,
+    get_asana_webhook, open_webhook_handshake, close_webhook_handshake, accept_webhook_handshake,
+    list_synced_tasks, encode_listing_cursor, decode_listing_cursor
+)
+
+def make_row(index, event_prefix="event"):
+    """Build a synced task row for bulk helpers"""
+    return {
+        'asana_task_id': f"task{index}",
+        'asana_task_name': f"Task {index}",
+        'asana_due_date': datetime(2023, 10, 10),
+        'google_event_id': f"{event_prefix}{index}"
+    }
+
+def test_iter_synced_task_ids_by_resource(app):
+    """Test that synced task IDs are listed per workspace tag, optionally with unscoped rows"""
+    upsert_synced_tasks([dict(make_row(0), resource_id="w1:schedule"),
+                         dict(make_row(1), resource_id="w2:schedule")])
+    add_synced_task(**make_row(2))
+    
+    assert list(iter_synced_task_ids("w1:schedule")) == ["task0"]
+    assert sorted(iter_synced_task_ids("w1:schedule", include_unscoped=True)) == ["task0", "task2"]
+
+def test_upsert_synced_tasks_inserts_and_updates(app):
+    """Test that upserts insert new rows and update existing ones in place"""
+    add_synced_task(**make_row(0))
+    original_id = SyncedTask.query.filter_by(asana_task_id="task0").one().id
+    
+    with patch('utils.db.BULK_CHUNK_SIZE', 10):
+        upsert_synced_tasks([make_row(index, event_prefix="new") for index in range(4)])
+    
+    assert SyncedTask.query.count() == 4
+    task = SyncedTask.query.filter_by(asana_task_id="task0").one()
+    assert task.id == original_id
+    assert task.google_event_id == "new0"
+
+def test_upsert_synced_tasks_empty(app):
+    """Test that an empty upsert is a no-op"""
+    upsert_synced_tasks([])
+    assert SyncedTask.query.count() == 0
+
+def test_sync_token_roundtrip(app):
+    """Test storing, replacing and deleting sync tokens per resource"""
+    assert get_sync_token('asana', 'tag1') is None
+    
+    save_sync_token('asana', 'tag1', 'token1')
+    save_sync_token('asana', 'tag1', 'token2')
+    save_sync_token('asana', 'tag2', 'other')
+    assert get_sync_token('asana', 'tag1') == 'token2'
+    
+    delete_sync_token('asana', 'tag1')
+    assert get_sync_token('asana', 'tag1') is None
+    assert get_sync_token('asana', 'tag2') == 'other'
+
+def test_list_synced_tasks_keyset_pages(app):
+    """Test that pages follow each other by due date then ID without gaps or repeats"""
+    for index in range(5):
+        add_synced_task(**dict(make_row(index), asana_due_date=datetime(2023, 10, 10 + index % 2)))
+    
+    seen = []
+    after = None
+    while True:
+        rows, after = list_synced_tasks(after=after, limit=2, columns=['asana_task_id'])
+        seen.extend(row['asana_task_id'] for row in rows)
+        assert all(list(row) == ['asana_task_id'] for row in rows)
+        if after is None:
+            break
+    
+    assert seen == ["task0", "task2", "task4", "task1", "task3"]
+
+def test_list_synced_tasks_filters(app):
+    """Test the due date range and literal name prefix filters"""
+    add_synced_task(**dict(make_row(0), asana_task_name="Report_Q1", asana_due_date=datetime(2023, 1, 5)))
+    add_synced_task(**dict(make_row(1), asana_task_name="ReportXQ1", asana_due_date=datetime(2023, 1, 6)))
+    add_synced_task(**dict(make_row(2), asana_task_name="Report_Q2", asana_due_date=datetime(2023, 4, 5)))
+    
+    rows, after = list_synced_tasks(name_prefix="Report_", due_to=datetime(2023, 2, 1))
+    
+    assert [row['asana_task_name'] for row in rows] == ["Report_Q1"]
+    assert after is None
+    
+    rows, _ = list_synced_tasks(due_from=datetime(2023, 1, 6))
+    assert [row['asana_task_id'] for row in rows] == ["task1", "task2"]
+
+def test_listing_cursor_roundtrip():
+    """Test that cursors decode back to their key and bad cursors are rejected"""
+    key = (datetime(2023, 10, 10, 9, 30), 42)
+    
+    assert decode_listing_cursor(encode_listing_cursor(key)) == key
+    with pytest.raises(ValueError):
+        decode_listing_cursor("not-a-cursor")
+
+def test_migrate_upgrades_legacy_table(app):
+    """Test that migrations add the new column and indexes to a table from an older version"""
+    with db.engine.begin() as connection:
+        connection.execute(db.text('DROP TABLE synced_task'))
+        connection.execute(db.text(
+            'CREATE TABLE synced_task (id INTEGER PRIMARY KEY, asana_task_id VARCHAR(50) UNIQUE NOT NULL, '
+            'asana_task_name VARCHAR(200) NOT NULL, asana_due_date DATETIME NOT NULL, '
+            'google_event_id VARCHAR(100) UNIQUE NOT NULL, created_at DATETIME, updated_at DATETIME)'))
+    SchemaMigration.query.delete()
+    db.session.commit()
+    
+    assert migrate() == [version for version, _, _ in MIGRATIONS]
+    
+    inspector = db.inspect(db.engine)
+    assert {'content_hash', 'resource_id'} <= {column['name'] for column in inspector.get_columns('synced_task')}
+    assert {'ix_synced_task_due_date_id', 'ix_synced_task_updated_at', 'ix_synced_task_resource_id'} <= {
+        index['name'] for index in inspector.get_indexes('synced_task')}
+
+def test_migrate_is_idempotent(app):
+    """Test that recorded migrations are skipped and rerunning a migration is harmless"""
+    assert migrate() == []
+    
+    # A fresh database already has the schema, so applying again must not fail
+    for _, _, apply in MIGRATIONS:
+        apply()
+
+def test_webhook_handshake_window(app):
+    """Test that a handshake secret is only stored while the window is open, and only once"""
+    assert not accept_webhook_handshake("workspace", "early")
+    
+    open_webhook_handshake("workspace", datetime.utcnow() - timedelta(seconds=1))
+    assert not accept_webhook_handshake("workspace", "late")
+    
+    open_webhook_handshake("workspace", datetime.utcnow() + timedelta(minutes=1))
+    assert accept_webhook_handshake("workspace", "first")
+    assert not accept_webhook_handshake("workspace", "second")
+    
+    open_webhook_handshake("workspace", datetime.utcnow() + timedelta(minutes=1))
+    close_webhook_handshake("workspace")
+    assert not accept_webhook_handshake("workspace", "after-close")
+    
+    webhook = get_asana_webhook("workspace")
+    assert (webhook.secret, webhook.handshake_expires_at) == ("first", None)
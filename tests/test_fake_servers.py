@@ -0,0 +1,45 @@
+import pytest
+from unittest.mock import patch
+
+from benchmarks.fake_servers import FakeAsana, FakeCalendar
+from benchmarks.sync_benchmark import BenchCalendarClient
+from utils.asana_client import AsanaClient
+from utils.rate_limit import RateLimiter
+from utils.sync import TaskSynchronizer
+from utils.tag_cache import TagCache
+
+@pytest.fixture
+def fakes():
+    """Start local Asana and Calendar stand-ins"""
+    asana = FakeAsana(120, rate_limit_every=3, retry_after=0.01)
+    calendar = FakeCalendar()
+    asana.start()
+    calendar.start()
+    yield asana, calendar
+    asana.stop()
+    calendar.stop()
+
+def test_sync_against_fake_servers(app, fakes):
+    """Test a real sync over HTTP: paginated fetch through 429s, batched inserts, then a no-op resync"""
+    asana, calendar = fakes
+    asana_client = AsanaClient('token', 'workspace', tag_cache=TagCache(persist=False),
+                               rate_limiter=RateLimiter())
+    asana_client.BASE_URL = asana.base_url
+    synchronizer = TaskSynchronizer(asana_client, BenchCalendarClient(calendar.root_url))
+    
+    with patch('utils.sync.config.ASANA_PAGE_SIZE', 50):
+        stats = synchronizer.sync_tasks(incremental=False, reconcile=False)
+        
+        assert stats['tasks_found'] == 120
+        assert stats['events_created'] == 120
+        assert stats['errors'] == 0
+        assert asana.counts['tag_tasks'] == 3  # pages of 50
+        assert asana.counts['rate_limited'] >= 1
+        assert calendar.counts['batch_requests'] == 3
+        assert calendar.counts['inserts'] == 120
+        
+        calendar.counts.clear()
+        stats = synchronizer.sync_tasks(incremental=False, reconcile=False)
+    
+    assert stats['already_synced'] == 120
+    assert calendar.counts == {}
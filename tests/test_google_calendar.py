@@ -1,8 +1,13 @@
 import pytest
+import threading
 from datetime import datetime, timedelta
 from unittest.mock import MagicMock, patch
 
-from utils.calendar_client import GoogleCalendarClient
+from googleapiclient.errors import HttpError
+
+from utils.calendar_client import (
+    GoogleCalendarClient, MANAGED_BY, get_calendar_client, clear_calendar_clients
+)
 
 @pytest.fixture
 def mock_google_apis():
@@ -142,3 +147,205 @@ def test_delete_event(calendar_client, mock_google_apis):
         eventId="event123"
     )
     assert result is True
+
+def test_create_events_bulk(calendar_client, mock_google_apis):
+    """Test creating events in batches with per-item results"""
+    batches = []
+    
+    def new_batch_http_request(callback):
+        batch = MagicMock()
+        added = []
+        batch.add.side_effect = lambda request, request_id: added.append(request_id)
+        
+        def execute(http=None):
+            for request_id in added:
+                # Every third request fails
+                if int(request_id) % 3 == 2:
+                    callback(request_id, None, Exception("Quota exceeded"))
+                else:
+                    callback(request_id, {"id": f"event{request_id}"}, None)
+        batch.execute.side_effect = execute
+        batches.append(batch)
+        return batch
+    
+    mock_google_apis['service'].new_batch_http_request.side_effect = new_batch_http_request
+    
+    start_time = datetime.now()
+    events = [
+        {
+            'summary': f"Event {i}",
+            'description': "Test Description",
+            'start_time': start_time,
+            'has_time': True
+        }
+        for i in range(60)
+    ]
+    results = calendar_client.create_events_bulk(events)
+    
+    # 60 inserts fit in two batches of at most 50
+    assert len(batches) == 2
+    assert batches[0].add.call_count == 50
+    assert batches[1].add.call_count == 10
+    
+    # Results are returned in input order
+    assert len(results) == 60
+    assert results[0] == ({"id": "event0"}, None)
+    assert results[2][0] is None
+    assert str(results[2][1]) == "Quota exceeded"
+    assert results[58] == ({"id": "event58"}, None)
+
+def test_delete_events_bulk_batch_failure(calendar_client, mock_google_apis):
+    """Test that a failed batch marks each of its items as failed"""
+    batch = MagicMock()
+    batch.execute.side_effect = Exception("Network error")
+    mock_google_apis['service'].new_batch_http_request.return_value = batch
+    
+    results = calendar_client.delete_events_bulk(["event1", "event2"])
+    
+    assert [deleted for deleted, _ in results] == [False, False]
+    assert all(error is not None for _, error in results)
+
+def test_create_event_marks_managed(calendar_client, mock_google_apis):
+    """Test that events created for a task carry the private managed marker"""
+    calendar_client.create_event(
+        summary="Test Event",
+        description="Test Description",
+        start_time=datetime.now(),
+        asana_task_id="task1"
+    )
+    
+    _, kwargs = mock_google_apis['events'].insert.call_args
+    event_body = kwargs['body']
+    assert event_body['extendedProperties']['private'] == {
+        'managedBy': MANAGED_BY, 'asanaTaskId': "task1"
+    }
+    assert GoogleCalendarClient.is_managed(event_body)
+
+def test_list_changed_events(calendar_client, mock_google_apis):
+    """Test listing changed events with a sync token across pages"""
+    managed = {'id': 'event1', 'status': 'confirmed',
+               'extendedProperties': {'private': {'managedBy': MANAGED_BY}}}
+    unmanaged = {'id': 'event2', 'status': 'confirmed'}
+    cancelled = {'id': 'event3', 'status': 'cancelled'}
+    mock_google_apis['events'].list.return_value.execute.side_effect = [
+        {'items': [managed, unmanaged], 'nextPageToken': 'page2'},
+        {'items': [cancelled], 'nextSyncToken': 'token2'},
+    ]
+    
+    events, sync_token, full = calendar_client.list_changed_events('token1')
+    
+    assert [event['id'] for event in events] == ['event1', 'event3']
+    assert sync_token == 'token2'
+    assert full is False
+    _, kwargs = mock_google_apis['events'].list.call_args
+    assert kwargs['syncToken'] == 'token1'
+    assert kwargs['pageToken'] == 'page2'
+
+def test_list_changed_events_expired_token(calendar_client, mock_google_apis):
+    """Test that a 410 Gone restarts with a full listing"""
+    gone = HttpError(MagicMock(status=410), b'Sync token is no longer valid')
+    mock_google_apis['events'].list.return_value.execute.side_effect = [
+        gone,
+        {'items': [], 'nextSyncToken': 'fresh_token'},
+    ]
+    
+    events, sync_token, full = calendar_client.list_changed_events('old_token')
+    
+    assert events == []
+    assert sync_token == 'fresh_token'
+    assert full is True
+    _, kwargs = mock_google_apis['events'].list.call_args
+    assert 'syncToken' not in kwargs
+
+def test_patch_events_bulk_minimal_bodies(calendar_client, mock_google_apis):
+    """Test that patches only carry the fields that changed"""
+    batch = MagicMock()
+    mock_google_apis['service'].new_batch_http_request.return_value = batch
+    
+    calendar_client.patch_events_bulk([
+        {'event_id': 'event1', 'summary': 'Renamed'},
+        {'event_id': 'event2', 'start_time': datetime(2023, 10, 12), 'has_time': False},
+    ])
+    
+    bodies = [call.kwargs['body'] for call in mock_google_apis['events'].patch.call_args_list]
+    assert bodies[0] == {'summary': 'Renamed'}
+    assert bodies[1] == {'start': {'date': '2023-10-12'}, 'end': {'date': '2023-10-13'}}
+    assert mock_google_apis['events'].patch.call_args_list[1].kwargs['eventId'] == 'event2'
+
+def test_get_calendar_client_is_shared(mock_google_apis, monkeypatch):
+    """Test that the registry builds one client per settings and reuses it"""
+    monkeypatch.setattr('os.path.exists', lambda path: True)
+    monkeypatch.setattr('builtins.open', MagicMock())
+    clear_calendar_clients()
+    try:
+        first = get_calendar_client("mock_creds.json", "mock_token.json", "mock_calendar")
+        second = get_calendar_client("mock_creds.json", "mock_token.json", "mock_calendar")
+        other = get_calendar_client("mock_creds.json", "mock_token.json", "other_calendar")
+    finally:
+        clear_calendar_clients()
+    
+    assert first is second
+    assert other is not first
+    assert mock_google_apis['build'].call_count == 2
+
+def test_get_calendar_client_builds_outside_registry_lock(monkeypatch):
+    """Test that a client still authenticating does not block clients for other settings"""
+    authenticating = threading.Event()
+    finish = threading.Event()
+    
+    def build_client(credentials_file, token_file, calendar_id):
+        if calendar_id == "slow_calendar":
+            authenticating.set()
+            finish.wait(5)
+        return MagicMock(calendar_id=calendar_id)
+    
+    monkeypatch.setattr('utils.calendar_client.GoogleCalendarClient', build_client)
+    clear_calendar_clients()
+    slow = threading.Thread(target=get_calendar_client, args=("creds.json", "token.json", "slow_calendar"))
+    slow.start()
+    try:
+        assert authenticating.wait(5)
+        fast = get_calendar_client("creds.json", "token.json", "fast_calendar")
+        assert fast.calendar_id == "fast_calendar"
+        assert slow.is_alive()
+    finally:
+        finish.set()
+        slow.join()
+        clear_calendar_clients()
+
+def test_refresh_credentials_ahead_of_expiry(calendar_client, mock_google_apis):
+    """Test that tokens are refreshed only when close to expiry"""
+    creds = MagicMock(refresh_token="refresh")
+    calendar_client.credentials = creds
+    
+    # Far from expiry: nothing to do
+    creds.expiry = datetime.utcnow() + timedelta(hours=1)
+    assert calendar_client.refresh_credentials(margin_seconds=300) is False
+    creds.refresh.assert_not_called()
+    
+    # Within the margin: refresh and save the token file
+    creds.expiry = datetime.utcnow() + timedelta(seconds=60)
+    assert calendar_client.refresh_credentials(margin_seconds=300) is True
+    creds.refresh.assert_called_once()
+    creds.to_json.assert_called_once()
+
+def test_watch_events_and_stop_channel(calendar_client, mock_google_apis):
+    """Test that channels are opened on the calendar's events and stopped by ID and resource"""
+    mock_google_apis['events'].watch.return_value.execute.return_value = {'resourceId': "res1"}
+    
+    channel = calendar_client.watch_events("https://example.test/hook", "chan1", "secret", ttl_seconds=3600)
+    
+    assert channel == {'resourceId': "res1"}
+    _, kwargs = mock_google_apis['events'].watch.call_args
+    assert kwargs['calendarId'] == calendar_client.calendar_id
+    assert kwargs['body'] == {
+        'id': "chan1",
+        'type': 'web_hook',
+        'address': "https://example.test/hook",
+        'token': "secret",
+        'params': {'ttl': "3600"}
+    }
+    
+    calendar_client.stop_channel("chan1", "res1")
+    mock_google_apis['service'].channels.return_value.stop.assert_called_once_with(
+        body={'id': "chan1", 'resourceId': "res1"})
@@ -0,0 +1,71 @@
+import pytest
+import time
+from unittest.mock import MagicMock, patch
+
+from utils.health import HealthMonitor
+
+@pytest.fixture
+def probes():
+    """Create a passing and a failing probe"""
+    asana = MagicMock(return_value=True)
+    google = MagicMock(side_effect=Exception("token expired"))
+    return {'asana': asana, 'google_calendar': google}
+
+def test_status_is_cached(probes):
+    """Test that probes run once and later reads come from the cache"""
+    monitor = HealthMonitor(probes, interval_seconds=0)
+    
+    first = monitor.status()
+    second = monitor.status()
+    
+    assert first == second
+    assert probes['asana'].call_count == 1
+    assert first['asana']['ok'] is True
+    assert first['asana']['error'] is None
+    assert first['asana']['latency_ms'] >= 0
+    assert first['google_calendar']['ok'] is False
+    assert first['google_calendar']['error'] == "token expired"
+
+def test_fresh_status_runs_probes(probes):
+    """Test that a fresh read bypasses the cache"""
+    monitor = HealthMonitor(probes, interval_seconds=0)
+    
+    monitor.status()
+    monitor.status(fresh=True)
+    
+    assert probes['asana'].call_count == 2
+
+def test_on_demand_status_reprobes_old_results(probes):
+    """Test that without background probes, results past their max age are refreshed on read"""
+    monitor = HealthMonitor(probes, interval_seconds=0, max_age_seconds=60)
+    
+    with patch('utils.health.time.monotonic', return_value=1000):
+        monitor.status()
+    with patch('utils.health.time.monotonic', return_value=1030):
+        monitor.status()
+    assert probes['asana'].call_count == 1
+    
+    with patch('utils.health.time.monotonic', return_value=1061):
+        monitor.status()
+    assert probes['asana'].call_count == 2
+
+def test_probe_returning_false_is_unhealthy():
+    """Test that a probe returning False is reported as down without an error"""
+    monitor = HealthMonitor({'asana': lambda: False}, interval_seconds=0)
+    
+    result = monitor.status()['asana']
+    assert result['ok'] is False
+    assert result['error'] is None
+
+def test_background_probes(probes):
+    """Test that a started monitor probes on its own"""
+    monitor = HealthMonitor(probes, interval_seconds=0.01)
+    monitor.start()
+    try:
+        deadline = time.monotonic() + 2
+        while probes['asana'].call_count < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        monitor.stop()
+    
+    assert probes['asana'].call_count >= 2
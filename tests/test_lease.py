@@ -0,0 +1,75 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from utils.db import db, SyncLease
+from utils.lease import LeaseLock
+from utils.scheduler import SyncJob, SyncScheduler
+
+def test_only_one_owner_holds_lease(app):
+    """Test that a held lease cannot be taken until it is released"""
+    first = LeaseLock(app, "sync:ws", owner="a")
+    second = LeaseLock(app, "sync:ws", owner="b")
+    
+    assert first.acquire(run_id="run1")
+    assert not second.acquire(run_id="run2")
+    
+    first.release({'events_created': 1})
+    assert second.acquire(run_id="run2")
+    second.release()
+
+def test_expired_lease_is_taken_over(app):
+    """Test that a lease whose holder stopped renewing it can be taken over"""
+    dead = LeaseLock(app, "sync:ws", owner="dead")
+    assert dead.acquire(run_id="run1")
+    dead._released.set()  # Stop its heartbeat, as if the process died
+    
+    SyncLease.query.filter_by(name="sync:ws").update(
+        {'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+    
+    live = LeaseLock(app, "sync:ws", owner="live")
+    assert live.acquire(run_id="run2")
+    assert live.holder().owner == "live"
+    live.release()
+
+def test_wait_for_run_returns_result(app):
+    """Test that a waiting owner gets the result recorded by the run it waited for"""
+    holder = LeaseLock(app, "sync:ws", owner="a")
+    holder.acquire(run_id="run1")
+    holder.release({'events_created': 3})
+    
+    waiter = LeaseLock(app, "sync:ws", owner="b")
+    assert waiter.wait_for_run("run1", timeout=1) == (True, {'events_created': 3})
+    assert waiter.wait_for_run("other", timeout=1) == (False, None)
+
+def test_full_sync_attaches_to_other_process_run(app):
+    """Test that a full sync blocked by another process's full sync takes its result"""
+    other = LeaseLock(app, "sync:ws", owner="other-process")
+    other.acquire(run_id="run1")
+    
+    synchronizer = MagicMock()
+    scheduler = SyncScheduler(app, interval_minutes=0, synchronizer_factory=lambda: synchronizer,
+                              lease_name="sync:ws")
+    job = SyncJob('manual')
+    
+    # Only the first poll sees the run in flight; it then finishes with its result
+    def wait_for_run(run_id, timeout, poll_seconds=None):
+        other.release({'events_created': 4})
+        return LeaseLock.wait_for_run(scheduler.lease, run_id, timeout, poll_seconds)
+    
+    with patch.object(scheduler.lease, 'wait_for_run', side_effect=wait_for_run):
+        stats = scheduler._run_leased(job, progress=None)
+    
+    assert stats == {'events_created': 4}
+    assert job.attached_to == "run1"
+    synchronizer.sync_tasks.assert_not_called()
+
+def test_manual_sync_attaches_to_running_job(app):
+    """Test that a coalesced full sync returns the full sync already running"""
+    scheduler = SyncScheduler(app, interval_minutes=0, synchronizer_factory=MagicMock)
+    running = SyncJob('scheduled')
+    running.status = 'running'
+    scheduler._jobs[running.id] = running
+    
+    assert scheduler.enqueue(trigger='manual', coalesce=True) is running
@@ -0,0 +1,127 @@
+import pytest
+import requests
+from unittest.mock import MagicMock, patch
+
+from utils.asana_client import AsanaClient, endpoint_label
+from utils.db import get_synced_task_states
+from utils.metrics import (
+    Registry, timed_iter, DB_QUERIES, SYNC_PHASE_SECONDS, SYNC_TASKS,
+    UPSTREAM_REQUEST_SECONDS, UPSTREAM_RESPONSES, UPSTREAM_RETRIES
+)
+from utils.sync import TaskSynchronizer
+from utils.tag_cache import TagCache
+
+def test_counter_renders_in_exposition_format():
+    """Test that a counter is rendered with HELP, TYPE and one line per label set"""
+    registry = Registry()
+    counter = registry.counter('requests_total', "Requests", ['status'])
+    
+    counter.inc(status=200)
+    counter.inc(2, status=200)
+    counter.inc(status='say "hi"')
+    
+    assert registry.render().splitlines() == [
+        '# HELP requests_total Requests',
+        '# TYPE requests_total counter',
+        'requests_total{status="200"} 3.0',
+        'requests_total{status="say \\"hi\\""} 1.0',
+    ]
+
+def test_histogram_buckets_are_cumulative():
+    """Test that histogram buckets count every observation at or below their bound"""
+    registry = Registry()
+    histogram = registry.histogram('latency_seconds', "Latency", buckets=(0.1, 1))
+    
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value)
+    
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        'latency_seconds_sum 4.25',
+        'latency_seconds_count 4',
+    ]
+
+def test_metric_rejects_wrong_labels():
+    """Test that observations must carry exactly the declared labels"""
+    registry = Registry()
+    counter = registry.counter('calls_total', "Calls", ['service'])
+    
+    with pytest.raises(ValueError):
+        counter.inc()
+    with pytest.raises(ValueError):
+        counter.inc(service='asana', endpoint='tags')
+    with pytest.raises(ValueError):
+        registry.counter('calls_total', "Calls again")
+
+def test_timed_iter_observes_each_item():
+    """Test that timed_iter records one observation per item plus the final exhausted call"""
+    histogram = Registry().histogram('fetch_seconds', "Fetch")
+    
+    assert list(timed_iter([1, 2, 3], histogram)) == [1, 2, 3]
+    assert histogram.snapshot()[0] == 4
+
+def test_endpoint_label_hides_gids():
+    """Test that numeric gids are replaced so endpoints share one series"""
+    assert endpoint_label('tags/1204/tasks') == 'tags/{gid}/tasks'
+    assert endpoint_label('workspaces/99/tags') == 'workspaces/{gid}/tags'
+    assert endpoint_label('users/me') == 'users/me'
+
+def test_asana_request_metrics():
+    """Test that Asana requests record latency, statuses and retries per endpoint"""
+    client = AsanaClient("token", "workspace", tag_cache=TagCache(persist=False),
+                         rate_limiter=MagicMock())
+    label = 'GET tags/{gid}/tasks'
+    requests_before = UPSTREAM_REQUEST_SECONDS.snapshot(service='asana', endpoint=label)[0]
+    ok_before = UPSTREAM_RESPONSES.value(service='asana', endpoint=label, status=200)
+    unavailable_before = UPSTREAM_RESPONSES.value(service='asana', endpoint=label, status=503)
+    errors_before = UPSTREAM_RESPONSES.value(service='asana', endpoint=label, status='error')
+    retries_before = UPSTREAM_RETRIES.value(service='asana', endpoint=label, reason='server_error')
+    timeouts_before = UPSTREAM_RETRIES.value(service='asana', endpoint=label, reason='connection')
+    
+    ok_response = MagicMock(status_code=200)
+    ok_response.json.return_value = {"data": []}
+    with patch.object(client, 'session') as session, patch('utils.asana_client.time.sleep'):
+        session.request.side_effect = [MagicMock(status_code=503), requests.exceptions.Timeout(), ok_response]
+        client._make_request("GET", "tags/1204/tasks")
+    
+    assert UPSTREAM_REQUEST_SECONDS.snapshot(service='asana', endpoint=label)[0] == requests_before + 3
+    assert UPSTREAM_RESPONSES.value(service='asana', endpoint=label, status=200) == ok_before + 1
+    assert UPSTREAM_RESPONSES.value(service='asana', endpoint=label, status=503) == unavailable_before + 1
+    assert UPSTREAM_RESPONSES.value(service='asana', endpoint=label, status='error') == errors_before + 1
+    assert UPSTREAM_RETRIES.value(service='asana', endpoint=label, reason='server_error') == retries_before + 1
+    assert UPSTREAM_RETRIES.value(service='asana', endpoint=label, reason='connection') == timeouts_before + 1
+
+def test_sync_records_phase_metrics():
+    """Test that a sync times its fetch, diff, create and persist phases and counts outcomes"""
+    asana_client = MagicMock()
+    asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1", "due_on": "2023-10-10"},
+        {"gid": "task2", "name": "Task 2", "due_on": "2023-10-11"},
+    ]
+    calendar_client = MagicMock()
+    calendar_client.create_events_bulk.return_value = [({'id': 'event1'}, None), ({'id': 'event2'}, None)]
+    
+    phases = ('fetch', 'diff', 'create', 'persist')
+    before = {phase: SYNC_PHASE_SECONDS.snapshot(phase=phase)[0] for phase in phases}
+    created_before = SYNC_TASKS.value(outcome='created')
+    
+    with patch('utils.sync.get_synced_task_states', return_value={}), \
+         patch('utils.sync.upsert_synced_tasks'):
+        TaskSynchronizer(asana_client, calendar_client).sync_tasks(incremental=False, reconcile=False)
+    
+    # One page (plus the call that finds no more), one calendar batch, one upsert
+    assert SYNC_PHASE_SECONDS.snapshot(phase='fetch')[0] == before['fetch'] + 2
+    assert SYNC_PHASE_SECONDS.snapshot(phase='diff')[0] == before['diff'] + 1
+    assert SYNC_PHASE_SECONDS.snapshot(phase='create')[0] == before['create'] + 1
+    assert SYNC_PHASE_SECONDS.snapshot(phase='persist')[0] == before['persist'] + 1
+    assert SYNC_TASKS.value(outcome='created') == created_before + 2
+
+def test_database_queries_are_counted(app):
+    """Test that statements are counted by operation"""
+    before = DB_QUERIES.value(operation='select')
+    
+    get_synced_task_states(['task1'])
+    
+    assert DB_QUERIES.value(operation='select') == before + 1
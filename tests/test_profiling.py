@@ -0,0 +1,89 @@
+import os
+import pytest
+import time
+from unittest.mock import MagicMock
+
+from utils.profiling import SyncProfiler
+from utils.scheduler import SyncJob, SyncScheduler
+
+def busy_work(n):
+    """Something for the profiler to find"""
+    return sum(i * i for i in range(n))
+
+def test_run_saves_profile_and_summary(tmp_path):
+    """Test that a profiled run returns its result and saves a summarizable profile"""
+    profiler = SyncProfiler(directory=str(tmp_path), keep=5)
+    
+    result, saved = profiler.run('run1', busy_work, 1000)
+    
+    assert result == busy_work(1000)
+    assert saved is True
+    assert os.path.exists(tmp_path / 'run1.prof')
+    
+    summary = profiler.summary('run1', limit=5, sort='cumulative')
+    assert summary['run_id'] == 'run1'
+    assert summary['total_calls'] > 0
+    assert len(summary['functions']) <= 5
+    assert any('busy_work' in function['function'] for function in summary['functions'])
+
+def test_only_recent_profiles_are_kept(tmp_path):
+    """Test that the oldest profiles beyond the keep limit are deleted"""
+    profiler = SyncProfiler(directory=str(tmp_path), keep=2)
+    
+    for run_id in ('run1', 'run2', 'run3'):
+        profiler.run(run_id, busy_work, 10)
+        # Distinct modification times so the newest are known
+        time.sleep(0.01)
+    
+    assert [profile['run_id'] for profile in profiler.list_profiles()] == ['run3', 'run2']
+    assert profiler.summary('run1') is None
+
+def test_invalid_run_id_and_sort(tmp_path):
+    """Test that run IDs that are not plain names and unknown sort keys are rejected"""
+    profiler = SyncProfiler(directory=str(tmp_path))
+    
+    with pytest.raises(ValueError):
+        profiler.summary('../etc/passwd')
+    with pytest.raises(ValueError):
+        profiler.run('a/b', busy_work, 10)
+    with pytest.raises(ValueError):
+        profiler.summary('run1', sort='filename')
+
+def test_busy_profiler_runs_unprofiled(tmp_path):
+    """Test that a run started while another is profiled still runs, without a profile"""
+    profiler = SyncProfiler(directory=str(tmp_path))
+    
+    inner = profiler.run('outer', lambda: profiler.run('inner', busy_work, 10))[0]
+    
+    assert inner == (busy_work(10), False)
+    assert [profile['run_id'] for profile in profiler.list_profiles()] == ['outer']
+
+def test_scheduler_profiles_requested_jobs(app, tmp_path):
+    """Test that only jobs asking for a profile are run under the profiler"""
+    synchronizer = MagicMock()
+    synchronizer.sync_tasks.return_value = {'tasks_found': 0, 'errors': 0}
+    profiler = SyncProfiler(directory=str(tmp_path))
+    scheduler = SyncScheduler(app, interval_minutes=0, synchronizer_factory=lambda: synchronizer,
+                              profiler=profiler)
+    
+    profiled = SyncJob('manual', profile=True)
+    plain = SyncJob('manual', profile=False)
+    scheduler.run_job(profiled)
+    scheduler.run_job(plain)
+    
+    assert profiled.stats == {'tasks_found': 0, 'errors': 0}
+    assert profiled.to_dict()['profiled'] is True
+    assert plain.to_dict()['profiled'] is False
+    assert [profile['run_id'] for profile in profiler.list_profiles()] == [profiled.id]
+
+def test_profiled_request_is_not_coalesced(app, tmp_path):
+    """Test that asking for a profile queues a new job instead of joining a queued one"""
+    scheduler = SyncScheduler(app, interval_minutes=0, synchronizer_factory=MagicMock,
+                              profiler=SyncProfiler(directory=str(tmp_path)))
+    # Keep jobs queued
+    scheduler._ensure_worker = lambda: None
+    
+    first = scheduler.enqueue(coalesce=True)
+    
+    assert scheduler.enqueue(coalesce=True) is first
+    assert scheduler.enqueue(coalesce=True, profile=True) is not first
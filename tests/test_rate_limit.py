@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+import threading
+from unittest.mock import patch
+
+from utils.rate_limit import RateLimiter, get_rate_limiter
+
+@pytest.fixture
+def clock():
+    """Fixture providing a fake monotonic clock that sleep advances"""
+    now = [1000.0]
+    
+    def sleep(seconds):
+        now[0] += seconds
+    
+    with patch('utils.rate_limit.time.monotonic', side_effect=lambda: now[0]), \
+         patch('utils.rate_limit.time.sleep', side_effect=sleep) as mock_sleep:
+        yield mock_sleep
+
+def test_burst_then_steady_rate(clock):
+    """Test that requests beyond the burst wait for tokens to refill"""
+    limiter = RateLimiter(requests_per_minute=60, burst=2)
+    
+    # The burst is served immediately
+    for _ in range(2):
+        with limiter.acquire("GET"):
+            pass
+    clock.assert_not_called()
+    
+    # The next request waits one second for a token at 60 per minute
+    with limiter.acquire("GET"):
+        pass
+    clock.assert_called_once()
+    assert limiter.stats()['throttled_seconds'] == pytest.approx(1.0)
+
+def test_pause_blocks_until_retry_after(clock):
+    """Test that a 429 pause delays the next request"""
+    limiter = RateLimiter(requests_per_minute=600, burst=10)
+    limiter.pause(5)
+    
+    with limiter.acquire("POST"):
+        pass
+    
+    stats = limiter.stats()
+    assert stats['rate_limited_responses'] == 1
+    assert stats['throttled_seconds'] >= 5
+
+def test_write_concurrency_limit():
+    """Test that concurrent writes are capped separately from reads"""
+    limiter = RateLimiter(requests_per_minute=6000, burst=100,
+                          max_concurrent_reads=5, max_concurrent_writes=1)
+    
+    with limiter.acquire("POST"):
+        # A second write cannot start while the first is in flight...
+        acquired = threading.Event()
+        
+        def write():
+            with limiter.acquire("PUT"):
+                acquired.set()
+        
+        thread = threading.Thread(target=write)
+        thread.start()
+        assert not acquired.wait(0.1)
+        
+        # ...but reads still can
+        with limiter.acquire("GET"):
+            pass
+    
+    thread.join(1)
+    assert acquired.is_set()
+
+def test_limiters_are_shared_per_token():
+    """Test that clients using the same token share one limiter"""
+    assert get_rate_limiter("token_a") is get_rate_limiter("token_a")
+    assert get_rate_limiter("token_a") is not get_rate_limiter("token_b")
+
+def test_async_acquire_shares_write_slots():
+    """Test that asyncio callers are held to the same write cap without blocking the loop"""
+    limiter = RateLimiter(requests_per_minute=6000, burst=100,
+                          max_concurrent_reads=5, max_concurrent_writes=1)
+    active = 0
+    peak = 0
+    
+    async def write():
+        nonlocal active, peak
+        async with limiter.acquire_async("POST"):
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+    
+    async def run():
+        await asyncio.gather(*(write() for _ in range(3)))
+    
+    asyncio.run(run())
+    
+    assert peak == 1
+    # A blocking caller sees the slot free again afterwards
+    with limiter.acquire("PUT"):
+        pass
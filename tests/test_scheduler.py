@@ -0,0 +1,106 @@
+import pytest
+import time
+from unittest.mock import MagicMock
+
+from utils.scheduler import SyncJob, SyncScheduler
+
+def wait_for(job, timeout=2):
+    """Wait for a job to finish"""
+    deadline = time.monotonic() + timeout
+    while not job.done and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+@pytest.fixture
+def synchronizer():
+    """Create a mock synchronizer that reports progress once"""
+    synchronizer = MagicMock()
+    
+    def sync_tasks(progress=None):
+        progress({'tasks_found': 5})
+        return {'tasks_found': 10, 'events_created': 2, 'already_synced': 8, 'errors': 0}
+    
+    synchronizer.sync_tasks.side_effect = sync_tasks
+    return synchronizer
+
+def test_enqueue_runs_job_in_background(app, synchronizer):
+    """Test that a queued job runs on the worker and records progress and stats"""
+    scheduler = SyncScheduler(app, interval_minutes=0, synchronizer_factory=lambda: synchronizer)
+    
+    job = scheduler.enqueue()
+    assert scheduler.get_job(job.id) is job
+    
+    wait_for(job)
+    result = job.to_dict()
+    assert result['status'] == 'succeeded'
+    assert result['progress'] == {'tasks_found': 5}
+    assert result['stats']['events_created'] == 2
+    assert result['finished_at'] is not None
+
+def test_failed_job(app):
+    """Test that an exception marks the job as failed"""
+    synchronizer = MagicMock()
+    synchronizer.sync_tasks.side_effect = Exception("Asana is down")
+    scheduler = SyncScheduler(app, interval_minutes=0, synchronizer_factory=lambda: synchronizer)
+    
+    job = wait_for(scheduler.enqueue())
+    
+    assert job.status == 'failed'
+    assert job.error == "Asana is down"
+
+def test_job_history_limit(app, synchronizer):
+    """Test that only the most recent finished jobs are kept"""
+    scheduler = SyncScheduler(app, interval_minutes=0, synchronizer_factory=lambda: synchronizer,
+                              max_jobs=2)
+    
+    jobs = []
+    for _ in range(3):
+        jobs.append(wait_for(scheduler.enqueue()))
+    
+    assert scheduler.get_job(jobs[0].id) is None
+    assert scheduler.get_job(jobs[2].id) is jobs[2]
+
+def test_periodic_timer(app, synchronizer):
+    """Test that the timer queues scheduled syncs every interval"""
+    scheduler = SyncScheduler(app, interval_minutes=0.001, synchronizer_factory=lambda: synchronizer)
+    scheduler.start()
+    try:
+        deadline = time.monotonic() + 2
+        while synchronizer.sync_tasks.call_count < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        scheduler.stop()
+    
+    assert synchronizer.sync_tasks.call_count >= 2
+
+def test_event_job_runs_targeted_sync(app):
+    """Test that a job queued with webhook events only syncs those tasks"""
+    synchronizer = MagicMock()
+    synchronizer.sync_changed_tasks.return_value = {'tasks_found': 1}
+    scheduler = SyncScheduler(app, interval_minutes=0, synchronizer_factory=lambda: synchronizer)
+    events = [{"action": "changed", "resource": {"gid": "task1", "resource_type": "task"}}]
+    
+    job = wait_for(scheduler.enqueue(trigger='webhook', events=events))
+    
+    assert job.status == 'succeeded'
+    assert job.stats == {'tasks_found': 1}
+    args, _ = synchronizer.sync_changed_tasks.call_args
+    assert args[0] == events
+    synchronizer.sync_tasks.assert_not_called()
+
+def test_coalesced_calendar_jobs(app):
+    """Test that calendar jobs reconcile and that queued ones absorb new requests"""
+    synchronizer = MagicMock()
+    synchronizer.sync_calendar_changes.return_value = {'events_changed': 2}
+    scheduler = SyncScheduler(app, interval_minutes=0, synchronizer_factory=lambda: synchronizer)
+    
+    # Without a worker the first job stays queued
+    first = SyncJob('calendar_push', kind='calendar')
+    scheduler._jobs[first.id] = first
+    assert scheduler.enqueue(trigger='calendar_push', kind='calendar', coalesce=True) is first
+    
+    job = wait_for(scheduler.enqueue(trigger='calendar_push', kind='calendar'))
+    assert job.status == 'succeeded'
+    assert job.to_dict()['kind'] == 'calendar'
+    assert job.stats == {'events_changed': 2}
+    synchronizer.sync_tasks.assert_not_called()
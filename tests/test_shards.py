@@ -0,0 +1,80 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from utils.db import db, SyncLease, add_workspace_config
+from utils.lease import LeaseLock, sync_lease_name
+from utils.shards import ShardWorker, get_sync_shards
+
+@pytest.fixture
+def workspaces(app):
+    """Configure two workspaces with three shards between them"""
+    add_workspace_config("Team A", "ws1", "token1", tag_names="schedule, deadline")
+    add_workspace_config("Team B", "ws2", "token2", sync_interval_minutes=5)
+    disabled = add_workspace_config("Old team", "ws3", "token3")
+    disabled.enabled = False
+    db.session.commit()
+
+@pytest.fixture
+def synced():
+    """Record the shards synced through a worker's synchronizer factory"""
+    shards = []
+    
+    def factory(workspace, tag_name):
+        shards.append((workspace.asana_workspace_id, tag_name))
+        synchronizer = MagicMock()
+        synchronizer.sync_tasks.return_value = {'tasks_found': 1}
+        return synchronizer
+    
+    factory.shards = shards
+    return factory
+
+def test_get_sync_shards(workspaces):
+    """Test that every tag of every enabled workspace is a shard"""
+    shards = [(workspace.asana_workspace_id, tag_name) for workspace, tag_name in get_sync_shards()]
+    
+    assert shards == [("ws1", "schedule"), ("ws1", "deadline"), ("ws2", "schedule")]
+
+def test_run_once_syncs_due_shards_once(app, workspaces, synced):
+    """Test that due shards are synced and then wait for their interval"""
+    worker = ShardWorker(app, owner="worker1", synchronizer_factory=synced)
+    
+    assert worker.run_once() == 3
+    assert sorted(synced.shards) == [("ws1", "deadline"), ("ws1", "schedule"), ("ws2", "schedule")]
+    
+    # A second worker finds nothing due until an interval passes
+    assert ShardWorker(app, owner="worker2", synchronizer_factory=synced).run_once() == 0
+    
+    lease = SyncLease.query.filter_by(name=sync_lease_name("ws2", "schedule")).one()
+    lease.finished_at = datetime.utcnow() - timedelta(minutes=6)
+    db.session.commit()
+    
+    assert ShardWorker(app, owner="worker2", synchronizer_factory=synced).run_once() == 1
+    assert synced.shards[-1] == ("ws2", "schedule")
+
+def test_leased_shard_is_skipped_until_expired(app, workspaces, synced):
+    """Test that a shard held by a live worker is skipped, and taken over once its lease expires"""
+    name = sync_lease_name("ws2", "schedule")
+    other = LeaseLock(app, name, owner="crashed-worker")
+    other.acquire(run_id="run1")
+    other._released.set()  # Stop its heartbeat
+    
+    worker = ShardWorker(app, owner="worker1", synchronizer_factory=synced)
+    assert worker.run_once() == 2
+    assert ("ws2", "schedule") not in synced.shards
+    
+    SyncLease.query.filter_by(name=name).update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+    
+    assert worker.run_once() == 1
+    assert synced.shards[-1] == ("ws2", "schedule")
+
+def test_failed_shard_releases_lease(app, workspaces):
+    """Test that a shard whose sync raises still releases its lease"""
+    def factory(workspace, tag_name):
+        raise Exception("bad token")
+    
+    worker = ShardWorker(app, owner="worker1", synchronizer_factory=factory)
+    worker.run_once()
+    
+    assert all(lease.owner is None for lease in SyncLease.query.all())
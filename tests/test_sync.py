@@ -1,14 +1,21 @@
 import pytest
-from datetime import datetime
+import threading
+from datetime import datetime, timezone
 from unittest.mock import MagicMock, patch
 
-from utils.sync import TaskSynchronizer
+from utils.asana_client import SyncTokenExpired
+from utils.db import (
+    db, SyncedTask, SyncPlanRecord, add_synced_task, get_sync_token, save_sync_plan, update_sync_plan, upsert_synced_tasks
+)
+from utils.sync import TaskSynchronizer, task_fingerprint
+from utils.sync_plan import SyncPlan
 
 @pytest.fixture
 def mock_asana_client():
     """Create a mock Asana client"""
     client = MagicMock()
     client.tag_name = "schedule"
+    client.workspace_id = "workspace"
     return client
 
 @pytest.fixture
@@ -20,9 +27,10 @@ def mock_calendar_client():
 @pytest.fixture
 def sync_mock_db():
     """Mock database functions"""
-    with patch('utils.sync.get_synced_task_by_asana_id') as mock_get, \
-         patch('utils.sync.add_synced_task') as mock_add:
-        mock_get.return_value = None  # Default: task not synced yet
+    with patch('utils.sync.get_synced_task_states') as mock_get, \
+         patch('utils.sync.upsert_synced_tasks') as mock_add, \
+         patch('utils.sync.get_unfinished_sync_plan', return_value=None):
+        mock_get.return_value = {}  # Default: task not synced yet
         yield {
             'get': mock_get,
             'add': mock_add
@@ -39,7 +47,7 @@ def synchronizer(mock_asana_client, mock_calendar_client):
 def test_sync_tasks_no_tasks(synchronizer, mock_asana_client):
     """Test syncing when no tasks are found"""
     # Configure mock to return no tasks
-    mock_asana_client.get_tasks_with_tag.return_value = []
+    mock_asana_client.iter_tasks_with_tag.return_value = []
     
     # Run sync
     stats = synchronizer.sync_tasks()
@@ -49,17 +57,18 @@ def test_sync_tasks_no_tasks(synchronizer, mock_asana_client):
     assert stats['events_created'] == 0
     
     # Verify method calls
-    mock_asana_client.get_tasks_with_tag.assert_called_once_with("schedule", completed=False)
+    mock_asana_client.iter_tasks_with_tag.assert_called_once_with("schedule", completed=False, errors=[])
 
 def test_sync_tasks_already_synced(synchronizer, mock_asana_client, sync_mock_db):
     """Test syncing a task that's already been synced"""
     # Mock a task that was already synced
-    mock_asana_client.get_tasks_with_tag.return_value = [
-        {"gid": "task1", "name": "Test Task", "due_on": "2023-10-10"}
-    ]
+    mock_task = {"gid": "task1", "name": "Test Task", "due_on": "2023-10-10"}
+    mock_asana_client.iter_tasks_with_tag.return_value = [mock_task]
     
-    # Mock that this task is already in the database
-    sync_mock_db['get'].return_value = {"id": 1}
+    # Mock that this task is already in the database, unchanged
+    sync_mock_db['get'].return_value = {
+        "task1": MagicMock(content_hash=task_fingerprint(mock_task))
+    }
     
     # Run sync
     stats = synchronizer.sync_tasks()
@@ -70,27 +79,24 @@ def test_sync_tasks_already_synced(synchronizer, mock_asana_client, sync_mock_db
     assert stats['events_created'] == 0
     
     # Verify method calls
-    sync_mock_db['get'].assert_called_once_with("task1")
+    args, _ = sync_mock_db['get'].call_args
+    assert list(args[0]) == ["task1"]
     
     # Calendar client should not be called
-    synchronizer.calendar_client.create_event.assert_not_called()
+    synchronizer.calendar_client.create_events_bulk.assert_not_called()
 
 def test_sync_tasks_new_task(synchronizer, mock_asana_client, mock_calendar_client, sync_mock_db):
     """Test syncing a new task that hasn't been synced yet"""
     # Mock a task with a due date
     mock_task = {"gid": "task1", "name": "Test Task", "due_on": "2023-10-10"}
-    mock_asana_client.get_tasks_with_tag.return_value = [mock_task]
+    mock_asana_client.iter_tasks_with_tag.return_value = [mock_task]
     
-    # Mock due date parsing
-    due_date = datetime(2023, 10, 10)
-    mock_asana_client.parse_due_date.return_value = due_date
-    
-    # Mock time component check (all-day event)
-    mock_asana_client.has_time_component.return_value = False
+    # The due date is parsed once, when the task record is built (all-day event)
+    due_date = datetime(2023, 10, 10, tzinfo=timezone.utc)
     
     # Mock calendar event creation
     mock_event = {"id": "event123"}
-    mock_calendar_client.create_event.return_value = mock_event
+    mock_calendar_client.create_events_bulk.return_value = [(mock_event, None)]
     
     # Run sync
     stats = synchronizer.sync_tasks()
@@ -100,42 +106,37 @@ def test_sync_tasks_new_task(synchronizer, mock_asana_client, mock_calendar_clie
     assert stats['already_synced'] == 0
     assert stats['events_created'] == 1
     
-    # Verify method calls
-    mock_asana_client.parse_due_date.assert_called_once_with(mock_task)
-    mock_asana_client.has_time_component.assert_called_once_with(mock_task)
-    
     # Verify calendar event creation
-    mock_calendar_client.create_event.assert_called_once_with(
-        summary="Test Task",
-        description="Asana task: task1",
-        start_time=due_date,
-        has_time=False
-    )
+    mock_calendar_client.create_events_bulk.assert_called_once_with([{
+        'summary': "Test Task",
+        'description': "Asana task: task1",
+        'start_time': due_date,
+        'has_time': False,
+        'asana_task_id': "task1"
+    }])
     
     # Verify database record creation
-    sync_mock_db['add'].assert_called_once_with(
-        asana_task_id="task1",
-        asana_task_name="Test Task",
-        asana_due_date=due_date,
-        google_event_id="event123"
-    )
+    sync_mock_db['add'].assert_called_once_with([{
+        'asana_task_id': "task1",
+        'asana_task_name': "Test Task",
+        'asana_due_date': due_date,
+        'google_event_id': "event123",
+        'content_hash': task_fingerprint(mock_task),
+        'resource_id': "workspace:schedule"
+    }])
 
 def test_sync_tasks_timed_event(synchronizer, mock_asana_client, mock_calendar_client, sync_mock_db):
     """Test syncing a task with a specific time component"""
     # Mock a task with a due date and time
     mock_task = {"gid": "task1", "name": "Test Task", "due_at": "2023-10-10T15:00:00Z"}
-    mock_asana_client.get_tasks_with_tag.return_value = [mock_task]
+    mock_asana_client.iter_tasks_with_tag.return_value = [mock_task]
     
-    # Mock due date parsing
-    due_date = datetime(2023, 10, 10, 15, 0, 0)
-    mock_asana_client.parse_due_date.return_value = due_date
-    
-    # Mock time component check (timed event)
-    mock_asana_client.has_time_component.return_value = True
+    # Parsed from due_at (timed event)
+    due_date = datetime(2023, 10, 10, 15, 0, 0, tzinfo=timezone.utc)
     
     # Mock calendar event creation
     mock_event = {"id": "event123"}
-    mock_calendar_client.create_event.return_value = mock_event
+    mock_calendar_client.create_events_bulk.return_value = [(mock_event, None)]
     
     # Run sync
     stats = synchronizer.sync_tasks()
@@ -144,21 +145,19 @@ def test_sync_tasks_timed_event(synchronizer, mock_asana_client, mock_calendar_c
     assert stats['events_created'] == 1
     
     # Verify calendar event creation with time component
-    mock_calendar_client.create_event.assert_called_once_with(
-        summary="Test Task",
-        description="Asana task: task1",
-        start_time=due_date,
-        has_time=True
-    )
+    mock_calendar_client.create_events_bulk.assert_called_once_with([{
+        'summary': "Test Task",
+        'description': "Asana task: task1",
+        'start_time': due_date,
+        'has_time': True,
+        'asana_task_id': "task1"
+    }])
 
-def test_sync_tasks_no_due_date(synchronizer, mock_asana_client, mock_calendar_client):
+def test_sync_tasks_no_due_date(synchronizer, mock_asana_client, mock_calendar_client, sync_mock_db):
     """Test syncing a task without a due date"""
     # Mock a task without a due date
     mock_task = {"gid": "task1", "name": "Test Task No Due Date"}
-    mock_asana_client.get_tasks_with_tag.return_value = [mock_task]
-    
-    # Mock due date parsing (no due date)
-    mock_asana_client.parse_due_date.return_value = None
+    mock_asana_client.iter_tasks_with_tag.return_value = [mock_task]
     
     # Run sync
     stats = synchronizer.sync_tasks()
@@ -168,20 +167,16 @@ def test_sync_tasks_no_due_date(synchronizer, mock_asana_client, mock_calendar_c
     assert stats['events_created'] == 0
     
     # Calendar client should not be called
-    mock_calendar_client.create_event.assert_not_called()
+    mock_calendar_client.create_events_bulk.assert_not_called()
 
 def test_sync_tasks_error_handling(synchronizer, mock_asana_client, mock_calendar_client, sync_mock_db):
     """Test error handling during sync process"""
     # Mock a task with a due date
     mock_task = {"gid": "task1", "name": "Test Task", "due_on": "2023-10-10"}
-    mock_asana_client.get_tasks_with_tag.return_value = [mock_task]
-    
-    # Mock due date parsing
-    due_date = datetime(2023, 10, 10)
-    mock_asana_client.parse_due_date.return_value = due_date
+    mock_asana_client.iter_tasks_with_tag.return_value = [mock_task]
     
     # Mock calendar event creation to fail
-    mock_calendar_client.create_event.side_effect = Exception("API error")
+    mock_calendar_client.create_events_bulk.side_effect = Exception("API error")
     
     # Run sync
     stats = synchronizer.sync_tasks()
@@ -193,3 +188,515 @@ def test_sync_tasks_error_handling(synchronizer, mock_asana_client, mock_calenda
     
     # Database add should not be called
     sync_mock_db['add'].assert_not_called()
+
+def test_sync_tasks_batches_and_item_errors(synchronizer, mock_asana_client, mock_calendar_client, sync_mock_db):
+    """Test that events are created in batches and per-item errors are counted"""
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": f"task{i}", "name": f"Task {i}", "due_on": "2023-10-10"}
+        for i in range(3)
+    ]
+    
+    def create_events_bulk(events):
+        # The second event of each batch fails
+        return [
+            (None, Exception("Rate limited")) if index == 1 else ({"id": f"event{index}"}, None)
+            for index, _ in enumerate(events)
+        ]
+    mock_calendar_client.create_events_bulk.side_effect = create_events_bulk
+    
+    with patch('utils.sync.config.GOOGLE_BATCH_SIZE', 2):
+        stats = synchronizer.sync_tasks()
+    
+    # Three tasks with a batch size of two make two batch calls
+    assert mock_calendar_client.create_events_bulk.call_count == 2
+    assert stats['events_created'] == 2
+    assert stats['errors'] == 1
+    assert sync_mock_db['add'].call_count == 2
+    assert sum(len(call.args[0]) for call in sync_mock_db['add'].call_args_list) == 2
+
+def test_sync_tasks_concurrent_workers(mock_asana_client, mock_calendar_client, sync_mock_db):
+    """Test that calendar batches run on a worker pool while DB writes stay on the caller"""
+    synchronizer = TaskSynchronizer(
+        asana_client=mock_asana_client,
+        calendar_client=mock_calendar_client,
+        max_workers=4
+    )
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": f"task{i}", "name": f"Task {i}", "due_on": "2023-10-10"}
+        for i in range(25)
+    ]
+    
+    calendar_threads = set()
+    def create_events_bulk(events):
+        calendar_threads.add(threading.get_ident())
+        return [({"id": event['description']}, None) for event in events]
+    mock_calendar_client.create_events_bulk.side_effect = create_events_bulk
+    
+    db_threads = set()
+    sync_mock_db['add'].side_effect = lambda rows: db_threads.add(threading.get_ident())
+    
+    with patch('utils.sync.config.GOOGLE_BATCH_SIZE', 5):
+        stats = synchronizer.sync_tasks()
+    
+    assert stats['tasks_found'] == 25
+    assert stats['events_created'] == 25
+    assert stats['errors'] == 0
+    assert mock_calendar_client.create_events_bulk.call_count == 5
+    
+    # Calendar work ran off the calling thread, DB writes on it
+    assert threading.get_ident() not in calendar_threads
+    assert db_threads == {threading.get_ident()}
+
+def test_sync_tasks_one_lookup_per_page(synchronizer, mock_asana_client, mock_calendar_client, sync_mock_db):
+    """Test that synced IDs are looked up once per page instead of once per task"""
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": f"task{i}", "name": f"Task {i}"} for i in range(5)
+    ]
+    
+    with patch('utils.sync.config.ASANA_PAGE_SIZE', 2):
+        stats = synchronizer.sync_tasks()
+    
+    assert stats['tasks_found'] == 5
+    assert [list(call.args[0]) for call in sync_mock_db['get'].call_args_list] == [
+        ["task0", "task1"], ["task2", "task3"], ["task4"]
+    ]
+
+@pytest.fixture
+def sync_mock_tokens():
+    """Mock sync token storage"""
+    with patch('utils.sync.get_sync_token') as mock_get, \
+         patch('utils.sync.save_sync_token') as mock_save:
+        mock_get.return_value = "token1"
+        yield {
+            'get': mock_get,
+            'save': mock_save
+        }
+
+def test_sync_tasks_incremental(synchronizer, mock_asana_client, mock_calendar_client, sync_mock_db, sync_mock_tokens):
+    """Test that incremental mode only processes tasks from the events API"""
+    mock_asana_client.get_tag_id.return_value = "tag2"
+    mock_asana_client.get_events.return_value = ([{"action": "changed"}], "token2")
+    mock_asana_client.iter_changed_tasks.return_value = [{"gid": "task1", "name": "Test Task"}]
+    
+    stats = synchronizer.sync_tasks(incremental=True)
+    
+    assert stats['sync_mode'] == 'incremental'
+    assert stats['tasks_found'] == 1
+    mock_asana_client.get_events.assert_called_once_with("tag2", "token1")
+    mock_asana_client.iter_tasks_with_tag.assert_not_called()
+    sync_mock_tokens['save'].assert_called_once_with('asana', "tag2", "token2")
+
+def test_sync_tasks_incremental_expired_token(synchronizer, mock_asana_client, mock_calendar_client, sync_mock_db, sync_mock_tokens):
+    """Test that an expired token falls back to a full scan and stores the fresh token"""
+    mock_asana_client.get_tag_id.return_value = "tag2"
+    mock_asana_client.get_events.side_effect = SyncTokenExpired("fresh_token")
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1"}, {"gid": "task2", "name": "Task 2"}
+    ]
+    
+    stats = synchronizer.sync_tasks(incremental=True)
+    
+    assert stats['sync_mode'] == 'full'
+    assert stats['tasks_found'] == 2
+    sync_mock_tokens['save'].assert_called_once_with('asana', "tag2", "fresh_token")
+
+def test_sync_tasks_incremental_keeps_token_on_errors(synchronizer, mock_asana_client, mock_calendar_client, sync_mock_db, sync_mock_tokens):
+    """Test that the token is not advanced when some changes failed to sync"""
+    mock_asana_client.get_tag_id.return_value = "tag2"
+    mock_asana_client.get_events.return_value = ([{"action": "changed"}], "token2")
+    mock_asana_client.iter_changed_tasks.return_value = [
+        {"gid": "task1", "name": "Test Task", "due_on": "2023-10-10"}
+    ]
+    mock_calendar_client.create_events_bulk.return_value = [(None, Exception("API error"))]
+    
+    stats = synchronizer.sync_tasks(incremental=True)
+    
+    assert stats['errors'] == 1
+    sync_mock_tokens['save'].assert_not_called()
+
+def test_sync_tasks_incremental_keeps_token_on_fetch_errors(synchronizer, mock_asana_client, mock_calendar_client, sync_mock_db, sync_mock_tokens):
+    """Test that tasks Asana failed to return count as errors and keep the token"""
+    mock_asana_client.get_tag_id.return_value = "tag2"
+    mock_asana_client.get_events.return_value = ([{"action": "changed"}], "token2")
+    
+    def iter_changed_tasks(tag_name, events, removed, failed):
+        yield {"gid": "task1", "name": "Test Task"}
+        failed.append("task2")
+    mock_asana_client.iter_changed_tasks.side_effect = iter_changed_tasks
+    
+    stats = synchronizer.sync_tasks(incremental=True)
+    
+    assert stats['errors'] == 1
+    sync_mock_tokens['save'].assert_not_called()
+
+def test_sync_tasks_expired_token_keeps_it_on_partial_scan(synchronizer, mock_asana_client, mock_calendar_client, sync_mock_db, sync_mock_tokens):
+    """Test that a fallback scan that stops early does not store the fresh token"""
+    mock_asana_client.get_tag_id.return_value = "tag2"
+    mock_asana_client.get_events.side_effect = SyncTokenExpired("fresh_token")
+    
+    def iter_tasks_with_tag(tag_name, completed=False, errors=None):
+        yield {"gid": "task1", "name": "Task 1"}
+        errors.append(Exception("page 2 failed"))
+    mock_asana_client.iter_tasks_with_tag.side_effect = iter_tasks_with_tag
+    
+    stats = synchronizer.sync_tasks(incremental=True)
+    
+    assert stats['tasks_found'] == 1
+    assert stats['errors'] == 1
+    sync_mock_tokens['save'].assert_not_called()
+
+def test_reconcile_calendar(app, synchronizer, mock_calendar_client):
+    """Test that deleted events are dropped from the DB and moved events are counted"""
+    add_synced_task("task1", "Deleted", datetime(2023, 10, 10), "event1")
+    add_synced_task("task2", "Moved", datetime(2023, 10, 10, 15, 0), "event2")
+    add_synced_task("task3", "Unchanged", datetime(2023, 10, 10), "event3")
+    
+    mock_calendar_client.calendar_id = "mock_calendar"
+    mock_calendar_client.list_changed_events.return_value = ([
+        {'id': 'event1', 'status': 'cancelled'},
+        {'id': 'event2', 'status': 'confirmed', 'start': {'dateTime': '2023-10-11T15:00:00Z'}},
+        {'id': 'event3', 'status': 'confirmed', 'start': {'date': '2023-10-10'}},
+        {'id': 'other', 'status': 'cancelled'},
+    ], 'token2', False)
+    
+    report = synchronizer.reconcile_calendar()
+    
+    assert report == {'events_changed': 4, 'events_deleted': 1, 'events_moved': 1}
+    assert SyncedTask.query.filter_by(asana_task_id="task1").first() is None
+    assert SyncedTask.query.count() == 2
+    assert get_sync_token('google', "mock_calendar") == 'token2'
+    mock_calendar_client.list_changed_events.assert_called_once_with(None)
+
+def test_reconcile_recreates_deleted_events_in_incremental_mode(app, synchronizer, mock_asana_client, mock_calendar_client):
+    """Test that tasks whose events users deleted are recreated although the change feed is empty"""
+    add_synced_task("task1", "Task 1", datetime(2023, 10, 10), "event1", content_hash="stale")
+    mock_calendar_client.calendar_id = "mock_calendar"
+    mock_calendar_client.list_changed_events.return_value = ([{'id': 'event1', 'status': 'cancelled'}], 'token2', False)
+    mock_calendar_client.create_events_bulk.return_value = [({"id": "event2"}, None)]
+    mock_asana_client.get_tag_id.return_value = "tag2"
+    mock_asana_client.get_events.return_value = ([], "asana_token")
+    
+    def iter_changed_tasks(tag_name, events, removed, failed):
+        for event in events:
+            yield {"gid": event["resource"]["gid"], "name": "Task 1", "due_on": "2023-10-10"}
+    mock_asana_client.iter_changed_tasks.side_effect = iter_changed_tasks
+    
+    stats = synchronizer.sync_tasks(incremental=True, reconcile=True)
+    
+    assert stats['calendar_drift']['events_deleted'] == 1
+    assert stats['events_created'] == 1
+    assert SyncedTask.query.filter_by(asana_task_id="task1").one().google_event_id == "event2"
+    
+    # Push notifications go through the same recreation
+    mock_calendar_client.list_changed_events.return_value = ([{'id': 'event2', 'status': 'cancelled'}], 'token3', False)
+    mock_calendar_client.create_events_bulk.return_value = [({"id": "event3"}, None)]
+    
+    stats = synchronizer.sync_calendar_changes()
+    
+    assert stats['sync_mode'] == 'targeted'
+    assert stats['events_created'] == 1
+    assert SyncedTask.query.filter_by(asana_task_id="task1").one().google_event_id == "event3"
+
+@pytest.fixture
+def diff_synchronizer(app, mock_asana_client, mock_calendar_client):
+    """Create a TaskSynchronizer using the real database and due date parsing"""
+    mock_calendar_client.create_events_bulk.side_effect = lambda events: [
+        ({"id": f"event-{event['asana_task_id']}"}, None) for event in events
+    ]
+    mock_calendar_client.patch_events_bulk.side_effect = lambda patches: [
+        ({"id": patch_spec['event_id']}, None) for patch_spec in patches
+    ]
+    mock_calendar_client.delete_events_bulk.side_effect = lambda event_ids: [
+        (True, None) for _ in event_ids
+    ]
+    return TaskSynchronizer(
+        asana_client=mock_asana_client,
+        calendar_client=mock_calendar_client
+    )
+
+def test_sync_tasks_diff_unchanged_costs_no_calls(diff_synchronizer, mock_asana_client, mock_calendar_client):
+    """Test that a second run over unchanged tasks makes no calendar calls"""
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1", "due_on": "2023-10-10"},
+        {"gid": "task2", "name": "Task 2", "due_at": "2023-10-10T15:00:00Z"}
+    ]
+    
+    first = diff_synchronizer.sync_tasks()
+    second = diff_synchronizer.sync_tasks()
+    
+    assert first['events_created'] == 2
+    assert second['already_synced'] == 2
+    assert second['events_created'] == 0
+    assert second['events_updated'] == 0
+    assert mock_calendar_client.create_events_bulk.call_count == 1
+    mock_calendar_client.patch_events_bulk.assert_not_called()
+
+def test_sync_tasks_diff_patches_changed_fields(diff_synchronizer, mock_asana_client, mock_calendar_client):
+    """Test that changed tasks are patched with only the fields that changed"""
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1", "due_on": "2023-10-10"},
+        {"gid": "task2", "name": "Task 2", "due_on": "2023-10-10"}
+    ]
+    diff_synchronizer.sync_tasks()
+    
+    # Rename one task and move the other
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1 renamed", "due_on": "2023-10-10"},
+        {"gid": "task2", "name": "Task 2", "due_on": "2023-10-12"}
+    ]
+    stats = diff_synchronizer.sync_tasks()
+    
+    assert stats['events_updated'] == 2
+    assert stats['events_created'] == 0
+    patches = mock_calendar_client.patch_events_bulk.call_args.args[0]
+    assert patches[0]['event_id'] == "event-task1"
+    assert patches[0]['summary'] == "Task 1 renamed"
+    assert patches[0]['start_time'] is None
+    assert patches[1]['summary'] is None
+    assert patches[1]['start_time'].day == 12
+    
+    # The new fingerprint is stored, so a third run is a no-op
+    third = diff_synchronizer.sync_tasks()
+    assert third['already_synced'] == 2
+    assert mock_calendar_client.patch_events_bulk.call_count == 1
+    assert SyncedTask.query.filter_by(asana_task_id="task1").one().asana_task_name == "Task 1 renamed"
+
+def test_sync_tasks_recreates_event_deleted_in_calendar(diff_synchronizer, mock_asana_client, mock_calendar_client):
+    """Test that a patch of an event users deleted (404/410) creates it again instead of failing every run"""
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1", "due_on": "2023-10-10"},
+        {"gid": "task2", "name": "Task 2", "due_on": "2023-10-10"}
+    ]
+    diff_synchronizer.sync_tasks()
+    
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1 renamed", "due_on": "2023-10-10"},
+        {"gid": "task2", "name": "Task 2 renamed", "due_on": "2023-10-10"}
+    ]
+    mock_calendar_client.patch_events_bulk.side_effect = lambda patches: [
+        (None, MagicMock(resp=MagicMock(status=410))) if patch_spec['event_id'] == "event-task1"
+        else ({"id": patch_spec['event_id']}, None)
+        for patch_spec in patches
+    ]
+    mock_calendar_client.create_events_bulk.side_effect = lambda events: [
+        ({"id": f"new-{event['asana_task_id']}"}, None) for event in events
+    ]
+    stats = diff_synchronizer.sync_tasks()
+    
+    assert (stats['events_created'], stats['events_updated'], stats['errors']) == (1, 1, 0)
+    recreated = mock_calendar_client.create_events_bulk.call_args.args[0]
+    assert [(event['asana_task_id'], event['summary']) for event in recreated] == [("task1", "Task 1 renamed")]
+    assert SyncedTask.query.filter_by(asana_task_id="task1").one().google_event_id == "new-task1"
+    
+    # The row was repaired, so the next run has nothing to do
+    assert diff_synchronizer.sync_tasks()['already_synced'] == 2
+
+def test_sync_tasks_diff_deletes_when_enabled(diff_synchronizer, mock_asana_client, mock_calendar_client):
+    """Test that tasks that lost their due date have their events deleted"""
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1", "due_on": "2023-10-10"}
+    ]
+    diff_synchronizer.sync_tasks()
+    
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1", "due_on": None}
+    ]
+    
+    # Deletion is opt-in
+    stats = diff_synchronizer.sync_tasks()
+    assert stats['events_deleted'] == 0
+    mock_calendar_client.delete_events_bulk.assert_not_called()
+    
+    with patch('utils.sync.config.SYNC_DELETE_EVENTS', True):
+        stats = diff_synchronizer.sync_tasks()
+    
+    assert stats['events_deleted'] == 1
+    mock_calendar_client.delete_events_bulk.assert_called_once_with(["event-task1"])
+    assert SyncedTask.query.count() == 0
+
+def test_sync_tasks_skips_completed_tasks(diff_synchronizer, mock_asana_client, mock_calendar_client):
+    """Test that a full scan never creates events for completed tasks and deletes those it synced"""
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1", "due_on": "2023-10-10"},
+        {"gid": "task2", "name": "Task 2", "due_on": "2023-10-10", "completed": True}
+    ]
+    stats = diff_synchronizer.sync_tasks()
+    
+    assert stats['events_created'] == 1
+    created = mock_calendar_client.create_events_bulk.call_args.args[0]
+    assert [event['asana_task_id'] for event in created] == ["task1"]
+    
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1", "due_on": "2023-10-10", "completed": True}
+    ]
+    with patch('utils.sync.config.SYNC_DELETE_EVENTS', True):
+        stats = diff_synchronizer.sync_tasks()
+    
+    assert stats['events_deleted'] == 1
+    mock_calendar_client.delete_events_bulk.assert_called_once_with(["event-task1"])
+    assert SyncedTask.query.count() == 0
+
+def test_sync_tasks_full_scan_deletes_missing_tasks(diff_synchronizer, mock_asana_client, mock_calendar_client):
+    """Test that a complete full scan deletes this tag's synced tasks it no longer returns"""
+    mock_asana_client.workspace_id = "workspace"
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1", "due_on": "2023-10-10"},
+        {"gid": "task2", "name": "Task 2", "due_on": "2023-10-10"}
+    ]
+    diff_synchronizer.sync_tasks()
+    # Another workspace's task is not this scan's to delete
+    upsert_synced_tasks([{'asana_task_id': "other1", 'asana_task_name': "Other", 'asana_due_date': datetime(2023, 10, 10),
+                          'google_event_id': "event-other1", 'resource_id': "other:schedule"}])
+    
+    # task2 was completed or untagged, so the scan no longer returns it
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1", "due_on": "2023-10-10"}
+    ]
+    with patch('utils.sync.config.SYNC_DELETE_EVENTS', True):
+        # A scan that failed partway deletes nothing
+        def partial_scan(tag_name, completed=False, errors=None):
+            errors.append(Exception("page 2 failed"))
+            yield {"gid": "task1", "name": "Task 1", "due_on": "2023-10-10"}
+        mock_asana_client.iter_tasks_with_tag.side_effect = partial_scan
+        assert diff_synchronizer.sync_tasks()['events_deleted'] == 0
+        
+        mock_asana_client.iter_tasks_with_tag.side_effect = None
+        stats = diff_synchronizer.sync_tasks()
+    
+    assert stats['events_deleted'] == 1
+    mock_calendar_client.delete_events_bulk.assert_called_once_with(["event-task2"])
+    assert sorted(task.asana_task_id for task in SyncedTask.query) == ["other1", "task1"]
+
+def test_sync_tasks_patch_sends_due_when_only_has_time_changes(diff_synchronizer, mock_asana_client, mock_calendar_client):
+    """Test that a rename plus a switch to a timed due date at the same instant patches the start too"""
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1", "due_on": "2023-10-10"}
+    ]
+    diff_synchronizer.sync_tasks()
+    
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1 renamed", "due_at": "2023-10-10T00:00:00Z"}
+    ]
+    diff_synchronizer.sync_tasks()
+    
+    patch_spec = mock_calendar_client.patch_events_bulk.call_args.args[0][0]
+    assert patch_spec['summary'] == "Task 1 renamed"
+    assert patch_spec['start_time'] == datetime(2023, 10, 10, tzinfo=timezone.utc)
+    assert patch_spec['has_time'] is True
+
+def test_sync_changed_tasks(synchronizer, mock_asana_client, mock_calendar_client, sync_mock_db):
+    """Test that a targeted sync only fetches and syncs the tasks in the given events"""
+    events = [{"action": "changed", "resource": {"gid": "task1", "resource_type": "task"}}]
+    mock_task = {"gid": "task1", "name": "Test Task", "due_on": "2023-10-10"}
+    mock_asana_client.iter_changed_tasks.return_value = [mock_task]
+    mock_asana_client.throttled_seconds = 0.0
+    mock_calendar_client.create_events_bulk.return_value = [({"id": "event123"}, None)]
+    
+    stats = synchronizer.sync_changed_tasks(events)
+    
+    assert stats['sync_mode'] == 'targeted'
+    assert stats['tasks_found'] == 1
+    assert stats['events_created'] == 1
+    mock_asana_client.iter_changed_tasks.assert_called_once_with("schedule", events, [], [])
+    mock_asana_client.iter_tasks_with_tag.assert_not_called()
+
+def test_plan_makes_no_calendar_calls_and_round_trips(diff_synchronizer, mock_asana_client, mock_calendar_client):
+    """Test that a plan is computed without Google and survives JSON unchanged"""
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1", "due_on": "2023-10-10"}
+    ]
+    diff_synchronizer.sync_tasks()
+    
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1 renamed", "due_on": "2023-10-10"},
+        {"gid": "task2", "name": "Task 2", "due_at": "2023-10-11T15:00:00Z"}
+    ]
+    plan = diff_synchronizer.plan()
+    
+    assert [item['task_id'] for item in plan.creates] == ["task2"]
+    assert [item['task_id'] for item in plan.patches] == ["task1"]
+    assert plan.summary()['tasks_found'] == 2
+    assert (plan.summary()['creates'], plan.summary()['patches']) == (1, 1)
+    assert mock_calendar_client.create_events_bulk.call_count == 1
+    mock_calendar_client.patch_events_bulk.assert_not_called()
+    
+    loaded = SyncPlan.from_json(plan.to_json())
+    assert loaded.to_dict() == plan.to_dict()
+    assert loaded.summary() == plan.summary()
+    assert loaded.creates[0]['due_date'] == datetime(2023, 10, 11, 15, 0, tzinfo=timezone.utc)
+
+def test_interrupted_apply_resumes_from_checkpoint(diff_synchronizer, mock_asana_client, mock_calendar_client):
+    """Test that the next sync resumes a stored plan without rescanning or resending recorded items"""
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": f"task{i}", "name": f"Task {i}", "due_on": "2023-10-10"} for i in range(1, 6)
+    ]
+    
+    def crash_after_first_batch(stats):
+        if stats.get('events_created', 0) >= 2:
+            raise RuntimeError("worker died")
+    
+    with patch('utils.sync.config.GOOGLE_BATCH_SIZE', 2), \
+         patch('utils.sync.config.SYNC_PLAN_CHECKPOINT_MIN_ACTIONS', 1):
+        with pytest.raises(RuntimeError):
+            diff_synchronizer.sync_tasks(progress=crash_after_first_batch)
+        
+        record = SyncPlanRecord.query.one()
+        assert (record.status, record.position) == ('applying', 2)
+        
+        # As if the process died after recording the first batch but before its checkpoint
+        update_sync_plan(record.id, 0, {'events_created': 0})
+        stats = diff_synchronizer.sync_tasks()
+    
+    assert stats['resumed_plan'] == record.id
+    assert stats['events_created'] == 5
+    assert mock_asana_client.iter_tasks_with_tag.call_count == 1
+    sent = [[event['asana_task_id'] for event in call.args[0]]
+            for call in mock_calendar_client.create_events_bulk.call_args_list]
+    assert sent == [["task1", "task2"], ["task3", "task4"], ["task5"]]
+    assert SyncedTask.query.count() == 5
+    record = SyncPlanRecord.query.one()
+    assert (record.status, record.plan) == ('done', '')
+
+@pytest.mark.parametrize('sync_mode, trigger', [('incremental', None), ('targeted', 'webhook')])
+def test_full_sync_abandons_other_plans(diff_synchronizer, mock_asana_client, mock_calendar_client, sync_mode, trigger):
+    """Test that a full sync scans the tag instead of resuming a plan of another kind, which its scan covers"""
+    plan = SyncPlan(diff_synchronizer.resource_id, sync_mode, trigger=trigger)
+    save_sync_plan(plan.id, plan.resource_id, plan.to_json(), plan.kind)
+    mock_asana_client.iter_tasks_with_tag.return_value = [
+        {"gid": "task1", "name": "Task 1", "due_on": "2023-10-10"}
+    ]
+    mock_calendar_client.create_events_bulk.return_value = [({"id": "event1"}, None)]
+    
+    stats = diff_synchronizer.sync_tasks(incremental=False)
+    
+    assert 'resumed_plan' not in stats
+    assert stats['sync_mode'] == 'full'
+    assert stats['events_created'] == 1
+    mock_asana_client.iter_tasks_with_tag.assert_called_once()
+    record = db.session.get(SyncPlanRecord, plan.id)
+    assert (record.status, record.plan) == ('abandoned', '')
+
+def test_webhook_sync_resumes_only_webhook_plans(diff_synchronizer, mock_asana_client, mock_calendar_client):
+    """Test that a webhook run finishes an interrupted webhook plan but leaves a calendar one alone"""
+    plans = {}
+    for trigger in ('webhook', 'calendar'):
+        plan = SyncPlan(diff_synchronizer.resource_id, 'targeted', trigger=trigger)
+        plan.add_changes([{
+            'action': 'create', 'task_id': f"{trigger}-task", 'task_name': "Pending", 'due_date': datetime(2023, 10, 10),
+            'has_time': False, 'content_hash': "hash"
+        }])
+        save_sync_plan(plan.id, plan.resource_id, plan.to_json(), plan.kind)
+        plans[trigger] = plan
+    mock_asana_client.iter_changed_tasks.return_value = [
+        {"gid": "task1", "name": "Task 1", "due_on": "2023-10-10"}
+    ]
+    
+    stats = diff_synchronizer.sync_changed_tasks([{"resource": {"gid": "task1", "resource_type": "task"}}])
+    
+    assert stats['resumed_plan'] == plans['webhook'].id
+    assert stats['events_created'] == 2
+    created = [event['asana_task_id'] for call in mock_calendar_client.create_events_bulk.call_args_list
+               for event in call.args[0]]
+    assert created == ["webhook-task", "task1"]
+    assert db.session.get(SyncPlanRecord, plans['webhook'].id).status == 'done'
+    assert db.session.get(SyncPlanRecord, plans['calendar'].id).status == 'applying'
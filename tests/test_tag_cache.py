@@ -0,0 +1,45 @@
+import pytest
+from unittest.mock import patch
+
+from utils.tag_cache import TagCache
+
+def test_get_missing_workspace():
+    """Test that an unknown workspace is a cache miss"""
+    cache = TagCache(persist=False)
+    assert cache.get("workspace") is None
+
+def test_ttl_expiry():
+    """Test that indexes expire after the TTL"""
+    cache = TagCache(ttl_seconds=60, persist=False)
+    
+    with patch('utils.tag_cache.time.monotonic', return_value=1000):
+        cache.set("workspace", {"schedule": "tag1"})
+    
+    with patch('utils.tag_cache.time.monotonic', return_value=1059):
+        assert cache.get("workspace") == {"schedule": "tag1"}
+    
+    with patch('utils.tag_cache.time.monotonic', return_value=1060):
+        assert cache.get("workspace") is None
+
+def test_invalidate():
+    """Test explicit invalidation of one or all workspaces"""
+    cache = TagCache(persist=False)
+    cache.set("workspace1", {"schedule": "tag1"})
+    cache.set("workspace2", {"schedule": "tag2"})
+    
+    cache.invalidate("workspace1")
+    assert cache.get("workspace1") is None
+    assert cache.get("workspace2") == {"schedule": "tag2"}
+    
+    cache.invalidate()
+    assert cache.get("workspace2") is None
+
+def test_persisted_index_survives_restart(app):
+    """Test that a new cache instance loads the index from the database"""
+    TagCache().set("workspace", {"schedule": "tag1"})
+    
+    # A fresh instance simulates a restarted process
+    assert TagCache().get("workspace") == {"schedule": "tag1"}
+    
+    TagCache().invalidate("workspace")
+    assert TagCache().get("workspace") is None
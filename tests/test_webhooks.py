@@ -0,0 +1,61 @@
+import hashlib
+import hmac
+import threading
+import time
+
+from utils.webhooks import EventCoalescer, verify_signature
+
+def task_event(task_id, action="changed"):
+    """Build an Asana webhook event for a task"""
+    return {"action": action, "resource": {"gid": task_id, "resource_type": "task"}}
+
+def test_verify_signature():
+    """Test that only the HMAC of the exact body with the right secret is accepted"""
+    body = b'{"events": []}'
+    signature = hmac.new(b"secret", body, hashlib.sha256).hexdigest()
+    
+    assert verify_signature("secret", body, signature)
+    assert not verify_signature("other", body, signature)
+    assert not verify_signature("secret", body + b" ", signature)
+    assert not verify_signature("secret", body, None)
+    assert not verify_signature(None, body, signature)
+
+def test_coalescer_merges_bursts_per_task():
+    """Test that a burst of events for one task is handed over once, with its latest event"""
+    handed_over = []
+    done = threading.Event()
+    
+    def handler(events):
+        handed_over.extend(events)
+        if len(handed_over) >= 2:
+            done.set()
+    
+    coalescer = EventCoalescer(handler, delay_seconds=0.05, max_delay_seconds=1)
+    coalescer.add([task_event("task1"), task_event("task2")])
+    coalescer.add([
+        task_event("task1", "removed"),
+        {"action": "added", "resource": {"gid": "s1", "resource_type": "story"}}
+    ])
+    
+    assert done.wait(2)
+    time.sleep(0.1)
+    assert sorted((event["resource"]["gid"], event["action"]) for event in handed_over) == [
+        ("task1", "removed"), ("task2", "changed")]
+
+def test_coalescer_max_delay():
+    """Test that a steady stream of events is still handed over after the maximum delay"""
+    batches = []
+    coalescer = EventCoalescer(batches.append, delay_seconds=0.2, max_delay_seconds=0.1)
+    
+    deadline = time.monotonic() + 2
+    while not batches and time.monotonic() < deadline:
+        coalescer.add([task_event("task1")])
+        time.sleep(0.02)
+    
+    assert batches
+
+def test_coalescer_ignores_non_task_events():
+    """Test that events without a task resource are not queued"""
+    coalescer = EventCoalescer(lambda events: None, delay_seconds=0, max_delay_seconds=0)
+    
+    assert coalescer.add([{"action": "added", "resource": {"gid": "s1", "resource_type": "story"}}]) == 0
@@ -1,106 +1,413 @@
+import random
+import re
+import time
 import requests
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timezone
+from typing import NamedTuple, Optional
 import config
+from utils.metrics import UPSTREAM_REQUEST_SECONDS, UPSTREAM_RESPONSES, UPSTREAM_RETRIES
+from utils.rate_limit import get_rate_limiter
+from utils.tag_cache import default_tag_cache
+
+class SyncTokenExpired(Exception):
+    """Raised when Asana rejects an events sync token (HTTP 412)"""
+    
+    def __init__(self, sync_token):
+        super().__init__("Asana events sync token is missing or expired")
+        # Fresh token to use for the next incremental request
+        self.sync_token = sync_token
+
+# Task fields requested from Asana; AsanaTask keeps exactly these
+TASK_OPT_FIELDS = "name,due_on,due_at,completed"
+
+@lru_cache(maxsize=4096)
+def _parse_due_on(due_on):
+    """Start of a due day in UTC; cached, since many tasks share a day and datetimes are immutable"""
+    return datetime.fromisoformat(f"{due_on}T00:00:00+00:00")
+
+def parse_due_fields(due_on, due_at):
+    """Parse an Asana due_at (date and time) or due_on (date only) into an aware datetime"""
+    if due_at:
+        return datetime.fromisoformat(due_at.replace("Z", "+00:00"))
+    if due_on:
+        return _parse_due_on(due_on)
+    return None
+
+class AsanaTask(NamedTuple):
+    """
+    Immutable record of the task fields the sync uses
+    
+    Built once per task as pages are read, with the due date parsed in the
+    same pass. Fields beyond TASK_OPT_FIELDS are dropped, and a tuple has
+    no per-instance __dict__, which keeps 100k-task runs small.
+    """
+    gid: str
+    name: Optional[str]
+    due_on: Optional[str]
+    due_at: Optional[str]
+    completed: bool
+    due_date: Optional[datetime]
+    
+    @classmethod
+    def from_api(cls, data):
+        """Build a record from a task dict as returned by the Asana API"""
+        get = data.get
+        due_on = get("due_on")
+        due_at = get("due_at")
+        # tuple.__new__ skips the generated __new__'s argument binding; values are in field order
+        return tuple.__new__(cls, (data["gid"], get("name"), due_on, due_at, bool(get("completed")),
+                                   parse_due_fields(due_on, due_at)))
+    
+    @property
+    def has_time(self):
+        """Whether the task is due at a specific time rather than on a day"""
+        return self.due_at is not None
+
+# Numeric gids in endpoint paths are replaced so metrics have one series per endpoint
+GID_SEGMENT = re.compile(r'(?<=/)\d+(?=/|$)|^\d+(?=/|$)')
+
+def endpoint_label(endpoint):
+    """Endpoint path without its gids, e.g. tags/{gid}/tasks"""
+    return GID_SEGMENT.sub('{gid}', endpoint.split('?', 1)[0])
 
 class AsanaClient:
     """Client for interacting with Asana API"""
     
     BASE_URL = "https://app.asana.com/api/1.0"
     
-    def __init__(self, access_token=None, workspace_id=None):
+    # Only these methods are safe to send again after a failure
+    IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+    RETRY_STATUS_CODES = frozenset([500, 502, 503, 504])
+    
+    def __init__(self, access_token=None, workspace_id=None, tag_cache=None, rate_limiter=None):
         """Initialize with optional custom credentials"""
         self.access_token = access_token or config.ASANA_ACCESS_TOKEN
         self.workspace_id = workspace_id or config.ASANA_WORKSPACE_ID
+        self.tag_cache = tag_cache or default_tag_cache
+        self.rate_limiter = rate_limiter or get_rate_limiter(self.access_token)
         self.headers = {
             "Authorization": f"Bearer {self.access_token}",
             "Accept": "application/json"
         }
+        self.timeout = (config.ASANA_CONNECT_TIMEOUT, config.ASANA_READ_TIMEOUT)
+        self.max_retries = config.ASANA_MAX_RETRIES
+        self.session = self._create_session()
+    
+    def _create_session(self):
+        """Create a keep-alive session with a connection pool sized for the client"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=config.ASANA_POOL_SIZE
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    
+    def close(self):
+        """Close the pooled connections held by the session"""
+        self.session.close()
         
     def _make_request(self, method, endpoint, params=None, data=None):
-        """Make an HTTP request to the Asana API"""
+        """
+        Make an HTTP request to the Asana API
+        
+        Requests go through the token's rate limiter. A 429 response pauses
+        the limiter for the Retry-After period and is then sent again, for
+        any method, since Asana did not process it. Idempotent requests that
+        time out, fail to connect or get a 5xx response are retried up to
+        max_retries times with jittered exponential backoff.
+        """
         url = f"{self.BASE_URL}/{endpoint}"
+        retries = self.max_retries if method.upper() in self.IDEMPOTENT_METHODS else 0
+        label = f"{method.upper()} {endpoint_label(endpoint)}"
         
-        response = requests.request(
-            method=method,
-            url=url,
-            headers=self.headers,
-            params=params,
-            json=data
-        )
+        attempt = 0
+        rate_limited = 0
+        while True:
+            try:
+                with self.rate_limiter.acquire(method):
+                    # Timed inside the limiter so throttling is not counted as latency
+                    with UPSTREAM_REQUEST_SECONDS.time(service='asana', endpoint=label):
+                        response = self.session.request(
+                            method=method,
+                            url=url,
+                            headers=self.headers,
+                            params=params,
+                            json=data,
+                            timeout=self.timeout
+                        )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                UPSTREAM_RESPONSES.inc(service='asana', endpoint=label, status='error')
+                if attempt >= retries:
+                    raise
+                reason = 'connection'
+            else:
+                UPSTREAM_RESPONSES.inc(service='asana', endpoint=label, status=response.status_code)
+                if response.status_code == 429 and rate_limited < config.ASANA_MAX_RATE_LIMIT_RETRIES:
+                    # The limiter sleeps before the next attempt goes out
+                    self.rate_limiter.pause(self._retry_after(response))
+                    rate_limited += 1
+                    UPSTREAM_RETRIES.inc(service='asana', endpoint=label, reason='rate_limited')
+                    continue
+                if response.status_code not in self.RETRY_STATUS_CODES or attempt >= retries:
+                    break
+                reason = 'server_error'
+            
+            UPSTREAM_RETRIES.inc(service='asana', endpoint=label, reason=reason)
+            time.sleep(self._backoff_delay(attempt))
+            attempt += 1
         
         # Raise an exception for bad responses
         response.raise_for_status()
         
         return response.json()
     
+    def _retry_after(self, response):
+        """Seconds to wait according to a 429 response's Retry-After header"""
+        try:
+            return float(response.headers.get("Retry-After", 1))
+        except (TypeError, ValueError):
+            return 1.0
+    
+    @property
+    def throttled_seconds(self):
+        """Total time requests with this token have spent waiting on rate limits"""
+        return self.rate_limiter.stats()['throttled_seconds']
+    
+    def _backoff_delay(self, attempt):
+        """Full-jitter exponential backoff delay for a retry attempt"""
+        ceiling = min(config.ASANA_BACKOFF_MAX, config.ASANA_BACKOFF_BASE * (2 ** attempt))
+        return random.uniform(0, ceiling)
+    
     def get_tasks_with_tag(self, tag_name, completed=False):
-        """Get all tasks with a specific tag"""
+        """Get all tasks with a specific tag, as the task dicts Asana returns"""
+        return list(self._iter_tagged_task_dicts(tag_name, completed))
+    
+    def iter_tasks_with_tag(self, tag_name, completed=False, page_size=None, errors=None):
+        """
+        Yield tasks with a specific tag, fetching one page at a time
+        
+        Follows Asana's next_page.offset cursor so only a single page of
+        tasks is held in memory, and callers can start processing the first
+        page while later pages are still being requested.
+        
+        Args:
+            tag_name: Name of the tag to look up
+            completed: Whether to fetch completed tasks
+            page_size: Tasks per page (defaults to config.ASANA_PAGE_SIZE)
+            errors: Optional list that receives the exception if fetching
+                    fails, in which case the remaining tasks are not yielded
+        
+        Yields:
+            AsanaTask records
+        """
+        # Records are built as each page is read, keeping only their fields
+        return map(AsanaTask.from_api, self._iter_tagged_task_dicts(tag_name, completed, page_size, errors))
+    
+    def _iter_tagged_task_dicts(self, tag_name, completed=False, page_size=None, errors=None):
+        """Yield the task dicts of a tag's pages (see iter_tasks_with_tag)"""
+        page_size = page_size or config.ASANA_PAGE_SIZE
+        
         try:
-            # First, get the tag ID
-            tag_data = self._make_request(
-                "GET", 
-                f"workspaces/{self.workspace_id}/tags",
-                params={"limit": 100}
-            )
-            
-            tag_id = None
-            for tag in tag_data.get("data", []):
-                if tag["name"].lower() == tag_name.lower():
-                    tag_id = tag["gid"]
-                    break
+            # First, resolve the tag ID from the cached tag index
+            tag_id = self.get_tag_id(tag_name)
             
             if not tag_id:
-                return []
+                return
             
-            # Now, get tasks with this tag
-            tasks_data = self._make_request(
-                "GET",
+            # Now, page through the tasks with this tag
+            yield from self._iter_pages(
                 f"tags/{tag_id}/tasks",
                 params={
-                    "opt_fields": "name,due_on,due_at,completed",
-                    "completed": completed
+                    "opt_fields": TASK_OPT_FIELDS,
+                    "completed": completed,
+                    "limit": page_size
                 }
             )
             
-            return tasks_data.get("data", [])
-            
         except requests.exceptions.RequestException as e:
             print(f"Error fetching tasks with tag {tag_name}: {str(e)}")
-            return []
+            if errors is not None:
+                errors.append(e)
     
-    def parse_due_date(self, task):
-        """Parse the due date from an Asana task"""
-        # First check if due_at exists (includes time)
-        if task.get("due_at"):
-            return datetime.fromisoformat(task["due_at"].replace("Z", "+00:00"))
+    def _iter_pages(self, endpoint, params):
+        """Yield items from a paginated GET endpoint, following next_page offsets"""
+        params = dict(params)
+        while True:
+            page = self._make_request("GET", endpoint, params=params)
+            
+            yield from page.get("data", [])
+            
+            next_page = page.get("next_page")
+            offset = next_page.get("offset") if next_page else None
+            if not offset:
+                break
+            params["offset"] = offset
+    
+    def get_tag_id(self, tag_name):
+        """
+        Resolve a tag name to its gid
+        
+        The first lookup pages through every tag in the workspace once and
+        stores a name->gid index in the tag cache; later lookups are served
+        from the cache until it expires or is invalidated. A name missing
+        from the cached index may be a tag created since it was loaded, so
+        the index is reloaded, unless it was loaded less than
+        config.TAG_CACHE_MISS_RELOAD_SECONDS ago.
+        
+        Returns:
+            The tag gid, or None if no tag with that name exists
+        """
+        index = self.tag_cache.get(self.workspace_id)
+        if self._needs_tag_index(index, tag_name):
+            index = self._load_tag_index()
+        
+        return index.get(tag_name.lower())
+    
+    def _needs_tag_index(self, index, tag_name):
+        """Whether the tag index must be loaded to resolve a name: none is cached, or an older one lacks it"""
+        if index is None:
+            return True
+        return tag_name.lower() not in index and not self.tag_cache.loaded_within(
+            self.workspace_id, config.TAG_CACHE_MISS_RELOAD_SECONDS)
+    
+    def _load_tag_index(self):
+        """Page through the workspace's tags and cache their name->gid index"""
+        index = {
+            tag["name"].lower(): tag["gid"]
+            for tag in self._iter_pages(
+                f"workspaces/{self.workspace_id}/tags",
+                params={"limit": 100}
+            )
+        }
+        self.tag_cache.set(self.workspace_id, index)
+        return index
+    
+    def get_events(self, resource_id, sync_token=None):
+        """
+        Get the events on a resource (tag or project) since a sync token
         
-        # If only due_on exists (date only)
-        elif task.get("due_on"):
-            # Return a datetime for the start of the day
-            date_str = task["due_on"]
-            return datetime.fromisoformat(f"{date_str}T00:00:00+00:00")
+        Returns:
+            tuple: (list of events, new sync token)
         
-        return None
+        Raises:
+            SyncTokenExpired: If sync_token is missing or too old; the
+                exception carries a fresh token and the caller should fall
+                back to a full scan
+        """
+        events = []
+        while True:
+            params = {"resource": resource_id}
+            if sync_token:
+                params["sync"] = sync_token
+            
+            try:
+                page = self._make_request("GET", "events", params=params)
+            except requests.exceptions.HTTPError as e:
+                if e.response is not None and e.response.status_code == 412:
+                    raise SyncTokenExpired(e.response.json().get("sync"))
+                raise
+            
+            events.extend(page.get("data", []))
+            sync_token = page.get("sync")
+            if not page.get("has_more"):
+                return events, sync_token
+    
+    def get_task(self, task_id):
+        """Get a single task with the fields the sync needs"""
+        return self._make_request(
+            "GET",
+            f"tasks/{task_id}",
+            params={"opt_fields": f"{TASK_OPT_FIELDS},tags.name"}
+        ).get("data")
+    
+    def create_webhook(self, resource_id, target):
+        """
+        Register a webhook for a resource
+        
+        Asana sends the X-Hook-Secret handshake to the target before this
+        request returns.
+        """
+        return self._make_request(
+            "POST",
+            "webhooks",
+            data={
+                "data": {
+                    "resource": resource_id,
+                    "target": target
+                }
+            }
+        ).get("data")
+    
+    def iter_changed_tasks(self, tag_name, events, removed=None, failed=None):
+        """
+        Yield AsanaTask records for the tasks touched by a list of tag events
+        that still carry the tag
+        
+        Each changed task is fetched once, however many events refer to it;
+        completed tasks and tasks that lost the tag are skipped.
+        
+        Args:
+            removed: Optional list that receives the IDs of tasks that were
+                     removed from the tag, deleted or completed
+            failed: Optional list that receives the IDs of tasks that could
+                    not be fetched, and so were neither yielded nor removed
+        """
+        removed = [] if removed is None else removed
+        failed = [] if failed is None else failed
+        
+        # Last action per task, in the order tasks first appear
+        actions = {}
+        for event in events:
+            resource = event.get("resource") or {}
+            if resource.get("resource_type") == "task":
+                actions[resource["gid"]] = event.get("action")
+        
+        for task_id, action in actions.items():
+            if action == "deleted":
+                removed.append(task_id)
+                continue
+            
+            try:
+                task = self.get_task(task_id)
+            except requests.exceptions.HTTPError as e:
+                if e.response is not None and e.response.status_code == 404:
+                    removed.append(task_id)
+                else:
+                    print(f"Error fetching task {task_id}: {str(e)}")
+                    failed.append(task_id)
+                continue
+            except requests.exceptions.RequestException as e:
+                print(f"Error fetching task {task_id}: {str(e)}")
+                failed.append(task_id)
+                continue
+            
+            tag_names = {tag.get("name", "").lower() for tag in task.get("tags", [])}
+            if not task.get("completed") and tag_name.lower() in tag_names:
+                yield AsanaTask.from_api(task)
+            else:
+                removed.append(task_id)
+    
+    def parse_due_date(self, task):
+        """Parse the due date from an Asana task dict (records carry it already)"""
+        if isinstance(task, AsanaTask):
+            return task.due_date
+        return parse_due_fields(task.get("due_on"), task.get("due_at"))
     
     def has_time_component(self, task):
         """Check if the task has a time component in its due date"""
-        return "due_at" in task and task["due_at"] is not None
+        if isinstance(task, AsanaTask):
+            return task.has_time
+        return task.get("due_at") is not None
     
     def add_tag_to_task(self, task_id, tag_name):
         """Add a tag to a task"""
         try:
             # First, ensure the tag exists
-            tag_data = self._make_request(
-                "GET", 
-                f"workspaces/{self.workspace_id}/tags",
-                params={"limit": 100}
-            )
-            
-            tag_id = None
-            for tag in tag_data.get("data", []):
-                if tag["name"].lower() == tag_name.lower():
-                    tag_id = tag["gid"]
-                    break
+            tag_id = self.get_tag_id(tag_name)
             
             # If tag doesn't exist, create it
             if not tag_id:
@@ -115,6 +422,7 @@ class AsanaClient:
                     }
                 )
                 tag_id = create_tag_response["data"]["gid"]
+                self.tag_cache.add(self.workspace_id, tag_name, tag_id)
             
             # Add the tag to the task
             response = self._make_request(
@@ -0,0 +1,458 @@
+import asyncio
+import contextvars
+import functools
+import random
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import aiohttp
+from google.auth.transport.requests import Request
+
+from utils.asana_client import AsanaClient, AsanaTask, TASK_OPT_FIELDS
+from utils.calendar_client import GoogleCalendarClient, get_calendar_client
+from utils.db import get_synced_task_states, delete_synced_tasks_by_event_ids
+from utils.rate_limit import get_rate_limiter
+from utils.sync import TaskSynchronizer
+from utils.sync_plan import SyncPlan
+from utils.tag_cache import default_tag_cache
+import config
+
+class EventGone(Exception):
+    """Raised when an event to patch no longer exists in the calendar (404/410)"""
+
+class AsyncAsanaClient:
+    """asyncio client for the Asana API endpoints used by the sync"""
+    
+    BASE_URL = AsanaClient.BASE_URL
+    IDEMPOTENT_METHODS = AsanaClient.IDEMPOTENT_METHODS
+    RETRY_STATUS_CODES = AsanaClient.RETRY_STATUS_CODES
+    
+    # Due date, Retry-After and tag cache handling is shared with the synchronous client
+    parse_due_date = AsanaClient.parse_due_date
+    has_time_component = AsanaClient.has_time_component
+    _retry_after = AsanaClient._retry_after
+    _needs_tag_index = AsanaClient._needs_tag_index
+    
+    def __init__(self, access_token=None, workspace_id=None, tag_cache=None, session=None,
+                 rate_limiter=None):
+        """Initialize with optional custom credentials, aiohttp session and rate limiter"""
+        self.access_token = access_token or config.ASANA_ACCESS_TOKEN
+        self.workspace_id = workspace_id or config.ASANA_WORKSPACE_ID
+        self.tag_cache = tag_cache or default_tag_cache
+        # Shared with AsanaClient instances using the same token
+        self.rate_limiter = rate_limiter or get_rate_limiter(self.access_token)
+        self.headers = {
+            "Authorization": f"Bearer {self.access_token}",
+            "Accept": "application/json"
+        }
+        self.session = session
+    
+    @property
+    def throttled_seconds(self):
+        """Total time requests with this token have spent waiting on rate limits"""
+        return self.rate_limiter.stats()['throttled_seconds']
+    
+    def _get_session(self):
+        """Create the pooled aiohttp session on first use (it needs a running loop)"""
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=config.ASANA_POOL_SIZE),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=config.ASANA_CONNECT_TIMEOUT,
+                    sock_read=config.ASANA_READ_TIMEOUT
+                )
+            )
+        return self.session
+    
+    async def close(self):
+        """Close the aiohttp session"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+    
+    async def _make_request(self, method, endpoint, params=None, data=None):
+        """
+        Make an HTTP request to the Asana API
+        
+        Follows the same policy as AsanaClient._make_request, through the
+        same per-token rate limiter: 429 responses pause the limiter for
+        Retry-After and are resent, and idempotent requests are retried on
+        5xx responses and timeouts with jittered backoff.
+        """
+        url = f"{self.BASE_URL}/{endpoint}"
+        retries = config.ASANA_MAX_RETRIES if method.upper() in self.IDEMPOTENT_METHODS else 0
+        # aiohttp only accepts str/int query values
+        if params:
+            params = {key: str(value).lower() if isinstance(value, bool) else value
+                      for key, value in params.items()}
+        
+        attempt = 0
+        rate_limited = 0
+        while True:
+            try:
+                async with self.rate_limiter.acquire_async(method), self._get_session().request(
+                    method, url, headers=self.headers, params=params, json=data
+                ) as response:
+                    if response.status == 429 and rate_limited < config.ASANA_MAX_RATE_LIMIT_RETRIES:
+                        # The limiter holds back the next attempt
+                        self.rate_limiter.pause(self._retry_after(response))
+                        rate_limited += 1
+                        continue
+                    if response.status not in self.RETRY_STATUS_CODES or attempt >= retries:
+                        # Raise an exception for bad responses
+                        response.raise_for_status()
+                        return await response.json()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= retries:
+                    raise
+            
+            ceiling = min(config.ASANA_BACKOFF_MAX, config.ASANA_BACKOFF_BASE * (2 ** attempt))
+            await asyncio.sleep(random.uniform(0, ceiling))
+            attempt += 1
+    
+    async def _iter_pages(self, endpoint, params):
+        """Yield items from a paginated GET endpoint, following next_page offsets"""
+        params = dict(params)
+        while True:
+            page = await self._make_request("GET", endpoint, params=params)
+            
+            for item in page.get("data", []):
+                yield item
+            
+            next_page = page.get("next_page")
+            offset = next_page.get("offset") if next_page else None
+            if not offset:
+                break
+            params["offset"] = offset
+    
+    async def get_tag_id(self, tag_name):
+        """
+        Resolve a tag name to its gid through the shared tag cache
+        
+        Like AsanaClient.get_tag_id, a name missing from an index loaded
+        more than config.TAG_CACHE_MISS_RELOAD_SECONDS ago reloads it.
+        """
+        index = self.tag_cache.get(self.workspace_id)
+        if self._needs_tag_index(index, tag_name):
+            index = await self._load_tag_index()
+        
+        return index.get(tag_name.lower())
+    
+    async def _load_tag_index(self):
+        """Page through the workspace's tags and cache their name->gid index"""
+        index = {}
+        async for tag in self._iter_pages(
+            f"workspaces/{self.workspace_id}/tags",
+            params={"limit": 100}
+        ):
+            index[tag["name"].lower()] = tag["gid"]
+        self.tag_cache.set(self.workspace_id, index)
+        return index
+    
+    async def iter_tasks_with_tag(self, tag_name, completed=False, page_size=None):
+        """Yield AsanaTask records for the tasks with a specific tag, fetching one page at a time"""
+        tag_id = await self.get_tag_id(tag_name)
+        if not tag_id:
+            return
+        
+        async for task in self._iter_pages(
+            f"tags/{tag_id}/tasks",
+            params={
+                "opt_fields": TASK_OPT_FIELDS,
+                "completed": completed,
+                "limit": page_size or config.ASANA_PAGE_SIZE
+            }
+        ):
+            yield AsanaTask.from_api(task)
+
+class AsyncCalendarClient:
+    """asyncio client for creating, patching and deleting Google Calendar events over the REST API"""
+    
+    BASE_URL = "https://www.googleapis.com/calendar/v3"
+    
+    # Event bodies are built exactly as the synchronous client builds them
+    build_event_body = GoogleCalendarClient.build_event_body
+    
+    def __init__(self, credentials=None, calendar_id=None, session=None):
+        """
+        Initialize with optional credentials and calendar ID
+        
+        Without credentials, those of the process-wide GoogleCalendarClient
+        are used, which a background thread keeps refreshed.
+        """
+        self.credentials = credentials or get_calendar_client().credentials
+        self.calendar_id = calendar_id or config.GOOGLE_CALENDAR_ID
+        self.session = session
+    
+    def _get_session(self):
+        """Create the pooled aiohttp session on first use (it needs a running loop)"""
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=config.SYNC_CONCURRENCY)
+            )
+        return self.session
+    
+    async def close(self):
+        """Close the aiohttp session"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+    
+    async def _auth_headers(self):
+        """Return the bearer header, refreshing the token in a thread if it expired"""
+        if not self.credentials.valid:
+            await asyncio.to_thread(self.credentials.refresh, Request())
+        return {"Authorization": f"Bearer {self.credentials.token}"}
+    
+    async def create_event(self, summary, description, start_time, has_time=True, end_time=None,
+                           asana_task_id=None):
+        """
+        Create a Google Calendar event
+        
+        Returns:
+            The created event object, or None on error
+        """
+        event = self.build_event_body(summary, description, start_time, has_time, end_time,
+                                      asana_task_id)
+        url = f"{self.BASE_URL}/calendars/{quote(self.calendar_id, safe='')}/events"
+        
+        try:
+            async with self._get_session().post(
+                url, headers=await self._auth_headers(), json=event
+            ) as response:
+                response.raise_for_status()
+                return await response.json()
+        
+        except Exception as e:
+            print(f"Error creating calendar event: {str(e)}")
+            return None
+    
+    async def patch_event(self, event_id, summary=None, start_time=None, has_time=True):
+        """
+        Patch an event, sending only the fields that are given
+        
+        Returns:
+            The patched event object, or None on error
+        
+        Raises:
+            EventGone: If the event was deleted from the calendar
+        """
+        body = {}
+        if summary is not None:
+            body['summary'] = summary
+        if start_time is not None:
+            times = self.build_event_body(None, None, start_time, has_time)
+            body['start'] = times['start']
+            body['end'] = times['end']
+        
+        try:
+            async with self._get_session().patch(
+                self._event_url(event_id), headers=await self._auth_headers(), json=body
+            ) as response:
+                if response.status in (404, 410):
+                    raise EventGone(event_id)
+                response.raise_for_status()
+                return await response.json()
+        
+        except EventGone:
+            raise
+        except Exception as e:
+            print(f"Error patching calendar event {event_id}: {str(e)}")
+            return None
+    
+    async def delete_event(self, event_id):
+        """
+        Delete an event
+        
+        Returns:
+            True if the event was deleted or was already gone (404/410)
+        """
+        try:
+            async with self._get_session().delete(
+                self._event_url(event_id), headers=await self._auth_headers()
+            ) as response:
+                # An event that is already gone only needs its record removed
+                if response.status not in (404, 410):
+                    response.raise_for_status()
+                return True
+        
+        except Exception as e:
+            print(f"Error deleting calendar event {event_id}: {str(e)}")
+            return False
+    
+    def _event_url(self, event_id):
+        """URL of an event in the calendar"""
+        return f"{self.BASE_URL}/calendars/{quote(self.calendar_id, safe='')}/events/{quote(event_id, safe='')}"
+
+class AsyncTaskSynchronizer:
+    """
+    asyncio counterpart of TaskSynchronizer
+    
+    Tasks are diffed against their synced state with the same rules as
+    TaskSynchronizer, so changed tasks are patched, and the stats dict
+    has the same keys as that of a full TaskSynchronizer.sync_tasks run.
+    Page fetching, calendar requests and persistence overlap, with at most
+    `concurrency` requests in flight. Database calls run one at a time on
+    a dedicated thread so the event loop never blocks on them.
+    """
+    
+    # Diffing, recording and deleting rules are shared with the synchronous engine
+    resource_id = TaskSynchronizer.resource_id
+    _new_stats = TaskSynchronizer._new_stats
+    _diff_task = TaskSynchronizer._diff_task
+    _plan_page = TaskSynchronizer._plan_page
+    _finish_plan = TaskSynchronizer._finish_plan
+    _record_events = TaskSynchronizer._record_events
+    
+    def __init__(self, asana_client=None, calendar_client=None, concurrency=None):
+        """Initialize with optional custom clients and concurrency limit"""
+        self.asana_client = asana_client or AsyncAsanaClient()
+        self.calendar_client = calendar_client or AsyncCalendarClient()
+        self.tag_name = config.SCHEDULE_TAG_NAME
+        self.concurrency = concurrency or config.SYNC_CONCURRENCY
+        self._db_executor = ThreadPoolExecutor(max_workers=1)
+    
+    async def close(self):
+        """Close the clients' HTTP sessions and the database thread"""
+        await self.asana_client.close()
+        await self.calendar_client.close()
+        self._db_executor.shutdown(wait=True)
+    
+    async def _run_db(self, func, *args, **kwargs):
+        """Run a database call on the DB thread, inside the caller's app context"""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._db_executor,
+            functools.partial(context.run, func, *args, **kwargs)
+        )
+    
+    async def sync_tasks(self):
+        """
+        Find tasks with the 'schedule' tag and due date, and create, patch
+        or delete the corresponding events in Google Calendar
+        
+        Returns:
+            dict: Statistics about the sync operation
+        """
+        stats = self._new_stats()
+        stats['sync_mode'] = 'full'
+        plan = SyncPlan(self.resource_id)
+        throttled_before = self.asana_client.throttled_seconds
+        semaphore = asyncio.Semaphore(self.concurrency)
+        in_flight = set()
+        removed = []
+        failed = []
+        # Asana IDs already diffed
+        seen = set()
+        
+        try:
+            async for page in self._pages():
+                page = [task for task in page if task.gid not in seen]
+                seen.update(task.gid for task in page)
+                plan.tasks_found += len(page)
+                
+                states = await self._run_db(get_synced_task_states, [task.gid for task in page])
+                changes = self._plan_page(plan, page, states, removed)
+                if not changes:
+                    continue
+                
+                sends = []
+                for item in changes:
+                    # Waiting here holds back page fetching while all slots are busy
+                    await semaphore.acquire()
+                    send = asyncio.create_task(self._send_item(item))
+                    send.add_done_callback(lambda _: semaphore.release())
+                    sends.append(send)
+                
+                # Each page is recorded in one transaction once its requests finish
+                job = asyncio.create_task(self._record_page(sends, stats))
+                in_flight.add(job)
+                job.add_done_callback(in_flight.discard)
+        except Exception as e:
+            print(f"Error fetching tasks with tag {self.tag_name}: {str(e)}")
+            failed.append(self.tag_name)
+        
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        
+        await self._run_db(self._finish_plan, plan, removed, failed, seen, full_scan=True)
+        if plan.deletes:
+            await self._delete_events(plan.deletes, stats, semaphore)
+        
+        # Fetch failures count as errors, as in TaskSynchronizer.apply
+        stats['errors'] += plan.fetch_errors
+        stats.update(tasks_found=plan.tasks_found, already_synced=plan.already_synced)
+        # Time this run spent waiting on Asana rate limits
+        stats['throttled_seconds'] = round(self.asana_client.throttled_seconds - throttled_before, 3)
+        
+        return stats
+    
+    async def _pages(self):
+        """Group the tagged tasks into lists of config.ASANA_PAGE_SIZE AsanaTask records"""
+        page = []
+        async for task in self.asana_client.iter_tasks_with_tag(self.tag_name, completed=False):
+            page.append(task if isinstance(task, AsanaTask) else AsanaTask.from_api(task))
+            if len(page) >= config.ASANA_PAGE_SIZE:
+                yield page
+                page = []
+        if page:
+            yield page
+    
+    async def _send_item(self, item):
+        """
+        Create or patch the event of a planned item
+        
+        A patched event that users deleted in the calendar is created again.
+        
+        Returns:
+            tuple: (item, (event, error)), as TaskSynchronizer._send_batch pairs them
+        """
+        try:
+            if item['action'] == 'patch':
+                try:
+                    event = await self.calendar_client.patch_event(
+                        item['event_id'],
+                        summary=item['task_name'] if item['name_changed'] else None,
+                        start_time=item['due_date'] if item['due_changed'] else None,
+                        has_time=item['has_time']
+                    )
+                    return item, (event, None if event else "calendar patch failed")
+                except EventGone:
+                    item = dict(item, action='create')
+            
+            event = await self.calendar_client.create_event(
+                summary=item['task_name'],
+                description=f"Asana task: {item['task_id']}",
+                start_time=item['due_date'],
+                has_time=item['has_time'],
+                asana_task_id=item['task_id']
+            )
+            return item, (event, None if event else "calendar create failed")
+        except Exception as e:
+            return item, (None, e)
+    
+    async def _record_page(self, sends, stats):
+        """Record a page's results; stats are only touched on the DB thread"""
+        results = await asyncio.gather(*sends)
+        await self._run_db(self._record_events, results, stats)
+    
+    async def _delete_events(self, task_ids, stats, semaphore):
+        """Delete the calendar events and records of synced tasks that were removed"""
+        states = await self._run_db(get_synced_task_states, task_ids)
+        event_ids = [state.google_event_id for state in states.values()]
+        
+        async def delete(event_id):
+            async with semaphore:
+                return await self.calendar_client.delete_event(event_id)
+        
+        results = await asyncio.gather(*(delete(event_id) for event_id in event_ids))
+        deleted = [event_id for event_id, success in zip(event_ids, results) if success]
+        
+        if deleted:
+            await self._run_db(delete_synced_tasks_by_event_ids, deleted)
+        stats['events_deleted'] += len(deleted)
+        stats['errors'] += len(event_ids) - len(deleted)
+
+async def sync_many(synchronizers):
+    """Run several synchronizers (e.g. one per workspace) concurrently in one event loop"""
+    return await asyncio.gather(*(synchronizer.sync_tasks() for synchronizer in synchronizers))
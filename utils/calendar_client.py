@@ -1,15 +1,25 @@
+import ast
 import os
 import datetime
 import json
+import threading
+import time
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 import config
+from utils.metrics import UPSTREAM_REQUEST_SECONDS, UPSTREAM_RESPONSES
 
 # If modifying these scopes, delete the token file.
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
+# Private extended property value marking events created by this app
+MANAGED_BY = 'asana_calendar_sync'
+
 class GoogleCalendarClient:
     """Client for interacting with Google Calendar API"""
     
@@ -18,37 +28,18 @@ class GoogleCalendarClient:
         self.credentials_file = credentials_file or config.GOOGLE_CREDENTIALS_FILE
         self.token_file = token_file or config.GOOGLE_TOKEN_FILE
         self.calendar_id = calendar_id or config.GOOGLE_CALENDAR_ID
+        self.credentials = None
+        self._local = threading.local()
+        self._refresh_lock = threading.Lock()
         self.service = self._get_calendar_service()
     
     def _get_calendar_service(self):
         """Authenticate and build the Google Calendar service"""
-        creds = None
-        
         # Check if credentials are in environment variable
         google_creds_env = os.environ.get('GOOGLE_CREDENTIALS')
-        if google_creds_env:
-            # Parse the JSON string from environment variable
-            client_config = json.loads(google_creds_env)
-            
-            # Try to load existing token
-            if os.path.exists(self.token_file):
-                try:
-                    creds = Credentials.from_authorized_user_info(
-                        eval(open(self.token_file, 'r').read()), 
-                        SCOPES
-                    )
-                except Exception as e:
-                    print(f"Error loading token: {str(e)}")
-        else:
-            # Try to load existing token
-            if os.path.exists(self.token_file):
-                try:
-                    creds = Credentials.from_authorized_user_info(
-                        eval(open(self.token_file, 'r').read()), 
-                        SCOPES
-                    )
-                except Exception as e:
-                    print(f"Error loading token: {str(e)}")
+        
+        # Try to load existing token
+        creds = self._load_token()
             
         # If no valid credentials available, let the user log in
         if not creds or not creds.valid:
@@ -56,21 +47,87 @@ class GoogleCalendarClient:
                 creds.refresh(Request())
             else:
                 if google_creds_env:
+                    # Parse the JSON string from environment variable
                     flow = InstalledAppFlow.from_client_config(
-                        client_config, SCOPES)
+                        json.loads(google_creds_env), SCOPES)
                 else:
                     flow = InstalledAppFlow.from_client_secrets_file(
                         self.credentials_file, SCOPES)
                 creds = flow.run_local_server(port=0)
             
             # Save the credentials for the next run
-            with open(self.token_file, 'w') as token:
-                token.write(str(creds.to_json()))
+            self._save_token(creds)
         
-        # Build and return the service
+        # Build and return the service; the discovery document is the static
+        # copy bundled with googleapiclient, so no discovery request is made
+        self.credentials = creds
         return build('calendar', 'v3', credentials=creds)
     
-    def create_event(self, summary, description, start_time, has_time=True, end_time=None):
+    def _load_token(self):
+        """Load saved credentials from the token file, or None if missing or unreadable"""
+        if not os.path.exists(self.token_file):
+            return None
+        
+        try:
+            with open(self.token_file, 'r') as token:
+                content = token.read()
+            try:
+                info = json.loads(content)
+            except ValueError:
+                # Older token files may hold a Python dict literal
+                info = ast.literal_eval(content)
+            return Credentials.from_authorized_user_info(info, SCOPES)
+        except Exception as e:
+            print(f"Error loading token: {str(e)}")
+            return None
+    
+    def _save_token(self, creds):
+        """Write credentials to the token file"""
+        with open(self.token_file, 'w') as token:
+            token.write(str(creds.to_json()))
+    
+    def refresh_credentials(self, margin_seconds=None):
+        """
+        Refresh the access token if it expires within the margin
+        
+        The refreshed credentials are shared with the service (and every
+        thread's HTTP object), and saved to the token file.
+        
+        Returns:
+            True if the token was refreshed
+        """
+        margin = datetime.timedelta(seconds=config.GOOGLE_TOKEN_REFRESH_MARGIN
+                                    if margin_seconds is None else margin_seconds)
+        
+        with self._refresh_lock:
+            creds = self.credentials
+            if not creds or not creds.refresh_token:
+                return False
+            
+            # Credential expiry is naive UTC
+            if creds.expiry and creds.expiry - datetime.datetime.utcnow() > margin:
+                return False
+            
+            creds.refresh(Request())
+            self._save_token(creds)
+            return True
+    
+    def _thread_http(self):
+        """
+        Return an authorized HTTP object owned by the calling thread
+        
+        httplib2 connections are not thread-safe, so batches executed from
+        worker threads each use their own connection instead of the one
+        shared by the service.
+        """
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = AuthorizedHttp(self.credentials, http=httplib2.Http())
+            self._local.http = http
+        return http
+    
+    def create_event(self, summary, description, start_time, has_time=True, end_time=None,
+                     asana_task_id=None):
         """
         Create a Google Calendar event
         
@@ -81,15 +138,40 @@ class GoogleCalendarClient:
             has_time: Whether the event has a specific time or is all-day
             end_time: Optional end time (defaults to 1 hour after start for timed events,
                       or same day for all-day events)
+            asana_task_id: Optional Asana task ID, stored as a private extended
+                           property that marks the event as managed by the sync
         
         Returns:
             The created event object
         """
+        event = self.build_event_body(summary, description, start_time, has_time, end_time,
+                                      asana_task_id)
+        
+        try:
+            created_event = self._execute(self.service.events().insert(
+                calendarId=self.calendar_id,
+                body=event
+            ))
+            
+            return created_event
+            
+        except Exception as e:
+            print(f"Error creating calendar event: {str(e)}")
+            return None
+    
+    def build_event_body(self, summary, description, start_time, has_time=True, end_time=None,
+                         asana_task_id=None):
+        """Build the request body for an event (see create_event for arguments)"""
         event = {
             'summary': summary,
             'description': description,
         }
         
+        if asana_task_id:
+            event['extendedProperties'] = {
+                'private': {'managedBy': MANAGED_BY, 'asanaTaskId': asana_task_id}
+            }
+        
         # Set default end time if not provided
         if not end_time:
             if has_time:
@@ -110,25 +192,219 @@ class GoogleCalendarClient:
             event['start'] = {'date': date_str}
             event['end'] = {'date': end_date_str}
         
-        try:
-            created_event = self.service.events().insert(
+        return event
+    
+    def create_events_bulk(self, events):
+        """
+        Create many events using batch requests
+        
+        Args:
+            events: List of dicts with the keyword arguments of create_event
+                    (summary, description, start_time, has_time, end_time,
+                    asana_task_id)
+        
+        Returns:
+            List of (created_event, error) tuples in the same order as events;
+            exactly one of the two is None
+        """
+        requests = [
+            self.service.events().insert(
                 calendarId=self.calendar_id,
-                body=event
-            ).execute()
+                body=self.build_event_body(**event)
+            )
+            for event in events
+        ]
+        return self._execute_batched(requests)
+    
+    def patch_events_bulk(self, patches):
+        """
+        Patch many events using batch requests, sending only changed fields
+        
+        Args:
+            patches: List of dicts with event_id and, for the fields that
+                     changed, summary and/or start_time (with has_time)
+        
+        Returns:
+            List of (patched_event, error) tuples in the same order as patches
+        """
+        requests = []
+        for patch in patches:
+            body = {}
+            if patch.get('summary') is not None:
+                body['summary'] = patch['summary']
+            if patch.get('start_time') is not None:
+                times = self.build_event_body(None, None, patch['start_time'], patch.get('has_time', True))
+                body['start'] = times['start']
+                body['end'] = times['end']
             
-            return created_event
+            requests.append(self.service.events().patch(
+                calendarId=self.calendar_id,
+                eventId=patch['event_id'],
+                body=body
+            ))
+        return self._execute_batched(requests)
+    
+    def delete_events_bulk(self, event_ids):
+        """
+        Delete many events using batch requests
+        
+        Returns:
+            List of (deleted, error) tuples in the same order as event_ids
+        """
+        requests = [
+            self.service.events().delete(
+                calendarId=self.calendar_id,
+                eventId=event_id
+            )
+            for event_id in event_ids
+        ]
+        results = self._execute_batched(requests)
+        return [(error is None, error) for _, error in results]
+    
+    def _execute_batched(self, requests):
+        """Send requests in batches of config.GOOGLE_BATCH_SIZE and collect per-item results"""
+        results = [(None, None)] * len(requests)
+        
+        def callback(request_id, response, exception):
+            index = int(request_id)
+            results[index] = (response if exception is None else None, exception)
+            UPSTREAM_RESPONSES.inc(service='google_calendar', endpoint=self._method_label(requests[index]),
+                                   status=self._error_status(exception) if exception else 200)
+        
+        for start in range(0, len(requests), config.GOOGLE_BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=callback)
+            for index in range(start, min(start + config.GOOGLE_BATCH_SIZE, len(requests))):
+                batch.add(requests[index], request_id=str(index))
             
+            try:
+                with UPSTREAM_REQUEST_SECONDS.time(service='google_calendar', endpoint='batch'):
+                    batch.execute(http=self._thread_http())
+                UPSTREAM_RESPONSES.inc(service='google_calendar', endpoint='batch', status=200)
+            except Exception as e:
+                # The whole batch failed, so every item in it failed
+                print(f"Error executing calendar batch: {str(e)}")
+                UPSTREAM_RESPONSES.inc(service='google_calendar', endpoint='batch',
+                                       status=self._error_status(e))
+                for index in range(start, min(start + config.GOOGLE_BATCH_SIZE, len(requests))):
+                    results[index] = (None, e)
+        
+        return results
+    
+    def _execute(self, request):
+        """Execute a single API request, recording its latency and status"""
+        endpoint = self._method_label(request)
+        try:
+            with UPSTREAM_REQUEST_SECONDS.time(service='google_calendar', endpoint=endpoint):
+                response = request.execute()
         except Exception as e:
-            print(f"Error creating calendar event: {str(e)}")
-            return None
+            UPSTREAM_RESPONSES.inc(service='google_calendar', endpoint=endpoint, status=self._error_status(e))
+            raise
+        UPSTREAM_RESPONSES.inc(service='google_calendar', endpoint=endpoint, status=200)
+        return response
+    
+    @staticmethod
+    def _method_label(request):
+        """API method of a request, e.g. calendar.events.insert"""
+        method_id = getattr(request, 'methodId', None)
+        return method_id if isinstance(method_id, str) else 'unknown'
+    
+    @staticmethod
+    def _error_status(error):
+        """HTTP status of a failed call, or 'error' when no response was received"""
+        status = getattr(getattr(error, 'resp', None), 'status', None)
+        return status if isinstance(status, int) else 'error'
+    
+    def list_changed_events(self, sync_token=None):
+        """
+        List managed events changed since a calendar sync token
+        
+        Without a token (or when Google rejects it with 410 Gone) the whole
+        calendar is listed once to obtain a new token. Deleted events are
+        included with status 'cancelled'; Google returns them without
+        extended properties, so they are kept whether or not they are
+        managed and callers match them by event ID.
+        
+        Returns:
+            tuple: (events, next sync token, whether this was a full listing)
+        """
+        events = []
+        page_token = None
+        
+        while True:
+            params = {
+                'calendarId': self.calendar_id,
+                'showDeleted': True,
+                'maxResults': 2500,
+                'fields': 'items(id,status,start,extendedProperties),nextPageToken,nextSyncToken'
+            }
+            if sync_token:
+                params['syncToken'] = sync_token
+            if page_token:
+                params['pageToken'] = page_token
+            
+            try:
+                response = self._execute(self.service.events().list(**params))
+            except HttpError as e:
+                if sync_token and e.resp.status == 410:
+                    # The token expired: start over with a full listing
+                    return self.list_changed_events(None)
+                raise
+            
+            events.extend(
+                event for event in response.get('items', [])
+                if event.get('status') == 'cancelled' or self.is_managed(event)
+            )
+            
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return events, response.get('nextSyncToken'), sync_token is None
+    
+    def watch_events(self, address, channel_id, token, ttl_seconds=None):
+        """
+        Open a push notification channel for changes to the calendar's events
+        
+        Args:
+            address: HTTPS URL Google posts notifications to
+            channel_id: Unique ID for the channel
+            token: Secret Google echoes back in X-Goog-Channel-Token
+            ttl_seconds: Optional requested channel lifetime
+        
+        Returns:
+            The channel resource, including resourceId and expiration (ms since epoch)
+        """
+        body = {
+            'id': channel_id,
+            'type': 'web_hook',
+            'address': address,
+            'token': token
+        }
+        if ttl_seconds:
+            body['params'] = {'ttl': str(ttl_seconds)}
+        
+        return self._execute(self.service.events().watch(
+            calendarId=self.calendar_id,
+            body=body
+        ))
+    
+    def stop_channel(self, channel_id, resource_id):
+        """Stop a push notification channel"""
+        self._execute(self.service.channels().stop(
+            body={'id': channel_id, 'resourceId': resource_id}
+        ))
+    
+    @staticmethod
+    def is_managed(event):
+        """Check whether an event carries the private property set by this app"""
+        private = event.get('extendedProperties', {}).get('private', {})
+        return private.get('managedBy') == MANAGED_BY
     
     def delete_event(self, event_id):
         """Delete a Google Calendar event by ID"""
         try:
-            self.service.events().delete(
+            self._execute(self.service.events().delete(
                 calendarId=self.calendar_id,
                 eventId=event_id
-            ).execute()
+            ))
             
             return True
             
@@ -139,11 +415,73 @@ class GoogleCalendarClient:
     def get_event(self, event_id):
         """Get a Google Calendar event by ID"""
         try:
-            return self.service.events().get(
+            return self._execute(self.service.events().get(
                 calendarId=self.calendar_id,
                 eventId=event_id
-            ).execute()
+            ))
             
         except Exception as e:
             print(f"Error getting calendar event: {str(e)}")
             return None
+
+_clients = {}
+_clients_lock = threading.Lock()
+# One lock per settings key, so building a client (which may run the
+# interactive OAuth flow) only blocks callers waiting for that same client
+_client_build_locks = {}
+
+def get_calendar_client(credentials_file=None, token_file=None, calendar_id=None):
+    """
+    Return the process-wide GoogleCalendarClient for these settings
+    
+    The client (and its service and credentials) is built once and then
+    shared by every request and sync in the process. A background thread
+    refreshes its token before it expires.
+    """
+    key = (
+        credentials_file or config.GOOGLE_CREDENTIALS_FILE,
+        token_file or config.GOOGLE_TOKEN_FILE,
+        calendar_id or config.GOOGLE_CALENDAR_ID
+    )
+    
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None:
+            return client
+        build_lock = _client_build_locks.setdefault(key, threading.Lock())
+    
+    with build_lock:
+        # Another caller may have built it while this one waited
+        with _clients_lock:
+            client = _clients.get(key)
+        if client is not None:
+            return client
+        
+        client = GoogleCalendarClient(*key)
+        with _clients_lock:
+            _clients[key] = client
+    
+    threading.Thread(
+        target=_refresh_credentials_loop,
+        args=(client,),
+        name='google-token-refresh',
+        daemon=True
+    ).start()
+    return client
+
+def clear_calendar_clients():
+    """Forget all shared clients, e.g. after re-authenticating"""
+    with _clients_lock:
+        _clients.clear()
+
+def _refresh_credentials_loop(client):
+    """Keep a shared client's token fresh for as long as it stays registered"""
+    while True:
+        time.sleep(config.GOOGLE_TOKEN_REFRESH_INTERVAL)
+        with _clients_lock:
+            if client not in _clients.values():
+                return
+        try:
+            client.refresh_credentials()
+        except Exception as e:
+            print(f"Error refreshing Google credentials: {str(e)}")
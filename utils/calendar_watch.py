@@ -0,0 +1,144 @@
+import hmac
+import secrets
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from utils.calendar_client import get_calendar_client
+from utils.db import get_watch_channels, get_watch_channel, add_watch_channel, delete_watch_channel
+from utils.lease import LeaseLock, watch_lease_name
+import config
+
+class CalendarWatchManager:
+    """
+    Keeps a Google Calendar push notification channel open
+    
+    A channel is created on start and replaced by a new one shortly before
+    it expires; the old channel is stopped once its successor is recorded,
+    so no notifications are missed in between. Channels are stored in the
+    database, so every worker process can verify incoming notifications,
+    and opened under a database lease, so only one process renews them.
+    """
+    
+    def __init__(self, app, address=None, calendar_client_factory=None, ttl_seconds=None,
+                 renew_margin=None, check_interval=None, lease_name=None):
+        """Initialize with the Flask app and optional notification address, timings and lease name"""
+        self.app = app
+        self.address = address or config.GOOGLE_WATCH_ADDRESS
+        self.calendar_client_factory = calendar_client_factory or get_calendar_client
+        self.ttl_seconds = ttl_seconds or config.GOOGLE_WATCH_TTL_SECONDS
+        self.renew_margin = config.GOOGLE_WATCH_RENEW_MARGIN if renew_margin is None else renew_margin
+        self.check_interval = check_interval or config.GOOGLE_WATCH_CHECK_INTERVAL
+        self.lease = LeaseLock(app, lease_name or watch_lease_name(config.GOOGLE_CALENDAR_ID))
+        self._stopped = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Open a channel if needed and keep renewing it in the background"""
+        if self.address and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='calendar-watch', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Stop renewing; open channels are left to expire (see stop_channels)"""
+        self._stopped.set()
+    
+    def ensure_channel(self):
+        """
+        Return the current channel, opening a new one if none is open or
+        the newest expires within the renewal margin
+        
+        Only the process holding the watch lease opens channels; while
+        another process holds it, the newest channel (or None) is returned
+        and renewal is left to that process.
+        
+        Must be called inside an app context.
+        """
+        client = self.calendar_client_factory()
+        channel = self._current_channel(client)
+        if channel:
+            return channel
+        
+        if not self.lease.acquire():
+            channels = get_watch_channels(client.calendar_id)
+            return channels[0] if channels else None
+        
+        try:
+            # Another process may have renewed the channel before the lease was free
+            return self._current_channel(client) or self._open_channel(client)
+        finally:
+            self.lease.release(record=False)
+    
+    def _current_channel(self, client):
+        """Return the newest channel if it does not expire within the renewal margin, else None"""
+        channels = get_watch_channels(client.calendar_id)
+        if channels and channels[0].expires_at - datetime.utcnow() > timedelta(seconds=self.renew_margin):
+            return channels[0]
+        return None
+    
+    def _open_channel(self, client):
+        """Open a channel and stop the ones it replaces"""
+        channels = get_watch_channels(client.calendar_id)
+        channel_id = uuid.uuid4().hex
+        token = secrets.token_urlsafe(32)
+        response = client.watch_events(self.address, channel_id, token, self.ttl_seconds)
+        channel = add_watch_channel(
+            calendar_id=client.calendar_id,
+            channel_id=channel_id,
+            resource_id=response['resourceId'],
+            token=token,
+            # Expiration is in milliseconds since the epoch
+            expires_at=datetime.utcfromtimestamp(int(response['expiration']) / 1000)
+        )
+        
+        # The new channel is live, so the ones it replaces can go
+        for old in channels:
+            self._stop_channel(client, old)
+        
+        return channel
+    
+    def stop_channels(self):
+        """Stop every open channel of the calendar (inside an app context)"""
+        client = self.calendar_client_factory()
+        for channel in get_watch_channels(client.calendar_id):
+            self._stop_channel(client, channel)
+    
+    def _stop_channel(self, client, channel):
+        """Stop a channel at Google and forget it, even if Google already dropped it"""
+        try:
+            client.stop_channel(channel.channel_id, channel.resource_id)
+        except Exception as e:
+            print(f"Error stopping calendar channel {channel.channel_id}: {str(e)}")
+        delete_watch_channel(channel.channel_id)
+    
+    def handle_notification(self, headers):
+        """
+        Check a notification's X-Goog-* headers against the known channels
+        
+        Must be called inside an app context.
+        
+        Returns:
+            The resource state ('sync', 'exists' or 'not_exists'), or None
+            if the notification is not from one of our channels
+        """
+        channel = get_watch_channel(headers.get('X-Goog-Channel-ID', ''))
+        if not channel:
+            return None
+        
+        token = headers.get('X-Goog-Channel-Token', '')
+        if not hmac.compare_digest(channel.token, token):
+            return None
+        if headers.get('X-Goog-Resource-ID') != channel.resource_id:
+            return None
+        
+        return headers.get('X-Goog-Resource-State')
+    
+    def _run(self):
+        """Check the channel every interval, renewing it when it nears expiry"""
+        while not self._stopped.is_set():
+            try:
+                with self.app.app_context():
+                    self.ensure_channel()
+            except Exception as e:
+                print(f"Error renewing calendar channel: {str(e)}")
+            self._stopped.wait(self.check_interval)
@@ -1,8 +1,27 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
+import base64
+import json
+
+from utils.metrics import DB_QUERIES
 
 db = SQLAlchemy()
 
+# Keep IN-lists and multi-row INSERTs well under SQLite's bound-parameter limit
+BULK_CHUNK_SIZE = 500
+
+# Columns refreshed when an upsert hits an existing asana_task_id
+UPSERT_COLUMNS = ('asana_task_name', 'asana_due_date', 'google_event_id', 'content_hash', 'resource_id',
+                  'updated_at')
+
+# Columns the synced task listing can return
+LISTING_COLUMNS = ('id', 'asana_task_id', 'asana_task_name', 'asana_due_date', 'google_event_id',
+                   'created_at', 'updated_at')
+
 class SyncedTask(db.Model):
     """Model to track synced tasks between Asana and Google Calendar"""
     id = db.Column(db.Integer, primary_key=True)
@@ -10,18 +29,237 @@ class SyncedTask(db.Model):
     asana_task_name = db.Column(db.String(200), nullable=False)
     asana_due_date = db.Column(db.DateTime, nullable=False)
     google_event_id = db.Column(db.String(100), unique=True, nullable=False)
+    # Fingerprint of the task fields the event was built from (see utils.sync.task_fingerprint)
+    content_hash = db.Column(db.String(40), nullable=True)
+    # Workspace and tag the task was synced for ("<workspace>:<tag>"); None for rows from older versions
+    resource_id = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Existing databases get these through MIGRATIONS
+    __table_args__ = (
+        # Listing ordered by due date (keyset pages) and past-due range scans
+        db.Index('ix_synced_task_due_date_id', 'asana_due_date', 'id'),
+        # Rows changed since a point in time
+        db.Index('ix_synced_task_updated_at', 'updated_at'),
+        # Rows of one workspace tag, compared against a full scan
+        db.Index('ix_synced_task_resource_id', 'resource_id'),
+    )
+    
     def __repr__(self):
         return f'<SyncedTask {self.asana_task_name}>'
 
+class CachedTag(db.Model):
+    """Model to persist the tag name->gid index of an Asana workspace"""
+    id = db.Column(db.Integer, primary_key=True)
+    workspace_id = db.Column(db.String(50), nullable=False, index=True)
+    tag_name = db.Column(db.String(200), nullable=False)
+    tag_gid = db.Column(db.String(50), nullable=False)
+    cached_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (db.UniqueConstraint('workspace_id', 'tag_name'),)
+    
+    def __repr__(self):
+        return f'<CachedTag {self.tag_name}>'
+
+class SyncToken(db.Model):
+    """Model to store incremental sync tokens (e.g. Asana events sync tokens) per resource"""
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(20), nullable=False)
+    resource_id = db.Column(db.String(200), nullable=False)
+    token = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('source', 'resource_id'),)
+    
+    def __repr__(self):
+        return f'<SyncToken {self.source}:{self.resource_id}>'
+
+class AsanaWebhook(db.Model):
+    """Model for the Asana webhook of a workspace: its signing secret and any pending registration"""
+    id = db.Column(db.Integer, primary_key=True)
+    workspace_id = db.Column(db.String(50), unique=True, nullable=False)
+    # X-Hook-Secret from the handshake; deliveries are signed with it
+    secret = db.Column(db.String(200), nullable=True)
+    # Set while a registration started from the admin API waits for its handshake
+    handshake_expires_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<AsanaWebhook {self.workspace_id}>'
+
+class WatchChannel(db.Model):
+    """Model to track Google Calendar push notification channels"""
+    id = db.Column(db.Integer, primary_key=True)
+    calendar_id = db.Column(db.String(200), nullable=False, index=True)
+    channel_id = db.Column(db.String(64), unique=True, nullable=False)
+    resource_id = db.Column(db.String(200), nullable=False)
+    # Secret echoed back by Google in X-Goog-Channel-Token
+    token = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<WatchChannel {self.channel_id}>'
+
+class SyncLease(db.Model):
+    """Model for named leases that keep sync runs from overlapping across processes"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), unique=True, nullable=False)
+    # Holder of the lease and the run it is for; a lease past expires_at is free
+    owner = db.Column(db.String(200), nullable=True)
+    run_id = db.Column(db.String(64), nullable=True)
+    acquired_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
+    # Outcome of the last run that released the lease, for runs that waited on it
+    finished_run_id = db.Column(db.String(64), nullable=True)
+    result = db.Column(db.Text, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<SyncLease {self.name}>'
+
+class WorkspaceConfig(db.Model):
+    """Model for an Asana workspace synced in multi-tenant mode"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    asana_workspace_id = db.Column(db.String(50), unique=True, nullable=False)
+    asana_access_token = db.Column(db.String(200), nullable=False)
+    # Defaults to config.GOOGLE_CALENDAR_ID
+    calendar_id = db.Column(db.String(200), nullable=True)
+    # Comma-separated; each tag is synced as its own shard
+    tag_names = db.Column(db.String(500), nullable=False, default='schedule')
+    # Defaults to config.SYNC_INTERVAL_MINUTES
+    sync_interval_minutes = db.Column(db.Integer, nullable=True)
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<WorkspaceConfig {self.name}>'
+
+class SyncPlanRecord(db.Model):
+    """Model for a sync plan being applied, so an interrupted apply can resume from its checkpoint"""
+    id = db.Column(db.String(32), primary_key=True)
+    # Workspace and tag the plan is for ("<workspace>:<tag>")
+    resource_id = db.Column(db.String(200), nullable=False, index=True)
+    # SyncPlan.kind; only runs of the same kind resume the plan
+    kind = db.Column(db.String(50), nullable=True)
+    # The plan as written by SyncPlan.to_json; cleared once the plan is done or abandoned
+    plan = db.Column(db.Text, nullable=False)
+    # Creates and patches applied so far and the counters for them (JSON)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    stats = db.Column(db.Text, nullable=True)
+    # 'applying' until the plan finished, then 'done'; 'abandoned' if it was too old to resume
+    status = db.Column(db.String(20), nullable=False, default='applying')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SyncPlanRecord {self.id}>'
+
+class SchemaMigration(db.Model):
+    """Model to record which schema migrations have been applied"""
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<SchemaMigration {self.version}>'
+
+# Statement keywords counted under their own name; anything else counts as 'other'
+QUERY_OPERATIONS = frozenset(['select', 'insert', 'update', 'delete', 'create', 'drop', 'alter'])
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    """Count every statement sent to a database, by operation"""
+    keyword = (statement.split(None, 1) or [''])[0].lower()
+    DB_QUERIES.inc(operation=keyword if keyword in QUERY_OPERATIONS else 'other')
+
 def init_db(app):
     """Initialize the database with the Flask app"""
     db.init_app(app)
     with app.app_context():
         db.create_all()
+        migrate()
+
+def _add_column(table, column, column_type):
+    """Build a migration adding a nullable column, which neither SQLite nor PostgreSQL rewrites the table for"""
+    def apply():
+        columns = {existing['name'] for existing in db.inspect(db.engine).get_columns(table)}
+        if column not in columns:
+            with db.engine.begin() as connection:
+                connection.execute(db.text(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}'))
+    return apply
+
+def _create_index(name, table, columns):
+    """
+    Build a migration creating an index if it does not exist yet
+    
+    On PostgreSQL the index is built CONCURRENTLY so writes to the table
+    are not blocked meanwhile; an invalid index left by an interrupted
+    build is dropped and built again.
+    """
+    def apply():
+        column_list = ', '.join(columns)
+        if db.engine.dialect.name == 'postgresql':
+            with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                invalid = connection.execute(db.text(
+                    'SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid '
+                    'WHERE pg_class.relname = :name AND NOT pg_index.indisvalid'
+                ), {'name': name}).first()
+                if invalid:
+                    connection.execute(db.text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+                connection.execute(db.text(
+                    f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column_list})'))
+        else:
+            with db.engine.begin() as connection:
+                connection.execute(db.text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({column_list})'))
+    return apply
+
+# Schema changes for databases created by earlier versions, in order. create_all
+# already builds the current schema for new databases, so every migration must
+# be safe to run against a schema that has it applied. Append only.
+MIGRATIONS = [
+    (1, 'add synced_task.content_hash', _add_column('synced_task', 'content_hash', 'VARCHAR(40)')),
+    (2, 'index synced_task by due date', _create_index(
+        'ix_synced_task_due_date_id', 'synced_task', ['asana_due_date', 'id'])),
+    (3, 'index synced_task by updated_at', _create_index(
+        'ix_synced_task_updated_at', 'synced_task', ['updated_at'])),
+    (4, 'add synced_task.resource_id', _add_column('synced_task', 'resource_id', 'VARCHAR(200)')),
+    (5, 'index synced_task by resource_id', _create_index(
+        'ix_synced_task_resource_id', 'synced_task', ['resource_id'])),
+    (6, 'add sync_plan_record.kind', _add_column('sync_plan_record', 'kind', 'VARCHAR(50)')),
+]
+
+def migrate(migrations=None):
+    """
+    Apply the schema migrations not yet recorded in SchemaMigration
+    
+    Several processes may start at once; migrations are idempotent and a
+    version recorded by another process in the meantime is ignored.
+    
+    Returns:
+        list: Versions applied by this call
+    """
+    migrations = MIGRATIONS if migrations is None else migrations
+    applied = set(db.session.execute(db.select(SchemaMigration.version)).scalars())
+    newly_applied = []
+    
+    for version, name, apply in migrations:
+        if version in applied:
+            continue
         
+        apply()
+        try:
+            db.session.add(SchemaMigration(version=version, name=name))
+            db.session.commit()
+        except IntegrityError:
+            # Another process recorded it first
+            db.session.rollback()
+        newly_applied.append(version)
+    
+    return newly_applied
+
 def get_synced_task_by_asana_id(asana_task_id):
     """Retrieve a synced task by Asana task ID"""
     return SyncedTask.query.filter_by(asana_task_id=asana_task_id).first()
@@ -30,18 +268,198 @@ def get_all_synced_tasks():
     """Get all synced tasks"""
     return SyncedTask.query.all()
 
-def add_synced_task(asana_task_id, asana_task_name, asana_due_date, google_event_id):
+def list_synced_tasks(after=None, limit=50, due_from=None, due_to=None, name_prefix=None,
+                      columns=None):
+    """
+    List synced tasks one page at a time, ordered by due date then ID
+    
+    Uses keyset pagination: each page continues after the (due date, id)
+    of the last row of the previous page, so deep pages cost the same as
+    the first one. Only the requested columns are selected and no ORM
+    objects are built.
+    
+    Args:
+        after: Optional (asana_due_date, id) of the last row already seen
+        limit: Maximum number of rows to return
+        due_from: Optional inclusive lower bound on the due date
+        due_to: Optional exclusive upper bound on the due date
+        name_prefix: Optional task name prefix to filter on
+        columns: Optional subset of LISTING_COLUMNS to return
+    
+    Returns:
+        tuple: (list of row dicts, (due date, id) of the last row, or None
+        if there are no more rows)
+    """
+    columns = [column for column in (columns or LISTING_COLUMNS) if column in LISTING_COLUMNS]
+    # The sort key is always selected so the next page can continue after it
+    selected = list(dict.fromkeys(columns + ['asana_due_date', 'id']))
+    
+    query = db.select(*(getattr(SyncedTask, column) for column in selected))
+    if due_from is not None:
+        query = query.where(SyncedTask.asana_due_date >= due_from)
+    if due_to is not None:
+        query = query.where(SyncedTask.asana_due_date < due_to)
+    if name_prefix:
+        query = query.where(SyncedTask.asana_task_name.startswith(name_prefix, autoescape=True))
+    if after is not None:
+        # A row-value comparison lets the (due date, id) index seek straight to the page
+        query = query.where(db.tuple_(SyncedTask.asana_due_date, SyncedTask.id) > tuple(after))
+    
+    # Fetch one extra row to know whether another page follows
+    query = query.order_by(SyncedTask.asana_due_date, SyncedTask.id).limit(limit + 1)
+    rows = db.session.execute(query).all()
+    
+    next_key = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_key = (rows[-1].asana_due_date, rows[-1].id)
+    
+    return [{column: getattr(row, column) for column in columns} for row in rows], next_key
+
+def encode_listing_cursor(key):
+    """Encode a (due date, id) listing key as an opaque URL-safe cursor"""
+    due_date, task_id = key
+    raw = json.dumps([due_date.isoformat(), task_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_listing_cursor(cursor):
+    """Decode a cursor from encode_listing_cursor; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        due_date, task_id = json.loads(raw)
+        return datetime.fromisoformat(due_date), int(task_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+
+def add_synced_task(asana_task_id, asana_task_name, asana_due_date, google_event_id,
+                    content_hash=None):
     """Add a new synced task record"""
     task = SyncedTask(
         asana_task_id=asana_task_id,
         asana_task_name=asana_task_name,
         asana_due_date=asana_due_date,
-        google_event_id=google_event_id
+        google_event_id=google_event_id,
+        content_hash=content_hash
     )
     db.session.add(task)
     db.session.commit()
     return task
 
+def iter_synced_task_ids(resource_id, include_unscoped=False):
+    """
+    Yield the Asana task IDs synced for a workspace tag
+    
+    With include_unscoped, rows written before synced tasks recorded their
+    resource (resource_id is NULL) are included as well. IDs are streamed
+    in chunks so a large table is not loaded at once.
+    """
+    condition = SyncedTask.resource_id == resource_id
+    if include_unscoped:
+        condition = db.or_(condition, SyncedTask.resource_id.is_(None))
+    
+    yield from db.session.execute(
+        db.select(SyncedTask.asana_task_id).where(condition).execution_options(yield_per=BULK_CHUNK_SIZE)
+    ).scalars()
+
+def get_synced_task_states(asana_task_ids):
+    """
+    Return a dict of Asana task ID -> synced state for the given task IDs
+    
+    Each state is a lightweight row with asana_task_id, asana_task_name,
+    asana_due_date, google_event_id and content_hash, loaded with one IN
+    query per BULK_CHUNK_SIZE IDs without building ORM objects.
+    """
+    asana_task_ids = list(asana_task_ids)
+    states = {}
+    
+    for start in range(0, len(asana_task_ids), BULK_CHUNK_SIZE):
+        chunk = asana_task_ids[start:start + BULK_CHUNK_SIZE]
+        rows = db.session.execute(
+            db.select(
+                SyncedTask.asana_task_id,
+                SyncedTask.asana_task_name,
+                SyncedTask.asana_due_date,
+                SyncedTask.google_event_id,
+                SyncedTask.content_hash
+            ).where(SyncedTask.asana_task_id.in_(chunk))
+        )
+        for row in rows:
+            states[row.asana_task_id] = row
+    
+    return states
+
+def get_synced_tasks_by_event_ids(google_event_ids):
+    """Return a dict of Google event ID -> SyncedTask for the given event IDs"""
+    google_event_ids = list(google_event_ids)
+    tasks = {}
+    
+    for start in range(0, len(google_event_ids), BULK_CHUNK_SIZE):
+        chunk = google_event_ids[start:start + BULK_CHUNK_SIZE]
+        for task in SyncedTask.query.filter(SyncedTask.google_event_id.in_(chunk)):
+            tasks[task.google_event_id] = task
+    
+    return tasks
+
+def delete_synced_tasks_by_event_ids(google_event_ids):
+    """Delete the synced task records for the given Google event IDs in one transaction"""
+    google_event_ids = list(google_event_ids)
+    
+    for start in range(0, len(google_event_ids), BULK_CHUNK_SIZE):
+        chunk = google_event_ids[start:start + BULK_CHUNK_SIZE]
+        SyncedTask.query.filter(SyncedTask.google_event_id.in_(chunk)).delete(
+            synchronize_session=False)
+    db.session.commit()
+
+def upsert_synced_tasks(rows):
+    """
+    Insert or update many synced task records in a single transaction
+    
+    Args:
+        rows: List of dicts with asana_task_id, asana_task_name,
+              asana_due_date, google_event_id, content_hash and resource_id
+    
+    Uses INSERT ... ON CONFLICT (asana_task_id) DO UPDATE on SQLite and
+    PostgreSQL, and per-row updates in the same transaction elsewhere.
+    """
+    if not rows:
+        return
+    
+    now = datetime.utcnow()
+    values = [dict(row, created_at=now, updated_at=now) for row in rows]
+    dialect = db.engine.dialect.name
+    
+    try:
+        if dialect in ('sqlite', 'postgresql'):
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            # Each row binds one parameter per column
+            rows_per_statement = BULK_CHUNK_SIZE // len(values[0])
+            for start in range(0, len(values), rows_per_statement):
+                statement = insert(SyncedTask).values(values[start:start + rows_per_statement])
+                statement = statement.on_conflict_do_update(
+                    index_elements=[SyncedTask.asana_task_id],
+                    set_={column: statement.excluded[column] for column in UPSERT_COLUMNS}
+                )
+                db.session.execute(statement)
+        else:
+            existing = {
+                task.asana_task_id: task
+                for task in SyncedTask.query.filter(
+                    SyncedTask.asana_task_id.in_([row['asana_task_id'] for row in values])
+                )
+            }
+            for row in values:
+                task = existing.get(row['asana_task_id'])
+                if task:
+                    for column in UPSERT_COLUMNS:
+                        setattr(task, column, row[column])
+                else:
+                    db.session.add(SyncedTask(**row))
+        
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
 def delete_synced_task(asana_task_id):
     """Delete a synced task record by Asana task ID"""
     task = get_synced_task_by_asana_id(asana_task_id)
@@ -50,3 +468,199 @@ def delete_synced_task(asana_task_id):
         db.session.commit()
         return True
     return False
+
+def get_cached_tag_index(workspace_id):
+    """
+    Load the persisted tag index for a workspace
+    
+    Returns:
+        tuple: (dict of lowercase tag name -> gid, oldest cached_at) or
+        (None, None) if nothing is persisted
+    """
+    rows = CachedTag.query.filter_by(workspace_id=workspace_id).all()
+    if not rows:
+        return None, None
+    
+    index = {row.tag_name: row.tag_gid for row in rows}
+    return index, min(row.cached_at for row in rows)
+
+def save_cached_tag_index(workspace_id, index):
+    """Replace the persisted tag index for a workspace"""
+    CachedTag.query.filter_by(workspace_id=workspace_id).delete()
+    now = datetime.utcnow()
+    db.session.add_all([
+        CachedTag(workspace_id=workspace_id, tag_name=name, tag_gid=gid, cached_at=now)
+        for name, gid in index.items()
+    ])
+    db.session.commit()
+
+def delete_cached_tag_index(workspace_id=None):
+    """Delete the persisted tag index for one workspace, or for all of them"""
+    query = CachedTag.query
+    if workspace_id is not None:
+        query = query.filter_by(workspace_id=workspace_id)
+    query.delete()
+    db.session.commit()
+
+def get_sync_token(source, resource_id):
+    """Get the stored sync token for a resource, or None"""
+    row = SyncToken.query.filter_by(source=source, resource_id=resource_id).first()
+    return row.token if row else None
+
+def save_sync_token(source, resource_id, token):
+    """Store (or replace) the sync token for a resource"""
+    row = SyncToken.query.filter_by(source=source, resource_id=resource_id).first()
+    if row:
+        row.token = token
+    else:
+        db.session.add(SyncToken(source=source, resource_id=resource_id, token=token))
+    db.session.commit()
+
+def delete_sync_token(source, resource_id):
+    """Forget the sync token for a resource, forcing the next sync to be a full one"""
+    SyncToken.query.filter_by(source=source, resource_id=resource_id).delete()
+    db.session.commit()
+
+def get_asana_webhook(workspace_id):
+    """Get a workspace's Asana webhook record, or None"""
+    return AsanaWebhook.query.filter_by(workspace_id=workspace_id).first()
+
+def open_webhook_handshake(workspace_id, expires_at):
+    """Accept a handshake for a workspace's webhook until expires_at"""
+    webhook = get_asana_webhook(workspace_id)
+    if webhook is None:
+        webhook = AsanaWebhook(workspace_id=workspace_id)
+        db.session.add(webhook)
+    webhook.handshake_expires_at = expires_at
+    db.session.commit()
+
+def close_webhook_handshake(workspace_id):
+    """Stop accepting handshakes for a workspace's webhook"""
+    AsanaWebhook.query.filter_by(workspace_id=workspace_id).update({'handshake_expires_at': None})
+    db.session.commit()
+
+def accept_webhook_handshake(workspace_id, secret):
+    """
+    Store the secret of a handshake if one is expected, closing the window
+    
+    A single conditional UPDATE, so only one handshake is accepted per window.
+    
+    Returns:
+        bool: Whether the handshake was expected and its secret stored
+    """
+    updated = AsanaWebhook.query.filter(
+        AsanaWebhook.workspace_id == workspace_id,
+        AsanaWebhook.handshake_expires_at > datetime.utcnow()
+    ).update({'secret': secret, 'handshake_expires_at': None}, synchronize_session=False)
+    db.session.commit()
+    return bool(updated)
+
+def get_watch_channels(calendar_id):
+    """Get a calendar's notification channels, the one expiring last first"""
+    return (WatchChannel.query.filter_by(calendar_id=calendar_id)
+            .order_by(WatchChannel.expires_at.desc()).all())
+
+def get_watch_channel(channel_id):
+    """Get a notification channel by its channel ID, or None"""
+    return WatchChannel.query.filter_by(channel_id=channel_id).first()
+
+def add_watch_channel(calendar_id, channel_id, resource_id, token, expires_at):
+    """Record a new notification channel"""
+    channel = WatchChannel(
+        calendar_id=calendar_id,
+        channel_id=channel_id,
+        resource_id=resource_id,
+        token=token,
+        expires_at=expires_at
+    )
+    db.session.add(channel)
+    db.session.commit()
+    return channel
+
+def delete_watch_channel(channel_id):
+    """Forget a notification channel"""
+    WatchChannel.query.filter_by(channel_id=channel_id).delete()
+    db.session.commit()
+
+def get_workspace_configs(enabled_only=True):
+    """Get the configured workspaces for multi-tenant mode"""
+    query = WorkspaceConfig.query
+    if enabled_only:
+        query = query.filter_by(enabled=True)
+    return query.order_by(WorkspaceConfig.id).all()
+
+def add_workspace_config(name, asana_workspace_id, asana_access_token, calendar_id=None,
+                         tag_names='schedule', sync_interval_minutes=None):
+    """Add a workspace to sync in multi-tenant mode"""
+    workspace = WorkspaceConfig(
+        name=name,
+        asana_workspace_id=asana_workspace_id,
+        asana_access_token=asana_access_token,
+        calendar_id=calendar_id,
+        tag_names=tag_names,
+        sync_interval_minutes=sync_interval_minutes
+    )
+    db.session.add(workspace)
+    db.session.commit()
+    return workspace
+
+def get_sync_leases(names):
+    """Return a dict of lease name -> SyncLease for the given names"""
+    names = list(names)
+    leases = {}
+    
+    for start in range(0, len(names), BULK_CHUNK_SIZE):
+        chunk = names[start:start + BULK_CHUNK_SIZE]
+        for lease in SyncLease.query.filter(SyncLease.name.in_(chunk)):
+            leases[lease.name] = lease
+    
+    return leases
+
+def save_sync_plan(plan_id, resource_id, plan, kind=None):
+    """Store a plan (SyncPlan.to_json) of a kind (SyncPlan.kind) that is about to be applied"""
+    try:
+        db.session.add(SyncPlanRecord(id=plan_id, resource_id=resource_id, plan=plan, kind=kind))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+def update_sync_plan(plan_id, position, stats, status=None):
+    """
+    Record how far a stored plan has been applied, optionally with a new status
+    
+    A plan that is 'done' or 'abandoned' will not be resumed, so its
+    text is dropped and only the small status row is kept.
+    """
+    values = {'position': position, 'stats': json.dumps(stats), 'updated_at': datetime.utcnow()}
+    if status:
+        values['status'] = status
+    if status in ('done', 'abandoned'):
+        values['plan'] = ''
+    try:
+        SyncPlanRecord.query.filter_by(id=plan_id).update(values)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+def get_unfinished_sync_plan(resource_id, created_after, kinds, abandon_others=False):
+    """
+    Return the newest plan of one of `kinds` for a resource that was not
+    applied to the end, or None
+    
+    Unfinished plans created before created_after are marked 'abandoned'
+    (and their text dropped) instead, since the tasks they were computed
+    from may have changed since. With abandon_others, so are unfinished
+    plans of other kinds, for runs that cover their changes.
+    """
+    unfinished = SyncPlanRecord.query.filter_by(resource_id=resource_id, status='applying')
+    abandon = SyncPlanRecord.created_at < created_after
+    if abandon_others:
+        abandon = db.or_(abandon, SyncPlanRecord.kind.is_(None), SyncPlanRecord.kind.notin_(kinds))
+    abandoned = unfinished.filter(abandon).update(
+        {'status': 'abandoned', 'plan': ''}, synchronize_session=False)
+    if abandoned:
+        db.session.commit()
+    return (unfinished.filter(SyncPlanRecord.kind.in_(kinds))
+            .order_by(SyncPlanRecord.created_at.desc()).first())
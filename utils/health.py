@@ -0,0 +1,96 @@
+import threading
+import time
+from datetime import datetime
+
+import config
+
+class HealthMonitor:
+    """
+    Background health probes for the upstream services
+    
+    Each probe is a callable that raises (or returns False) when its service
+    is unreachable. Probes run on a background thread every interval and
+    their latest results are cached, so status reads never wait on the
+    network. With an interval of 0 there is no background thread; status
+    reads then re-probe whatever is older than max_age_seconds.
+    """
+    
+    def __init__(self, probes, interval_seconds=None, max_age_seconds=None):
+        """Initialize with a dict of probe name -> callable"""
+        self.probes = probes
+        self.interval_seconds = config.HEALTH_CHECK_INTERVAL_SECONDS if interval_seconds is None else interval_seconds
+        self.max_age_seconds = config.HEALTH_CHECK_MAX_AGE_SECONDS if max_age_seconds is None else max_age_seconds
+        self._results = {}
+        self._checked = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Start probing in the background"""
+        if self.interval_seconds > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='health-monitor', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Stop the background probes"""
+        self._stopped.set()
+    
+    def status(self, fresh=False):
+        """
+        Return the latest result of every probe
+        
+        Args:
+            fresh: Run all probes now instead of reading the cache
+        
+        Returns:
+            dict: probe name -> {ok, checked_at, latency_ms, error}
+        """
+        if fresh:
+            return self.check_all()
+        
+        with self._lock:
+            results = dict(self._results)
+            checked = dict(self._checked)
+        
+        # Probes that have never run yet are run once now, and without the
+        # background thread results past their max age are refreshed here
+        stale_before = None
+        if self.interval_seconds <= 0:
+            stale_before = time.monotonic() - self.max_age_seconds
+        for name in self.probes:
+            if name not in results or (stale_before is not None and checked[name] <= stale_before):
+                results[name] = self.check(name)
+        
+        return results
+    
+    def check_all(self):
+        """Run every probe now and cache the results"""
+        return {name: self.check(name) for name in self.probes}
+    
+    def check(self, name):
+        """Run one probe now and cache its result"""
+        started = time.monotonic()
+        error = None
+        try:
+            ok = self.probes[name]() is not False
+        except Exception as e:
+            ok = False
+            error = str(e)
+        
+        result = {
+            'ok': ok,
+            'checked_at': datetime.utcnow().isoformat(),
+            'latency_ms': round((time.monotonic() - started) * 1000, 1),
+            'error': error
+        }
+        with self._lock:
+            self._results[name] = result
+            self._checked[name] = time.monotonic()
+        return result
+    
+    def _run(self):
+        """Probe every interval until stopped"""
+        while not self._stopped.is_set():
+            self.check_all()
+            self._stopped.wait(self.interval_seconds)
@@ -0,0 +1,154 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from utils.db import db, SyncLease
+import config
+
+def sync_lease_name(workspace_id, tag_name):
+    """Name of the lease guarding syncs of one tag in one workspace"""
+    return f"sync:{workspace_id}:{tag_name.lower()}"
+
+def watch_lease_name(calendar_id):
+    """Name of the lease guarding the renewal of a calendar's notification channel"""
+    return f"calendar-watch:{calendar_id}"
+
+def default_owner():
+    """Identify this process (host and PID) for lease ownership"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class LeaseLock:
+    """
+    Database-backed lease shared by every process using the database
+    
+    Taking the lease is a single conditional UPDATE (or an INSERT for a new
+    name), so at most one owner holds it at a time. While held, a heartbeat
+    thread extends it; if the holder dies, the lease expires after
+    ttl_seconds and another owner can take it over.
+    """
+    
+    def __init__(self, app, name, owner=None, ttl_seconds=None):
+        """Initialize with the Flask app, the lease name and optional owner ID and TTL"""
+        self.app = app
+        self.name = name
+        self.owner = owner or default_owner()
+        self.ttl_seconds = ttl_seconds or config.SYNC_LEASE_TTL_SECONDS
+        self._heartbeat = None
+        self._released = threading.Event()
+    
+    def acquire(self, run_id=None):
+        """
+        Try to take the lease for a run (inside an app context)
+        
+        Returns:
+            True if this owner now holds the lease
+        """
+        now = datetime.utcnow()
+        values = {
+            'owner': self.owner,
+            'run_id': run_id,
+            'acquired_at': now,
+            'expires_at': now + timedelta(seconds=self.ttl_seconds)
+        }
+        
+        try:
+            updated = db.session.execute(
+                db.update(SyncLease)
+                .where(SyncLease.name == self.name)
+                .where(db.or_(SyncLease.owner.is_(None), SyncLease.expires_at < now,
+                              SyncLease.owner == self.owner))
+                .values(**values)
+            ).rowcount
+            db.session.commit()
+            if updated:
+                self._start_heartbeat()
+                return True
+            
+            # No row yet; if another owner inserts first, the unique name wins
+            db.session.add(SyncLease(name=self.name, **values))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return False
+        
+        self._start_heartbeat()
+        return True
+    
+    def release(self, result=None, record=True):
+        """
+        Give up the lease (inside an app context)
+        
+        Unless record is False, the run is recorded as finished with its
+        result, for runs that waited on it.
+        """
+        self._released.set()
+        lease = SyncLease.query.filter_by(name=self.name, owner=self.owner).first()
+        if not lease:
+            return
+        
+        lease.owner = None
+        lease.expires_at = None
+        if not record:
+            db.session.commit()
+            return
+        
+        lease.finished_run_id = lease.run_id
+        lease.result = json.dumps(result) if result is not None else None
+        lease.finished_at = datetime.utcnow()
+        db.session.commit()
+    
+    def holder(self):
+        """Return the lease row (inside an app context), or None if it was never taken"""
+        # Read the latest committed state rather than the session's cached row
+        db.session.expire_all()
+        return SyncLease.query.filter_by(name=self.name).first()
+    
+    def wait_for_run(self, run_id, timeout, poll_seconds=None):
+        """
+        Wait until another owner's run releases the lease (inside an app context)
+        
+        Returns:
+            tuple: (finished, result) where finished is False if the holder
+            stopped renewing the lease (it died) or the timeout passed
+        """
+        poll_seconds = poll_seconds or config.SYNC_LEASE_POLL_SECONDS
+        deadline = datetime.utcnow() + timedelta(seconds=timeout)
+        
+        while datetime.utcnow() < deadline:
+            lease = self.holder()
+            if lease is None:
+                return False, None
+            if lease.finished_run_id == run_id:
+                return True, json.loads(lease.result) if lease.result else None
+            if lease.run_id != run_id or lease.owner is None or lease.expires_at < datetime.utcnow():
+                # Taken over by another run, or abandoned
+                return False, None
+            time.sleep(poll_seconds)
+        
+        return False, None
+    
+    def _start_heartbeat(self):
+        """Extend the lease every third of its TTL until released"""
+        self._released.clear()
+        self._heartbeat = threading.Thread(target=self._run_heartbeat, name='lease-heartbeat', daemon=True)
+        self._heartbeat.start()
+    
+    def _run_heartbeat(self):
+        """Heartbeat loop, on its own thread and app context"""
+        while not self._released.wait(self.ttl_seconds / 3):
+            try:
+                with self.app.app_context():
+                    db.session.execute(
+                        db.update(SyncLease)
+                        .where(SyncLease.name == self.name, SyncLease.owner == self.owner)
+                        .values(expires_at=datetime.utcnow() + timedelta(seconds=self.ttl_seconds))
+                    )
+                    db.session.commit()
+            except Exception as e:
+                print(f"Error renewing lease {self.name}: {str(e)}")
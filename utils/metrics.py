@@ -0,0 +1,206 @@
+"""
+In-process metrics in the Prometheus text exposition format
+
+Metrics live in a module-level registry and are rendered by the /metrics
+endpoint. Each process keeps its own values, so with several app
+processes every one of them has to be scraped.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Prometheus' default latency buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_value(value):
+    """Render a sample value the way Prometheus expects"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+def _format_labels(labels):
+    """Render a label set as {name="value",...}"""
+    if not labels:
+        return ''
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+class Metric:
+    """Base class: a named metric with a fixed set of label names"""
+    
+    type_name = None
+    
+    def __init__(self, name, documentation, labelnames=()):
+        """Initialize with the metric name, its help text and its label names"""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, labels):
+        """Label values in labelnames order; every label must be given"""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {', '.join(self.labelnames) or '(none)'}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def clear(self):
+        """Drop all recorded values"""
+        with self._lock:
+            self._values.clear()
+    
+    def render(self):
+        """Return the HELP, TYPE and sample lines of this metric"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._samples(list(zip(self.labelnames, key)), value))
+        return lines
+
+class Counter(Metric):
+    """A value that only goes up"""
+    
+    type_name = 'counter'
+    
+    def inc(self, amount=1, **labels):
+        """Add a non-negative amount to the counter for a label set"""
+        if amount < 0:
+            raise ValueError("Counters can only be increased")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def value(self, **labels):
+        """Current value for a label set (0 if never increased)"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+    
+    def _samples(self, labels, value):
+        return [f"{self.name}{_format_labels(labels)} {_format_value(value)}"]
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, with their count and sum"""
+    
+    type_name = 'histogram'
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Initialize like a Metric, with the upper bounds of the buckets"""
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+    
+    def observe(self, value, **labels):
+        """Record one observation for a label set"""
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][index] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+    
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock seconds spent in a with block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+    
+    def snapshot(self, **labels):
+        """Return (count, sum) for a label set"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (state['count'], state['sum']) if state else (0, 0.0)
+    
+    def _samples(self, labels, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state['buckets']):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {state['count']}")
+        return lines
+
+class Registry:
+    """Collection of metrics rendered together"""
+    
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+    
+    def register(self, metric):
+        """Add a metric, rejecting a second metric with the same name"""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name, documentation, labelnames=()):
+        """Create and register a Counter"""
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Create and register a Histogram"""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+    
+    def render(self):
+        """Return every metric in the text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+def timed_iter(iterable, histogram, **labels):
+    """Yield from an iterable, observing how long each item took to produce"""
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            histogram.observe(time.perf_counter() - started, **labels)
+        yield item
+
+registry = Registry()
+
+# Sync runs and the time spent in each of their phases
+SYNC_RUN_SECONDS = registry.histogram(
+    'sync_run_duration_seconds', "Duration of sync runs", ['mode'],
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+SYNC_PHASE_SECONDS = registry.histogram(
+    'sync_phase_duration_seconds',
+    "Time spent in each sync phase: per page (fetch, diff), per calendar batch (create, patch, "
+    "persist) or per run (reconcile, delete)",
+    ['phase'])
+SYNC_TASKS = registry.counter(
+    'sync_tasks_total', "Tasks handled by syncs, by outcome", ['outcome'])
+
+# Calls to Asana and Google Calendar
+UPSTREAM_REQUEST_SECONDS = registry.histogram(
+    'upstream_request_duration_seconds', "Latency of HTTP requests to upstream APIs",
+    ['service', 'endpoint'])
+UPSTREAM_RESPONSES = registry.counter(
+    'upstream_responses_total', "Upstream API responses by status code ('error' when none was received)",
+    ['service', 'endpoint', 'status'])
+UPSTREAM_RETRIES = registry.counter(
+    'upstream_retries_total', "Upstream API requests sent again, by reason", ['service', 'endpoint', 'reason'])
+THROTTLED_SECONDS = registry.counter(
+    'asana_throttled_seconds_total', "Time Asana requests waited on the client-side rate limiter")
+
+# Database statements, by their first keyword
+DB_QUERIES = registry.counter(
+    'db_queries_total', "SQL statements executed, by operation", ['operation'])
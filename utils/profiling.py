@@ -0,0 +1,145 @@
+import cProfile
+import os
+import pstats
+import re
+import threading
+from datetime import datetime
+
+import config
+
+# Run IDs double as file names, so only plain IDs are accepted
+RUN_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# pstats sort keys the summary can be ordered by
+SORT_KEYS = ('cumulative', 'tottime', 'calls')
+
+class SyncProfiler:
+    """
+    Runs syncs under cProfile and keeps the most recent profiles on disk
+    
+    Each profile is saved as <run_id>.prof in the profile directory, in
+    the pstats format (readable with snakeviz or python -m pstats), and
+    the oldest files beyond the keep limit are deleted. Only the thread
+    that runs the sync is profiled, so calendar batches sent from worker
+    threads (SYNC_MAX_WORKERS > 1) show up as time waiting on futures.
+    """
+    
+    def __init__(self, directory=None, keep=None):
+        """Initialize with optional custom directory and number of profiles to keep"""
+        self.directory = directory or config.SYNC_PROFILE_DIR
+        self.keep = keep or config.SYNC_PROFILE_KEEP
+        # cProfile supports only one active profiler per process on newer Pythons
+        self._active = threading.Lock()
+    
+    def run(self, run_id, func, *args, **kwargs):
+        """
+        Call func under the profiler and save the profile for run_id
+        
+        If another profile is being taken, func runs unprofiled.
+        
+        Returns:
+            tuple: (func's return value, whether a profile was saved)
+        """
+        self._check_run_id(run_id)
+        if not self._active.acquire(blocking=False):
+            print(f"Profiler busy, running {run_id} without profiling")
+            return func(*args, **kwargs), False
+        
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                profile.disable()
+        finally:
+            self._active.release()
+        
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(self._path(run_id))
+            self._prune()
+        except Exception as e:
+            print(f"Error saving profile for run {run_id}: {str(e)}")
+            return result, False
+        
+        return result, True
+    
+    def list_profiles(self):
+        """Return the saved profiles, newest first"""
+        profiles = []
+        for path in self._profile_paths():
+            stat = os.stat(path)
+            profiles.append({
+                'run_id': os.path.basename(path)[:-len('.prof')],
+                'created_at': datetime.utcfromtimestamp(stat.st_mtime).isoformat(),
+                'size_bytes': stat.st_size
+            })
+        return profiles
+    
+    def summary(self, run_id, limit=20, sort='cumulative'):
+        """
+        Summarize a saved profile by its top functions
+        
+        Args:
+            run_id: Run the profile was saved for
+            limit: Number of functions to return
+            sort: 'cumulative', 'tottime' or 'calls'
+        
+        Returns:
+            dict with the run's total calls and seconds and the top functions,
+            or None if no profile is saved for run_id
+        """
+        self._check_run_id(run_id)
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        
+        path = self._path(run_id)
+        if not os.path.exists(path):
+            return None
+        
+        stats = pstats.Stats(path)
+        stats.sort_stats(sort)
+        functions = []
+        for function in stats.fcn_list[:limit]:
+            primitive_calls, calls, total_time, cumulative_time, _ = stats.stats[function]
+            filename, line, name = function
+            functions.append({
+                'function': f"{filename}:{line}({name})" if line else name,
+                'calls': calls,
+                'primitive_calls': primitive_calls,
+                'total_seconds': round(total_time, 6),
+                'cumulative_seconds': round(cumulative_time, 6)
+            })
+        
+        return {
+            'run_id': run_id,
+            'sort': sort,
+            'total_calls': stats.total_calls,
+            'total_seconds': round(stats.total_tt, 6),
+            'functions': functions
+        }
+    
+    def _check_run_id(self, run_id):
+        """Reject run IDs that are not safe to use as file names"""
+        if not RUN_ID_PATTERN.match(run_id or ''):
+            raise ValueError(f"Invalid run ID: {run_id}")
+    
+    def _path(self, run_id):
+        return os.path.join(self.directory, f"{run_id}.prof")
+    
+    def _profile_paths(self):
+        """Paths of the saved profiles, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.endswith('.prof')]
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+    
+    def _prune(self):
+        """Delete the oldest profiles beyond the keep limit"""
+        for path in self._profile_paths()[self.keep:]:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Error removing old profile {path}: {str(e)}")
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import config
+from utils.metrics import THROTTLED_SECONDS
+
+# How often an asyncio caller checks for a free concurrency slot
+ASYNC_SLOT_POLL_SECONDS = 0.01
+
+class RateLimiter:
+    """
+    Client-side limiter for one Asana access token
+    
+    Combines a token bucket for the per-minute request budget with separate
+    caps on concurrent read and write requests, matching the limits Asana
+    enforces per token. A 429 response pauses every caller sharing the
+    limiter until its Retry-After has elapsed.
+    """
+    
+    def __init__(self, requests_per_minute=None, burst=None,
+                 max_concurrent_reads=None, max_concurrent_writes=None):
+        """Initialize with optional custom limits"""
+        requests_per_minute = requests_per_minute or config.ASANA_REQUESTS_PER_MINUTE
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst or config.ASANA_RATE_LIMIT_BURST)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._read_slots = threading.BoundedSemaphore(
+            max_concurrent_reads or config.ASANA_MAX_CONCURRENT_READS)
+        self._write_slots = threading.BoundedSemaphore(
+            max_concurrent_writes or config.ASANA_MAX_CONCURRENT_WRITES)
+        self._lock = threading.Lock()
+        self.throttled_seconds = 0.0
+        self.rate_limited_responses = 0
+    
+    @contextmanager
+    def acquire(self, method="GET"):
+        """Block until a request may be sent, holding a concurrency slot while it runs"""
+        self._take_token()
+        
+        slots = self._read_slots if method.upper() == "GET" else self._write_slots
+        started = time.monotonic()
+        slots.acquire()
+        self._record_wait(time.monotonic() - started)
+        try:
+            yield
+        finally:
+            slots.release()
+    
+    @asynccontextmanager
+    async def acquire_async(self, method="GET"):
+        """
+        asyncio counterpart of acquire, sharing the same budget and slots
+        
+        Waits with asyncio.sleep, so the event loop keeps running while the
+        request is held back.
+        """
+        while True:
+            delay = self._try_take_token()
+            if delay is None:
+                break
+            self._record_wait(delay)
+            await asyncio.sleep(delay)
+        
+        slots = self._read_slots if method.upper() == "GET" else self._write_slots
+        started = time.monotonic()
+        while not slots.acquire(blocking=False):
+            await asyncio.sleep(ASYNC_SLOT_POLL_SECONDS)
+        self._record_wait(time.monotonic() - started)
+        try:
+            yield
+        finally:
+            slots.release()
+    
+    def pause(self, seconds):
+        """Stop all requests for the given number of seconds (from Retry-After)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self.rate_limited_responses += 1
+    
+    def stats(self):
+        """Return throttling counters for reporting"""
+        with self._lock:
+            return {
+                'throttled_seconds': round(self.throttled_seconds, 3),
+                'rate_limited_responses': self.rate_limited_responses
+            }
+    
+    def _take_token(self):
+        """Wait for a pause to end and for a token to become available"""
+        while True:
+            delay = self._try_take_token()
+            if delay is None:
+                return
+            self._record_wait(delay)
+            time.sleep(delay)
+    
+    def _try_take_token(self):
+        """Take a token if one is available and return None, else return the seconds to wait"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            
+            # Refill the bucket for the time elapsed since the last request
+            self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            return (1 - self._tokens) / self.rate
+    
+    def _record_wait(self, seconds):
+        """Add time spent waiting to the throttle counter"""
+        if seconds > 0:
+            with self._lock:
+                self.throttled_seconds += seconds
+            THROTTLED_SECONDS.inc(seconds)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(access_token):
+    """Return the process-wide limiter for an access token, creating it if needed"""
+    with _limiters_lock:
+        limiter = _limiters.get(access_token)
+        if limiter is None:
+            limiter = RateLimiter()
+            _limiters[access_token] = limiter
+        return limiter
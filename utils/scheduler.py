@@ -0,0 +1,227 @@
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from utils.lease import LeaseLock, sync_lease_name
+from utils.profiling import SyncProfiler
+from utils.sync import TaskSynchronizer
+import config
+
+class SyncJob:
+    """A queued, running or finished sync run"""
+    
+    def __init__(self, trigger, events=None, kind=None, profile=None):
+        """
+        Initialize a queued job
+        
+        The kind is 'full' (sync_tasks), 'tasks' (only the tasks the given
+        Asana events refer to) or 'calendar' (reconcile changed calendar
+        events and recreate deleted ones); it defaults to 'tasks' when
+        events are given. With profile (default config.SYNC_PROFILE) the
+        run is profiled under its job ID.
+        """
+        self.id = uuid.uuid4().hex
+        self.trigger = trigger
+        self.events = events
+        self.kind = kind or ('tasks' if events is not None else 'full')
+        self.status = 'queued'
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {}
+        self.stats = None
+        self.error = None
+        # Run ID of another process's sync whose result this job took
+        self.attached_to = None
+        self.profile = config.SYNC_PROFILE if profile is None else profile
+        # Whether a profile of this run was saved
+        self.profiled = False
+    
+    @property
+    def done(self):
+        """Whether the job has finished, successfully or not"""
+        return self.status in ('succeeded', 'failed')
+    
+    def to_dict(self):
+        """Serialize the job for the API"""
+        return {
+            'id': self.id,
+            'trigger': self.trigger,
+            'kind': self.kind,
+            'status': self.status,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'progress': dict(self.progress),
+            'stats': self.stats,
+            'error': self.error,
+            'attached_to': self.attached_to,
+            'profiled': self.profiled
+        }
+
+class SyncScheduler:
+    """
+    In-process job runner for syncs
+    
+    Jobs are queued and run one at a time on a background worker thread
+    inside the app context, so HTTP requests only enqueue work. When
+    started, a timer thread also queues a sync every SYNC_INTERVAL_MINUTES.
+    
+    Each job runs under a database lease for the workspace, so syncs never
+    overlap across worker processes or hosts. A full sync that finds the
+    lease held by another process's full sync waits for it and takes its
+    result instead of running again.
+    """
+    
+    def __init__(self, app, interval_minutes=None, synchronizer_factory=None, max_jobs=None,
+                 lease_name=None, profiler=None):
+        """Initialize with the Flask app and optional interval, synchronizer factory, lease name and profiler"""
+        self.app = app
+        self.lease = LeaseLock(app, lease_name or sync_lease_name(config.ASANA_WORKSPACE_ID,
+                                                                  config.SCHEDULE_TAG_NAME))
+        self.interval_minutes = config.SYNC_INTERVAL_MINUTES if interval_minutes is None else interval_minutes
+        self.synchronizer_factory = synchronizer_factory or TaskSynchronizer
+        self.max_jobs = max_jobs or config.SYNC_JOB_HISTORY
+        self.profiler = profiler or SyncProfiler()
+        self._jobs = OrderedDict()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._worker = None
+        self._timer = None
+    
+    def start(self):
+        """Start the worker and, if an interval is set, the periodic timer"""
+        self._ensure_worker()
+        if self.interval_minutes > 0 and self._timer is None:
+            self._timer = threading.Thread(target=self._run_timer, name='sync-timer', daemon=True)
+            self._timer.start()
+    
+    def stop(self):
+        """Stop the timer and the worker once the current job finishes"""
+        self._stopped.set()
+        self._queue.put(None)
+    
+    def enqueue(self, trigger='manual', events=None, kind=None, coalesce=False, profile=None):
+        """
+        Queue a sync run and return its job
+        
+        With coalesce, an unfinished job of the same kind is returned
+        instead of queuing another one. A running job only counts for full
+        syncs, whose result covers the request; other kinds may already
+        have read the changes a new request is about. An explicitly
+        profiled run is never coalesced, so it produces its own profile.
+        """
+        job = SyncJob(trigger, events, kind, profile)
+        with self._lock:
+            if coalesce and not profile:
+                for existing in self._jobs.values():
+                    if existing.kind == job.kind and (
+                            existing.status == 'queued' or
+                            (existing.status == 'running' and job.kind == 'full')):
+                        return existing
+            
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs beyond the history limit
+            while len(self._jobs) > self.max_jobs:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if not oldest.done:
+                    break
+                del self._jobs[oldest_id]
+        
+        self._ensure_worker()
+        self._queue.put(job)
+        return job
+    
+    def get_job(self, job_id):
+        """Return a job by ID, or None if unknown or expired"""
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def _ensure_worker(self):
+        """Start the worker thread on first use"""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run_worker, name='sync-worker', daemon=True)
+                self._worker.start()
+    
+    def _run_timer(self):
+        """Queue a scheduled sync every interval, unless a full sync is already pending"""
+        while not self._stopped.wait(self.interval_minutes * 60):
+            with self._lock:
+                pending = any(not job.done and job.kind == 'full' for job in self._jobs.values())
+            if not pending:
+                self.enqueue(trigger='scheduled')
+    
+    def _run_worker(self):
+        """Run queued jobs one at a time"""
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            self.run_job(job)
+    
+    def run_job(self, job):
+        """Run a job inside the app context, recording progress and result"""
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        
+        def progress(stats):
+            job.progress = dict(stats)
+        
+        try:
+            with self.app.app_context():
+                job.stats = self._run_leased(job, progress)
+            status = 'succeeded'
+        except Exception as e:
+            print(f"Error running sync job {job.id}: {str(e)}")
+            job.error = str(e)
+            status = 'failed'
+        
+        # Set the status last so pollers never see a finished job without a finish time
+        job.finished_at = datetime.utcnow()
+        job.status = status
+    
+    def _run_leased(self, job, progress):
+        """Run a job once this process holds the sync lease, or take the result of the run holding it"""
+        deadline = time.monotonic() + config.SYNC_LEASE_MAX_WAIT_SECONDS
+        
+        while True:
+            if self.lease.acquire(run_id=job.id):
+                stats = None
+                try:
+                    stats = self._run(job, progress)
+                    return stats
+                finally:
+                    # Only full sync results can stand in for another full sync
+                    self.lease.release(stats if job.kind == 'full' else None)
+            
+            holder = self.lease.holder()
+            if holder is not None and holder.run_id:
+                finished, result = self.lease.wait_for_run(
+                    holder.run_id, max(deadline - time.monotonic(), 0))
+                if finished and result is not None and job.kind == 'full':
+                    job.attached_to = holder.run_id
+                    return result
+            
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"Timed out waiting for sync lease {self.lease.name}")
+            time.sleep(config.SYNC_LEASE_POLL_SECONDS)
+    
+    def _run(self, job, progress):
+        """Run a job's sync, under the profiler if requested, and return its stats"""
+        synchronizer = self.synchronizer_factory()
+        if job.kind == 'tasks':
+            run = lambda: synchronizer.sync_changed_tasks(job.events, progress=progress)
+        elif job.kind == 'calendar':
+            run = lambda: synchronizer.sync_calendar_changes(progress=progress)
+        else:
+            run = lambda: synchronizer.sync_tasks(progress=progress)
+        
+        if not job.profile:
+            return run()
+        stats, job.profiled = self.profiler.run(job.id, run)
+        return stats
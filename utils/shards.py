@@ -0,0 +1,170 @@
+"""
+Multi-tenant sync workers
+
+Each enabled WorkspaceConfig is split into shards, one per tag. Worker
+processes lease due shards through the database, so any number of workers
+on any number of hosts share the work without syncing a shard twice; a
+shard whose worker dies is taken over once its lease expires.
+
+Run a pool of workers with:
+    
+    python -m utils.shards --workers 4
+"""
+import argparse
+import multiprocessing
+import random
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from utils.asana_client import AsanaClient
+from utils.calendar_client import get_calendar_client
+from utils.db import init_db, get_workspace_configs, get_sync_leases
+from utils.lease import LeaseLock, default_owner, sync_lease_name
+from utils.sync import TaskSynchronizer
+import config
+
+def get_sync_shards():
+    """Return (workspace, tag name) for every tag of every enabled workspace"""
+    return [
+        (workspace, tag_name.strip())
+        for workspace in get_workspace_configs()
+        for tag_name in workspace.tag_names.split(',')
+        if tag_name.strip()
+    ]
+
+def build_shard_synchronizer(workspace, tag_name):
+    """Create a TaskSynchronizer for one workspace and tag"""
+    return TaskSynchronizer(
+        asana_client=AsanaClient(workspace.asana_access_token, workspace.asana_workspace_id),
+        calendar_client=get_calendar_client(calendar_id=workspace.calendar_id),
+        tag_name=tag_name
+    )
+
+class ShardWorker:
+    """Repeatedly leases due shards and syncs them"""
+    
+    def __init__(self, app, owner=None, synchronizer_factory=None, poll_seconds=None):
+        """Initialize with the Flask app and optional owner ID, synchronizer factory and poll interval"""
+        self.app = app
+        self.owner = owner or default_owner()
+        self.synchronizer_factory = synchronizer_factory or build_shard_synchronizer
+        self.poll_seconds = poll_seconds or config.SHARD_POLL_SECONDS
+        self._stopped = threading.Event()
+    
+    def stop(self):
+        """Stop after the current shard"""
+        self._stopped.set()
+    
+    def run_forever(self):
+        """Sync due shards until stopped"""
+        while not self._stopped.is_set():
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception as e:
+                print(f"Error in shard worker {self.owner}: {str(e)}")
+            self._stopped.wait(self.poll_seconds)
+    
+    def run_once(self):
+        """
+        Sync every due shard this worker can lease (inside an app context)
+        
+        Shards are tried in random order so concurrent workers spread out
+        instead of all contending for the same first shard.
+        
+        Returns:
+            int: Number of shards synced
+        """
+        shards = get_sync_shards()
+        leases = get_sync_leases(self._lease_name(shard) for shard in shards)
+        now = datetime.utcnow()
+        due = [shard for shard in shards if self._is_due(shard, leases.get(self._lease_name(shard)), now)]
+        random.shuffle(due)
+        
+        synced = 0
+        for shard in due:
+            if self._stopped.is_set():
+                break
+            if self._sync_shard(shard):
+                synced += 1
+        
+        return synced
+    
+    def _lease_name(self, shard):
+        """Lease name of a shard, shared with the single-workspace scheduler"""
+        workspace, tag_name = shard
+        return sync_lease_name(workspace.asana_workspace_id, tag_name)
+    
+    def _is_due(self, shard, lease, now):
+        """Whether a shard is free and its interval has passed since it last finished"""
+        if lease is None:
+            return True
+        if lease.owner is not None and lease.expires_at and lease.expires_at >= now:
+            return False
+        return self._interval_passed(shard, lease, now)
+    
+    def _interval_passed(self, shard, lease, now):
+        """Whether the shard's sync interval has passed since its last run finished"""
+        if lease.finished_at is None:
+            return True
+        
+        workspace, _ = shard
+        interval = workspace.sync_interval_minutes or config.SYNC_INTERVAL_MINUTES
+        return lease.finished_at + timedelta(minutes=interval) <= now
+    
+    def _sync_shard(self, shard):
+        """Lease and sync one shard; returns False if it was taken or synced meanwhile"""
+        workspace, tag_name = shard
+        lease = LeaseLock(self.app, self._lease_name(shard), owner=self.owner)
+        if not lease.acquire(run_id=uuid.uuid4().hex):
+            return False
+        
+        # Another worker may have finished this shard since the due check
+        if not self._interval_passed(shard, lease.holder(), datetime.utcnow()):
+            lease.release(record=False)
+            return False
+        
+        stats = None
+        synchronizer = None
+        try:
+            synchronizer = self.synchronizer_factory(workspace, tag_name)
+            stats = synchronizer.sync_tasks()
+        except Exception as e:
+            print(f"Error syncing {workspace.name} tag {tag_name}: {str(e)}")
+        finally:
+            lease.release(stats)
+            close = getattr(getattr(synchronizer, 'asana_client', None), 'close', None)
+            if callable(close):
+                close()
+        
+        return True
+
+def run_worker():
+    """Entry point of one worker process"""
+    app = Flask(__name__)
+    app.config.from_object(config)
+    init_db(app)
+    ShardWorker(app).run_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run multi-tenant sync workers")
+    parser.add_argument('--workers', type=int, default=config.SHARD_WORKERS)
+    args = parser.parse_args()
+    
+    # Create the schema once before the workers start
+    app = Flask(__name__)
+    app.config.from_object(config)
+    init_db(app)
+    
+    processes = [multiprocessing.Process(target=run_worker, name=f'shard-worker-{index}')
+                 for index in range(args.workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+if __name__ == '__main__':
+    main()
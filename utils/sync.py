@@ -1,79 +1,771 @@
 import datetime
-from utils.asana_client import AsanaClient
-from utils.calendar_client import GoogleCalendarClient
-from utils.db import get_synced_task_by_asana_id, add_synced_task, delete_synced_task
+import hashlib
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+import requests
+from utils.asana_client import AsanaClient, AsanaTask, SyncTokenExpired
+from utils.calendar_client import get_calendar_client
+from utils.metrics import SYNC_PHASE_SECONDS, SYNC_RUN_SECONDS, SYNC_TASKS, timed_iter
+from utils.db import (
+    get_synced_task_states, iter_synced_task_ids, upsert_synced_tasks, get_sync_token, save_sync_token,
+    get_synced_tasks_by_event_ids, delete_synced_tasks_by_event_ids,
+    save_sync_plan, update_sync_plan, get_unfinished_sync_plan
+)
+from utils.sync_plan import APPLY_STATS, SyncPlan
 import config
 
+def task_fingerprint(task):
+    """Hash the task fields a calendar event is built from (name, due_on, due_at, has_time)"""
+    if isinstance(task, AsanaTask):
+        name, due_on, due_at = task.name, task.due_on, task.due_at
+    else:
+        name, due_on, due_at = task.get('name'), task.get('due_on'), task.get('due_at')
+    content = "\x1f".join([
+        name or '',
+        due_on or '',
+        due_at or '',
+        str(due_at is not None)
+    ])
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def task_events(task_ids):
+    """Asana-style 'changed' events for task IDs, to sync them with iter_changed_tasks"""
+    return [{"action": "changed", "resource": {"gid": task_id, "resource_type": "task"}}
+            for task_id in task_ids]
+
 class TaskSynchronizer:
     """Handles the synchronization between Asana tasks and Google Calendar events"""
     
-    def __init__(self, asana_client=None, calendar_client=None):
-        """Initialize with optional custom clients"""
+    def __init__(self, asana_client=None, calendar_client=None, max_workers=None, tag_name=None):
+        """Initialize with optional custom clients, calendar worker count and tag"""
         self.asana_client = asana_client or AsanaClient()
-        self.calendar_client = calendar_client or GoogleCalendarClient()
-        self.tag_name = config.SCHEDULE_TAG_NAME
+        self.calendar_client = calendar_client or get_calendar_client()
+        self.tag_name = tag_name or config.SCHEDULE_TAG_NAME
+        self.max_workers = max_workers or config.SYNC_MAX_WORKERS
     
-    def sync_tasks(self):
+    def sync_tasks(self, incremental=None, reconcile=None, progress=None):
         """
         Find tasks with the 'schedule' tag and due date, and create
         corresponding events in Google Calendar
         
+        Runs as plan() followed by apply(): the tagged tasks are diffed
+        against their SyncedTask rows without calling Google, then the
+        resulting creates, patches and deletes are sent in batches.
+        
+        In incremental mode (config.SYNC_INCREMENTAL), only tasks reported
+        by the Asana events API since the stored sync token are processed.
+        Without a usable token, a fresh one is taken and the whole tag is
+        scanned. The new token is only stored if the run had no errors, so
+        failed changes are replayed next time.
+        
+        With reconciliation (config.SYNC_RECONCILE_CALENDAR), calendar drift
+        is checked first, and the tasks whose events users deleted are
+        fetched and planned as creates in the same run, in any mode.
+        
+        If an earlier run was interrupted while applying a checkpointed plan
+        for this tag, that plan is resumed from its last checkpoint instead
+        of planning again, unless it is older than
+        config.SYNC_PLAN_MAX_AGE_MINUTES. Full runs only resume full plans
+        and abandon the tag's other unfinished plans, which their scan
+        covers; incremental runs resume incremental or full plans.
+        Targeted plans are left to the webhook or calendar runs they
+        were made for.
+        
+        Args:
+            incremental: Override config.SYNC_INCREMENTAL for this run
+            reconcile: Override config.SYNC_RECONCILE_CALENDAR for this run
+            progress: Optional callback receiving the running stats after each page and batch
+        
+        Returns:
+            dict: Statistics about the sync operation
+        """
+        if incremental is None:
+            incremental = config.SYNC_INCREMENTAL
+        if reconcile is None:
+            reconcile = config.SYNC_RECONCILE_CALENDAR
+        
+        throttled_before = self.asana_client.throttled_seconds
+        started = time.perf_counter()
+        
+        drift = None
+        # Asana IDs of tasks whose events users deleted
+        dropped = []
+        if reconcile:
+            with SYNC_PHASE_SECONDS.time(phase='reconcile'):
+                drift = self.reconcile_calendar(dropped)
+        
+        if incremental:
+            plan = self._resumable_plan(('incremental', 'full'))
+        else:
+            plan = self._resumable_plan(('full',), abandon_others=True)
+        if plan is not None:
+            stats = self.apply(plan, progress, resume=True)
+            stats['resumed_plan'] = plan.id
+            if dropped:
+                self._add_stats(stats, self.apply(
+                    self._targeted_plan(task_events(dropped), 'calendar', progress), progress))
+        else:
+            stats = self.apply(self.plan(incremental, progress, task_ids=dropped), progress)
+        
+        if drift is not None:
+            stats['calendar_drift'] = drift
+        
+        # Time this run spent waiting on Asana rate limits
+        stats['throttled_seconds'] = round(self.asana_client.throttled_seconds - throttled_before, 3)
+        self._observe_run(stats, time.perf_counter() - started)
+        
+        return stats
+    
+    def sync_changed_tasks(self, events, progress=None):
+        """
+        Sync only the tasks referred to by a list of Asana events
+        
+        Used for webhook deliveries, which carry events in the same shape
+        as the events API. Each task is fetched once however many events
+        refer to it, then goes through the same diff as sync_tasks; tasks
+        that left the tag are deleted when config.SYNC_DELETE_EVENTS is set.
+        An interrupted webhook plan is finished first.
+        
+        Returns:
+            dict: Statistics about the sync operation
+        """
+        throttled_before = self.asana_client.throttled_seconds
+        started = time.perf_counter()
+        
+        stats = self._apply_targeted(events, 'webhook', progress)
+        
+        stats['throttled_seconds'] = round(self.asana_client.throttled_seconds - throttled_before, 3)
+        self._observe_run(stats, time.perf_counter() - started)
+        
+        return stats
+    
+    def sync_calendar_changes(self, progress=None):
+        """
+        Reconcile changed calendar events and recreate the ones users deleted
+        
+        Used for Google push notifications. The tasks whose SyncedTask rows
+        reconcile_calendar dropped are synced like webhook changes, so their
+        events come back without waiting for a full scan. An interrupted
+        calendar plan is finished first.
+        
+        Returns:
+            dict: Statistics about the sync operation, with the
+            reconciliation report as calendar_drift
+        """
+        throttled_before = self.asana_client.throttled_seconds
+        started = time.perf_counter()
+        
+        dropped = []
+        with SYNC_PHASE_SECONDS.time(phase='reconcile'):
+            drift = self.reconcile_calendar(dropped)
+        stats = self._apply_targeted(task_events(dropped), 'calendar', progress)
+        stats['calendar_drift'] = drift
+        
+        stats['throttled_seconds'] = round(self.asana_client.throttled_seconds - throttled_before, 3)
+        self._observe_run(stats, time.perf_counter() - started)
+        
+        return stats
+    
+    def plan(self, incremental=None, progress=None, task_ids=None):
+        """
+        Work out the calendar changes for the tagged tasks without calling Google
+        
+        Each task is diffed against its SyncedTask row by content
+        fingerprint and classified as create, patch, unchanged or delete.
+        Only creates and patches (with just the changed fields) end up in
+        the plan, so an unchanged task costs no API calls when it is
+        applied. Deletes are planned only when config.SYNC_DELETE_EVENTS is
+        set: tasks that lost their due date or were completed, tasks the
+        change feed reports as untagged or deleted, and, after a complete full scan,
+        synced tasks the scan did not return. No calendar events or SyncedTask
+        rows are written; resolving the tag may still store its ID in the
+        tag cache (CachedTag).
+        
+        Args:
+            incremental: Override config.SYNC_INCREMENTAL for this plan
+            progress: Optional callback receiving the plan's summary after each page
+            task_ids: Asana IDs of tasks to fetch and diff in addition, such
+                      as tasks whose events were deleted in the calendar
+        
+        Returns:
+            SyncPlan: The plan, ready for apply() or to_json()
+        """
+        if incremental is None:
+            incremental = config.SYNC_INCREMENTAL
+        
+        plan = SyncPlan(self.resource_id)
+        # Asana IDs of synced tasks whose events should be deleted
+        removed = []
+        # Tasks (or the rest of a scan) that Asana failed to return
+        failed = []
+        
+        if incremental:
+            tasks, plan.tag_id, plan.sync_token = self._incremental_tasks(plan, removed, failed)
+        else:
+            # Stream non-completed tasks with the schedule tag page by page
+            tasks = self.asana_client.iter_tasks_with_tag(self.tag_name, completed=False, errors=failed)
+        
+        if task_ids:
+            # Tasks the scan or change feed also returns are diffed once
+            tasks = chain(self.asana_client.iter_changed_tasks(
+                self.tag_name, task_events(task_ids), removed, failed), tasks)
+        
+        self._plan_tasks(plan, tasks, removed, failed, progress, full_scan=plan.sync_mode == 'full')
+        return plan
+    
+    def apply(self, plan, progress=None, resume=False):
+        """
+        Send a plan's creates and patches to Google in batches, then delete its removed events
+        
+        Each batch's results are written to the database before the plan's
+        position moves past it. Plans with at least
+        config.SYNC_PLAN_CHECKPOINT_MIN_ACTIONS actions are stored before
+        they are applied and checkpointed after every batch, so an
+        interrupted apply can be resumed. A resumed plan continues from its
+        position and skips items whose SyncedTask already has their
+        fingerprint, as batches recorded after the last checkpoint do.
+        
+        With max_workers > 1, calendar batches are sent from a bounded
+        thread pool. Workers only talk to Google; their results are
+        collected, counted and written to the database on the calling
+        thread, which owns the scoped DB session.
+        
+        Args:
+            plan: SyncPlan from plan() or SyncPlan.from_json()
+            progress: Optional callback receiving the running stats after each batch
+            resume: Whether the plan is a stored one being resumed
+        
         Returns:
             dict: Statistics about the sync operation
         """
-        stats = {
+        stats = self._new_stats()
+        stats.update(plan.applied)
+        # Fetch failures count as errors, so an incomplete plan never stores its sync token
+        stats['errors'] += plan.fetch_errors
+        stats.update(sync_mode=plan.sync_mode, tasks_found=plan.tasks_found,
+                     already_synced=plan.already_synced)
+        checkpoint = resume or self._save_plan(plan)
+        
+        executor = ThreadPoolExecutor(max_workers=self.max_workers) if self.max_workers > 1 else None
+        # (end position, future) of the batches sent from the pool
+        in_flight = deque()
+        
+        try:
+            for start in range(plan.position, len(plan.changes), config.GOOGLE_BATCH_SIZE):
+                end = min(start + config.GOOGLE_BATCH_SIZE, len(plan.changes))
+                batch = plan.changes[start:end]
+                if resume:
+                    batch = self._unrecorded(batch, stats)
+                
+                if executor is None:
+                    self._finish_batch(plan, self._send_batch(batch), end, stats, checkpoint, progress)
+                    continue
+                
+                # At most two batches per worker are kept in flight
+                in_flight.append((end, executor.submit(self._send_batch, batch)))
+                while len(in_flight) > self.max_workers * 2:
+                    end, future = in_flight.popleft()
+                    self._finish_batch(plan, future.result(), end, stats, checkpoint, progress)
+            
+            # Wait for the remaining batches
+            while in_flight:
+                end, future = in_flight.popleft()
+                self._finish_batch(plan, future.result(), end, stats, checkpoint, progress)
+        finally:
+            if executor:
+                executor.shutdown(wait=True)
+        
+        if plan.deletes:
+            with SYNC_PHASE_SECONDS.time(phase='delete'):
+                self._delete_events(plan.deletes, stats)
+        
+        if plan.sync_token and not stats['errors']:
+            save_sync_token('asana', plan.tag_id, plan.sync_token)
+        
+        if checkpoint:
+            plan.applied = self._applied_stats(plan, stats)
+            self._checkpoint(plan, status='done')
+        
+        return stats
+    
+    def _apply_targeted(self, events, trigger, progress=None):
+        """Finish the tag's interrupted plan for the same trigger, if any, then plan and apply the events"""
+        resumed = self._resumable_plan((f"targeted:{trigger}",))
+        if resumed is None:
+            return self.apply(self._targeted_plan(events, trigger, progress), progress)
+        
+        stats = self.apply(resumed, progress, resume=True)
+        stats['resumed_plan'] = resumed.id
+        # Planned after the resumed plan is applied, so its diff sees those changes
+        self._add_stats(stats, self.apply(self._targeted_plan(events, trigger, progress), progress))
+        return stats
+    
+    def _targeted_plan(self, events, trigger, progress=None):
+        """Plan just the tasks a list of Asana events refers to, for a webhook or calendar trigger"""
+        plan = SyncPlan(self.resource_id, 'targeted', trigger=trigger)
+        removed = []
+        failed = []
+        tasks = self.asana_client.iter_changed_tasks(self.tag_name, events, removed, failed)
+        self._plan_tasks(plan, tasks, removed, failed, progress)
+        return plan
+    
+    def _add_stats(self, stats, other):
+        """Add the counters of another applied plan to a run's stats"""
+        for key in ('tasks_found', 'already_synced') + APPLY_STATS:
+            stats[key] += other[key]
+    
+    @property
+    def resource_id(self):
+        """Workspace and tag this synchronizer's plans are stored under"""
+        return f"{self.asana_client.workspace_id}:{self.tag_name.lower()}"
+    
+    def _observe_run(self, stats, seconds):
+        """Record a finished run's duration and task outcomes in the metrics registry"""
+        SYNC_RUN_SECONDS.observe(seconds, mode=stats.get('sync_mode', 'full'))
+        for outcome, key in (('created', 'events_created'), ('updated', 'events_updated'),
+                             ('deleted', 'events_deleted'), ('unchanged', 'already_synced'),
+                             ('error', 'errors')):
+            if stats[key]:
+                SYNC_TASKS.inc(stats[key], outcome=outcome)
+    
+    def _new_stats(self):
+        """Return the zeroed stats dict of a sync run"""
+        return {
             'tasks_found': 0,
             'events_created': 0,
+            'events_updated': 0,
+            'events_deleted': 0,
             'already_synced': 0,
             'errors': 0
         }
+    
+    def _plan_tasks(self, plan, tasks, removed, failed, progress=None, full_scan=False):
+        """
+        Diff a stream of tasks page by page into a plan
+        
+        Synced tasks that should lose their event are added to `removed`,
+        which becomes the plan's deletes when config.SYNC_DELETE_EVENTS is
+        set. Fetch failures the task stream reported in `failed` are
+        counted as the plan's fetch_errors.
         
-        # Get all non-completed tasks with the schedule tag
-        tasks = self.asana_client.get_tasks_with_tag(self.tag_name, completed=False)
-        stats['tasks_found'] = len(tasks)
+        With full_scan, the stream is every open task with the tag, so once
+        it was read without failures, this tag's synced tasks that are not
+        in it (completed, untagged or deleted in Asana) are removed too.
+        An empty scan removes nothing: a missing tag is likelier than every
+        task leaving it.
+        """
+        # Asana IDs already diffed, since extra task IDs may also be in the stream
+        seen = set()
         
-        for task in tasks:
-            task_id = task['gid']
-            task_name = task['name']
+        # Fetch time is the wait for each page from Asana
+        for page in timed_iter(self._pages(tasks), SYNC_PHASE_SECONDS, phase='fetch'):
+            page = [task for task in page if task.gid not in seen]
+            seen.update(task.gid for task in page)
+            plan.tasks_found += len(page)
             
-            # Skip if already synced
-            if get_synced_task_by_asana_id(task_id):
-                stats['already_synced'] += 1
-                continue
+            with SYNC_PHASE_SECONDS.time(phase='diff'):
+                # Load the synced state of this page's tasks in one query
+                states = get_synced_task_states(task.gid for task in page)
+                plan.add_changes(self._plan_page(plan, page, states, removed))
             
-            # Extract due date
-            due_date = self.asana_client.parse_due_date(task)
+            if progress:
+                progress(plan.summary())
+        
+        self._finish_plan(plan, removed, failed, seen, full_scan)
+    
+    def _plan_page(self, plan, page, states, removed):
+        """
+        Diff a page of tasks against their synced states
+        
+        Counts unchanged tasks as already synced and appends tasks whose
+        event should be deleted to `removed`.
+        
+        Returns:
+            The create and patch items for the page, in task order
+        """
+        changes = []
+        for task in page:
+            action, item = self._diff_task(task, states.get(task.gid))
             
-            # Skip if no due date
-            if not due_date:
-                continue
+            if action == 'unchanged':
+                plan.already_synced += 1
+            elif action == 'delete':
+                removed.append(task.gid)
+            elif action in ('create', 'patch'):
+                changes.append(item)
+        return changes
+    
+    def _finish_plan(self, plan, removed, failed, seen, full_scan=False):
+        """Set the plan's fetch errors and deletes once every task was diffed"""
+        plan.fetch_errors = len(failed)
+        if config.SYNC_DELETE_EVENTS:
+            if full_scan and seen and not failed:
+                # Rows from before synced tasks recorded their tag belong to the only tag outside multi-tenant mode
+                removed.extend(task_id for task_id in iter_synced_task_ids(
+                    plan.resource_id, include_unscoped=not config.MULTI_TENANT) if task_id not in seen)
+            # Incremental runs can report a task more than once
+            plan.deletes = list(dict.fromkeys(removed))
+    
+    def reconcile_calendar(self, dropped=None):
+        """
+        Compare calendar events changed since the last reconciliation with
+        their SyncedTask rows
+        
+        Uses the calendar's incremental sync token (stored in the database)
+        so only changed events are fetched. Records of events that users
+        deleted are dropped and their Asana task IDs appended to `dropped`,
+        so the caller can recreate those events; events that were moved away
+        from the task's due date are counted.
+        
+        Returns:
+            dict: Counts of changed, deleted and moved events
+        """
+        report = {
+            'events_changed': 0,
+            'events_deleted': 0,
+            'events_moved': 0
+        }
+        calendar_id = self.calendar_client.calendar_id
+        
+        try:
+            events, sync_token, _ = self.calendar_client.list_changed_events(
+                get_sync_token('google', calendar_id))
+            report['events_changed'] = len(events)
             
-            # Check if the task has a time component
-            has_time = self.asana_client.has_time_component(task)
+            # Compare in memory against the rows for just these events
+            synced_tasks = get_synced_tasks_by_event_ids(event['id'] for event in events)
+            deleted = []
+            for event in events:
+                synced_task = synced_tasks.get(event['id'])
+                if not synced_task:
+                    continue
+                if event.get('status') == 'cancelled':
+                    deleted.append(event['id'])
+                    if dropped is not None:
+                        dropped.append(synced_task.asana_task_id)
+                elif self._is_moved(event, synced_task):
+                    report['events_moved'] += 1
+            
+            if deleted:
+                delete_synced_tasks_by_event_ids(deleted)
+            report['events_deleted'] = len(deleted)
+            
+            if sync_token:
+                save_sync_token('google', calendar_id, sync_token)
+        except Exception as e:
+            print(f"Error reconciling calendar events: {str(e)}")
+            report['error'] = str(e)
+        
+        return report
+    
+    def _is_moved(self, event, synced_task):
+        """Check whether an event no longer starts at its task's due date"""
+        start = event.get('start', {})
+        due_date = synced_task.asana_due_date
+        
+        if 'dateTime' in start:
+            event_start = datetime.datetime.fromisoformat(start['dateTime'].replace('Z', '+00:00'))
+            # Stored due dates may be naive UTC, so compare both as naive UTC
+            return self._naive_utc(event_start) != self._naive_utc(due_date)
+        
+        if 'date' in start:
+            return start['date'] != due_date.date().isoformat()
+        
+        return False
+    
+    def _diff_task(self, task, state):
+        """
+        Classify a task against its synced state
+        
+        Returns:
+            tuple: (action, pending item) where action is 'create', 'patch',
+            'unchanged', 'delete' or 'skip' (not synced, and completed or
+            without a due date)
+        """
+        task_id = task.gid
+        
+        # The tag's task list ignores the completed filter, and the change
+        # feed treats completed tasks as removed, so both modes agree here
+        if task.completed:
+            return ('delete' if state is not None else 'skip'), None
+        
+        fingerprint = task_fingerprint(task)
+        
+        if state is not None and state.content_hash == fingerprint:
+            return 'unchanged', None
+        
+        # Parsed when the record was built
+        due_date = task.due_date
+        
+        if not due_date:
+            # A synced task that lost its due date no longer needs an event
+            return ('delete' if state is not None else 'skip'), None
+        
+        item = {
+            'action': 'create' if state is None else 'patch',
+            'task_id': task_id,
+            'task_name': task.name,
+            'due_date': due_date,
+            'has_time': task.has_time,
+            'content_hash': fingerprint
+        }
+        
+        if state is not None:
+            item['event_id'] = state.google_event_id
+            # Only send the fields that changed; rows without a fingerprint get both
+            item['name_changed'] = state.content_hash is None or task.name != state.asana_task_name
+            # Only the name changed if the old name with the current due fields gives the stored
+            # fingerprint; this also catches due_on/due_at swaps that keep the same instant
+            item['due_changed'] = (state.content_hash is None or not item['name_changed'] or
+                                   task_fingerprint(task._replace(name=state.asana_task_name)) != state.content_hash)
+        
+        return item['action'], item
+    
+    def _naive_utc(self, value):
+        """Convert a datetime to naive UTC so stored and parsed values compare equal"""
+        if value.tzinfo:
+            return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value
+    
+    def _incremental_tasks(self, plan, removed, failed):
+        """
+        Pick the tasks for an incremental run
+        
+        IDs of tasks that left the tag are appended to `removed`, and fetch
+        failures to `failed`, once the returned tasks have been consumed.
+        
+        Returns:
+            tuple: (tasks to process, tag ID, sync token to store afterwards)
+        """
+        try:
+            tag_id = self.asana_client.get_tag_id(self.tag_name)
+            if not tag_id:
+                return [], None, None
             
+            events, sync_token = self.asana_client.get_events(
+                tag_id, get_sync_token('asana', tag_id))
+        except SyncTokenExpired as e:
+            # No token yet or it expired (412): scan everything with a fresh token
+            plan.sync_mode = 'full'
+            return (self.asana_client.iter_tasks_with_tag(self.tag_name, completed=False, errors=failed),
+                    tag_id, e.sync_token)
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching events for tag {self.tag_name}: {str(e)}")
+            plan.sync_mode = 'full'
+            return (self.asana_client.iter_tasks_with_tag(self.tag_name, completed=False, errors=failed),
+                    None, None)
+        
+        plan.sync_mode = 'incremental'
+        return self.asana_client.iter_changed_tasks(self.tag_name, events, removed, failed), tag_id, sync_token
+    
+    def _pages(self, tasks):
+        """
+        Group a stream of tasks into lists of config.ASANA_PAGE_SIZE AsanaTask records
+        
+        Clients that yield raw task dicts have them converted here, once.
+        """
+        tasks = iter(tasks)
+        while True:
+            page = [task if isinstance(task, AsanaTask) else AsanaTask.from_api(task)
+                    for task in islice(tasks, config.ASANA_PAGE_SIZE)]
+            if not page:
+                return
+            yield page
+    
+    def _save_plan(self, plan):
+        """
+        Store a large plan before it is applied
+        
+        Returns:
+            bool: Whether the plan is stored and should be checkpointed
+        """
+        if len(plan.changes) + len(plan.deletes) < config.SYNC_PLAN_CHECKPOINT_MIN_ACTIONS:
+            return False
+        
+        try:
+            save_sync_plan(plan.id, plan.resource_id, plan.to_json(), plan.kind)
+            return True
+        except Exception as e:
+            # The plan is still applied, it just cannot be resumed
+            print(f"Error saving sync plan {plan.id}: {str(e)}")
+            return False
+    
+    def _checkpoint(self, plan, status=None):
+        """Record a stored plan's position and counters"""
+        try:
+            update_sync_plan(plan.id, plan.position, plan.applied, status)
+        except Exception as e:
+            print(f"Error checkpointing sync plan {plan.id}: {str(e)}")
+    
+    def _resumable_plan(self, kinds, abandon_others=False):
+        """
+        Load this tag's interrupted plan of one of `kinds` (SyncPlan.kind)
+        if it is recent enough to resume, else None
+        
+        With abandon_others, the tag's unfinished plans of other kinds are
+        abandoned, for full runs whose scan covers them.
+        """
+        created_after = datetime.datetime.utcnow() - datetime.timedelta(minutes=config.SYNC_PLAN_MAX_AGE_MINUTES)
+        try:
+            record = get_unfinished_sync_plan(self.resource_id, created_after, kinds, abandon_others)
+            if record is None:
+                return None
+            
+            plan = SyncPlan.from_json(record.plan)
+            plan.position = record.position
+            if record.stats:
+                plan.applied.update(json.loads(record.stats))
+        except Exception as e:
+            print(f"Error loading unfinished sync plan: {str(e)}")
+            return None
+        
+        print(f"Resuming sync plan {plan.id} at {plan.position} of {len(plan.changes)} changes")
+        return plan
+    
+    def _unrecorded(self, batch, stats):
+        """Drop the items of a resumed plan that were recorded after its last checkpoint"""
+        states = get_synced_task_states(item['task_id'] for item in batch)
+        pending = []
+        for item in batch:
+            state = states.get(item['task_id'])
+            if state is not None and state.content_hash == item['content_hash']:
+                stats['events_created' if item['action'] == 'create' else 'events_updated'] += 1
+            else:
+                pending.append(item)
+        return pending
+    
+    def _applied_stats(self, plan, stats):
+        """Apply counters to checkpoint; fetch errors belong to the plan and are added again on resume"""
+        applied = {key: stats[key] for key in APPLY_STATS}
+        applied['errors'] -= plan.fetch_errors
+        return applied
+    
+    def _finish_batch(self, plan, results, end, stats, checkpoint, progress=None):
+        """Record a sent batch and move the plan's position past it"""
+        self._record_events(results, stats)
+        plan.position = end
+        plan.applied = self._applied_stats(plan, stats)
+        if checkpoint:
+            self._checkpoint(plan)
+        if progress:
+            progress(stats)
+    
+    def _send_batch(self, batch):
+        """
+        Create and patch calendar events for a batch (safe to run on a worker)
+        
+        Returns:
+            List of (item, (event, error)) pairs
+        """
+        patches = [item for item in batch if item['action'] == 'patch']
+        results = self._create_items([item for item in batch if item['action'] == 'create'])
+        
+        if patches:
             try:
-                # Create Google Calendar event
-                event = self.calendar_client.create_event(
-                    summary=task_name,
-                    description=f"Asana task: {task_id}",
-                    start_time=due_date,
-                    has_time=has_time
-                )
-                
-                if event:
-                    # Record the sync in database
-                    add_synced_task(
-                        asana_task_id=task_id,
-                        asana_task_name=task_name,
-                        asana_due_date=due_date,
-                        google_event_id=event['id']
-                    )
-                    stats['events_created'] += 1
-                else:
-                    stats['errors'] += 1
-                    
+                with SYNC_PHASE_SECONDS.time(phase='patch'):
+                    patched = self.calendar_client.patch_events_bulk([
+                        {
+                            'event_id': item['event_id'],
+                            'summary': item['task_name'] if item['name_changed'] else None,
+                            'start_time': item['due_date'] if item['due_changed'] else None,
+                            'has_time': item['has_time']
+                        }
+                        for item in patches
+                    ])
             except Exception as e:
-                print(f"Error syncing task {task_id}: {str(e)}")
+                print(f"Error patching calendar events: {str(e)}")
+                patched = [(None, e)] * len(patches)
+            
+            # Events users deleted in the calendar are created again, which also repairs their rows
+            gone = []
+            for item, (event, error) in zip(patches, patched):
+                if self._is_gone(error):
+                    gone.append(dict(item, action='create'))
+                else:
+                    results.append((item, (event, error)))
+            results.extend(self._create_items(gone))
+        
+        return results
+    
+    def _create_items(self, creates):
+        """Create the calendar events of create items in bulk, as (item, (event, error)) pairs"""
+        if not creates:
+            return []
+        
+        try:
+            with SYNC_PHASE_SECONDS.time(phase='create'):
+                created = self.calendar_client.create_events_bulk([
+                    {
+                        'summary': item['task_name'],
+                        'description': f"Asana task: {item['task_id']}",
+                        'start_time': item['due_date'],
+                        'has_time': item['has_time'],
+                        'asana_task_id': item['task_id']
+                    }
+                    for item in creates
+                ])
+            return list(zip(creates, created))
+        except Exception as e:
+            print(f"Error creating calendar events: {str(e)}")
+            return [(item, (None, e)) for item in creates]
+    
+    def _is_gone(self, error):
+        """Whether a Google API error means the event no longer exists (404/410)"""
+        return getattr(getattr(error, 'resp', None), 'status', None) in (404, 410)
+    
+    def _record_events(self, results, stats):
+        """Count the results of a batch and record synced tasks in one transaction"""
+        rows = []
+        created = 0
+        for item, (event, error) in results:
+            if error or not event:
+                print(f"Error syncing task {item['task_id']}: {str(error)}")
                 stats['errors'] += 1
+                continue
+            
+            rows.append({
+                'asana_task_id': item['task_id'],
+                'asana_task_name': item['task_name'],
+                'asana_due_date': item['due_date'],
+                'google_event_id': event['id'] if item['action'] == 'create' else item['event_id'],
+                'content_hash': item['content_hash'],
+                'resource_id': self.resource_id
+            })
+            if item['action'] == 'create':
+                created += 1
         
-        return stats
+        if not rows:
+            return
+        
+        try:
+            # Record the sync in database
+            with SYNC_PHASE_SECONDS.time(phase='persist'):
+                upsert_synced_tasks(rows)
+            stats['events_created'] += created
+            stats['events_updated'] += len(rows) - created
+        except Exception as e:
+            print(f"Error recording synced tasks: {str(e)}")
+            stats['errors'] += len(rows)
+    
+    def _delete_events(self, task_ids, stats):
+        """Delete the calendar events and records of synced tasks that were removed"""
+        states = get_synced_task_states(task_ids)
+        event_ids = [state.google_event_id for state in states.values()]
+        if not event_ids:
+            return
+        
+        deleted = []
+        for event_id, (success, error) in zip(event_ids, self.calendar_client.delete_events_bulk(event_ids)):
+            # An event that is already gone only needs its record removed
+            if success or self._is_gone(error):
+                deleted.append(event_id)
+            else:
+                print(f"Error deleting calendar event {event_id}: {str(error)}")
+                stats['errors'] += 1
+        
+        if deleted:
+            delete_synced_tasks_by_event_ids(deleted)
+        stats['events_deleted'] += len(deleted)
@@ -0,0 +1,129 @@
+import json
+import uuid
+from datetime import datetime
+
+# Counters apply() carries over when a checkpointed plan is resumed
+APPLY_STATS = ('events_created', 'events_updated', 'events_deleted', 'errors')
+
+class SyncPlan:
+    """
+    The calendar changes a sync will make, computed without touching Google
+    
+    A plan holds the creates and patches (in the order they are sent) and
+    the Asana IDs of synced tasks whose events should be deleted. Items are
+    the dicts TaskSynchronizer diffs tasks into, added with add_changes(); due dates are stored as
+    ISO strings in JSON, so a plan can be saved, inspected or diffed and
+    loaded back unchanged.
+    
+    While a plan is applied, position counts the creates and patches that
+    have been sent and recorded, and applied holds the counters so far, so
+    an interrupted apply can continue where it stopped.
+    """
+    
+    def __init__(self, resource_id, sync_mode='full', plan_id=None, created_at=None, trigger=None):
+        """Initialize an empty plan for a workspace tag ("<workspace>:<tag>")"""
+        self.id = plan_id or uuid.uuid4().hex
+        self.resource_id = resource_id
+        self.sync_mode = sync_mode
+        # What a targeted plan was made for ('webhook' or 'calendar')
+        self.trigger = trigger
+        self.created_at = created_at or datetime.utcnow()
+        self.tasks_found = 0
+        self.already_synced = 0
+        self.changes = []
+        # Creates among changes, counted as they are added so summary() stays cheap on every page
+        self.create_count = 0
+        self.deletes = []
+        # Tasks or task pages Asana failed to return; such a plan is incomplete
+        self.fetch_errors = 0
+        # Incremental runs store the Asana sync token once the plan is applied without errors
+        self.tag_id = None
+        self.sync_token = None
+        self.position = 0
+        self.applied = dict.fromkeys(APPLY_STATS, 0)
+    
+    def add_changes(self, items):
+        """Append create and patch items, in the order they will be sent"""
+        for item in items:
+            self.changes.append(item)
+            if item['action'] == 'create':
+                self.create_count += 1
+    
+    @property
+    def creates(self):
+        """Items for tasks that get a new event"""
+        return [item for item in self.changes if item['action'] == 'create']
+    
+    @property
+    def patches(self):
+        """Items for synced tasks whose event is patched"""
+        return [item for item in self.changes if item['action'] == 'patch']
+    
+    @property
+    def kind(self):
+        """Mode and trigger a run must match to resume the plan, e.g. 'full' or 'targeted:webhook'"""
+        return f"{self.sync_mode}:{self.trigger}" if self.trigger else self.sync_mode
+    
+    @property
+    def done(self):
+        """Whether every create and patch has been applied"""
+        return self.position >= len(self.changes)
+    
+    def summary(self):
+        """Counts of the plan's tasks and actions"""
+        return {
+            'plan_id': self.id,
+            'sync_mode': self.sync_mode,
+            'tasks_found': self.tasks_found,
+            'already_synced': self.already_synced,
+            'creates': self.create_count,
+            'patches': len(self.changes) - self.create_count,
+            'deletes': len(self.deletes),
+            'fetch_errors': self.fetch_errors,
+            'position': self.position
+        }
+    
+    def to_dict(self):
+        """Serialize the plan to JSON-compatible types"""
+        return {
+            'id': self.id,
+            'resource_id': self.resource_id,
+            'sync_mode': self.sync_mode,
+            'trigger': self.trigger,
+            'created_at': self.created_at.isoformat(),
+            'tasks_found': self.tasks_found,
+            'already_synced': self.already_synced,
+            'changes': [dict(item, due_date=item['due_date'].isoformat()) for item in self.changes],
+            'deletes': list(self.deletes),
+            'fetch_errors': self.fetch_errors,
+            'tag_id': self.tag_id,
+            'sync_token': self.sync_token,
+            'position': self.position,
+            'applied': dict(self.applied)
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a plan serialized by to_dict"""
+        plan = cls(data['resource_id'], data['sync_mode'], plan_id=data['id'],
+                   created_at=datetime.fromisoformat(data['created_at']), trigger=data.get('trigger'))
+        plan.tasks_found = data['tasks_found']
+        plan.already_synced = data['already_synced']
+        plan.add_changes(dict(item, due_date=datetime.fromisoformat(item['due_date']))
+                         for item in data['changes'])
+        plan.deletes = list(data['deletes'])
+        plan.fetch_errors = data.get('fetch_errors', 0)
+        plan.tag_id = data.get('tag_id')
+        plan.sync_token = data.get('sync_token')
+        plan.position = data.get('position', 0)
+        plan.applied.update(data.get('applied') or {})
+        return plan
+    
+    def to_json(self):
+        """Serialize the plan as JSON, with sorted keys so plans diff cleanly"""
+        return json.dumps(self.to_dict(), sort_keys=True)
+    
+    @classmethod
+    def from_json(cls, text):
+        """Rebuild a plan serialized by to_json"""
+        return cls.from_dict(json.loads(text))
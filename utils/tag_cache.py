@@ -0,0 +1,93 @@
+import threading
+import time
+from datetime import datetime
+
+from flask import has_app_context
+
+import config
+from utils.db import get_cached_tag_index, save_cached_tag_index, delete_cached_tag_index
+
+class TagCache:
+    """
+    Per-workspace cache of Asana tag name->gid indexes
+    
+    Indexes are kept in memory with a TTL and, when running inside a Flask
+    app context, persisted to the database so a restarted process does not
+    need to list every tag again.
+    """
+    
+    def __init__(self, ttl_seconds=None, persist=True):
+        """Initialize with an optional TTL and persistence setting"""
+        self.ttl_seconds = config.TAG_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.persist = persist
+        self._indexes = {}  # workspace_id -> (loaded_at, {tag name: gid})
+        self._lock = threading.Lock()
+    
+    def get(self, workspace_id):
+        """Return the cached index for a workspace, or None if missing or expired"""
+        with self._lock:
+            entry = self._indexes.get(workspace_id)
+        
+        if entry and not self._expired(entry[0]):
+            return entry[1]
+        
+        # Fall back to the copy persisted by an earlier process
+        if self._can_persist():
+            index, cached_at = get_cached_tag_index(workspace_id)
+            if index is not None:
+                age = (datetime.utcnow() - cached_at).total_seconds()
+                loaded_at = time.monotonic() - age
+                if not self._expired(loaded_at):
+                    with self._lock:
+                        self._indexes[workspace_id] = (loaded_at, index)
+                    return index
+        
+        return None
+    
+    def loaded_within(self, workspace_id, seconds):
+        """Check whether the in-memory index for a workspace was loaded less than `seconds` ago"""
+        with self._lock:
+            entry = self._indexes.get(workspace_id)
+        return entry is not None and time.monotonic() - entry[0] < seconds
+    
+    def set(self, workspace_id, index):
+        """Store a freshly loaded index for a workspace"""
+        with self._lock:
+            self._indexes[workspace_id] = (time.monotonic(), index)
+        
+        if self._can_persist():
+            save_cached_tag_index(workspace_id, index)
+    
+    def add(self, workspace_id, tag_name, tag_gid):
+        """Record a newly created tag in an existing index"""
+        with self._lock:
+            entry = self._indexes.get(workspace_id)
+            if not entry:
+                return
+            entry[1][tag_name.lower()] = tag_gid
+            index = dict(entry[1])
+        
+        if self._can_persist():
+            save_cached_tag_index(workspace_id, index)
+    
+    def invalidate(self, workspace_id=None):
+        """Drop the index for one workspace, or for all workspaces"""
+        with self._lock:
+            if workspace_id is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(workspace_id, None)
+        
+        if self._can_persist():
+            delete_cached_tag_index(workspace_id)
+    
+    def _expired(self, loaded_at):
+        """Check whether an index loaded at the given monotonic time is stale"""
+        return time.monotonic() - loaded_at >= self.ttl_seconds
+    
+    def _can_persist(self):
+        """Persistence needs the database, which needs an app context"""
+        return self.persist and has_app_context()
+
+# Shared by all AsanaClient instances in the process
+default_tag_cache = TagCache()
@@ -0,0 +1,108 @@
+import hashlib
+import hmac
+import threading
+import time
+
+import config
+
+def verify_signature(secret, body, signature):
+    """Check an Asana X-Hook-Signature (hex HMAC-SHA256 of the raw body) against the secret"""
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+class EventCoalescer:
+    """
+    Debounce webhook events per task and hand them over in batches
+    
+    A task's events are held until no new event has arrived for it for
+    delay_seconds (or, during a steady stream, for at most
+    max_delay_seconds since its first event). Only the latest event per
+    task is kept, so a burst of edits to one task costs a single sync.
+    """
+    
+    def __init__(self, handler, delay_seconds=None, max_delay_seconds=None):
+        """Initialize with a callable receiving each list of coalesced events"""
+        self.handler = handler
+        self.delay_seconds = config.WEBHOOK_DEBOUNCE_SECONDS if delay_seconds is None else delay_seconds
+        self.max_delay_seconds = (config.WEBHOOK_MAX_DELAY_SECONDS
+                                  if max_delay_seconds is None else max_delay_seconds)
+        # Task ID -> (latest event, first seen, last seen)
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._thread = None
+    
+    def add(self, events):
+        """
+        Queue the task events of a webhook delivery
+        
+        Returns:
+            int: Number of task events queued
+        """
+        queued = 0
+        now = time.monotonic()
+        
+        with self._condition:
+            for event in events:
+                resource = event.get('resource') or {}
+                if resource.get('resource_type') != 'task' or not resource.get('gid'):
+                    continue
+                
+                task_id = resource['gid']
+                first_seen = self._pending[task_id][1] if task_id in self._pending else now
+                # Re-insert so tasks are handed over in order of their latest event
+                self._pending.pop(task_id, None)
+                self._pending[task_id] = (event, first_seen, now)
+                queued += 1
+            
+            if queued:
+                self._ensure_thread()
+                self._condition.notify()
+        
+        return queued
+    
+    def flush(self):
+        """Hand over every pending event now, regardless of its deadline"""
+        with self._condition:
+            events = [event for event, _, _ in self._pending.values()]
+            self._pending.clear()
+        if events:
+            self._handle(events)
+    
+    def _deadline(self, first_seen, last_seen):
+        """When a task's events are handed over"""
+        return min(last_seen + self.delay_seconds, first_seen + self.max_delay_seconds)
+    
+    def _ensure_thread(self):
+        """Start the flushing thread on first use (called with the condition held)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='webhook-coalescer', daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        """Hand over events as their deadlines pass"""
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                
+                now = time.monotonic()
+                due = [task_id for task_id, (_, first_seen, last_seen) in self._pending.items()
+                       if self._deadline(first_seen, last_seen) <= now]
+                if not due:
+                    next_deadline = min(self._deadline(first_seen, last_seen)
+                                        for _, first_seen, last_seen in self._pending.values())
+                    self._condition.wait(next_deadline - now)
+                    continue
+                
+                events = [self._pending.pop(task_id)[0] for task_id in due]
+            
+            self._handle(events)
+    
+    def _handle(self, events):
+        """Pass events to the handler, reporting (not raising) its errors"""
+        try:
+            self.handler(events)
+        except Exception as e:
+            print(f"Error handling webhook events: {str(e)}")